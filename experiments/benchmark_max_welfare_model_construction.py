@@ -0,0 +1,71 @@
+#!python3
+
+"""
+Compare the time it takes to construct the cvxpy model of max_welfare_allocation,
+using the matrix-form construction (fairpy.items.max_welfare) vs. the older cell-by-cell construction.
+
+Only the model construction and canonicalization are timed - not the solver.
+
+Programmer: Erel Segal-Halevi
+Since: 2026-10
+"""
+
+import time
+import cvxpy, numpy as np
+from fairpy import ValuationMatrix
+from fairpy.items.max_welfare import fractional_allocation_variables, utility_vector
+
+
+def scalar_model(v: ValuationMatrix):
+    """
+    The cell-by-cell construction: one cvxpy expression per (agent, object) pair.
+    """
+    allocation_vars = cvxpy.Variable((v.num_of_agents, v.num_of_objects))
+    feasibility_constraints = [
+        sum([allocation_vars[i][o] for i in v.agents()])==1
+        for o in v.objects()
+    ]
+    positivity_constraints = [
+        allocation_vars[i][o] >= 0 for i in v.agents()
+        for o in v.objects()
+    ]
+    utilities = [sum([allocation_vars[i][o]*v[i][o] for o in v.objects()]) for i in v.agents()]
+    return cvxpy.Problem(cvxpy.Maximize(sum(utilities)), feasibility_constraints+positivity_constraints)
+
+
+def matrix_model(v: ValuationMatrix):
+    """
+    The matrix-form construction: whole-array expressions over the valuation matrix.
+    """
+    allocation_vars, feasibility_constraints = fractional_allocation_variables(v.num_of_agents, v.num_of_objects)
+    utilities_vector = utility_vector(v, allocation_vars)
+    utilities = [utilities_vector[i] for i in v.agents()]
+    return cvxpy.Problem(cvxpy.Maximize(sum(utilities)), feasibility_constraints)
+
+
+def construction_time(model_builder, v: ValuationMatrix, solver=cvxpy.SCIPY)->tuple:
+    """
+    :return (build_time, canonicalization_time), in seconds.
+    """
+    start = time.perf_counter()
+    problem = model_builder(v)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    problem.get_problem_data(solver)
+    canonicalization_time = time.perf_counter() - start
+    return build_time, canonicalization_time
+
+
+if __name__ == "__main__":
+    SIZES = [(10,20), (20,50), (50,100), (100,200), (200,500)]
+    MAX_SCALAR_CELLS = 20000   # the scalar construction is too slow beyond this size
+    print(f"{'agents':>7} {'objects':>8} | {'scalar build':>13} {'scalar canon':>13} | {'matrix build':>13} {'matrix canon':>13}")
+    for num_of_agents, num_of_objects in SIZES:
+        v = ValuationMatrix(np.random.randint(1, 100, [num_of_agents, num_of_objects]))
+        if num_of_agents*num_of_objects <= MAX_SCALAR_CELLS:
+            scalar_build, scalar_canon = construction_time(scalar_model, v)
+            scalar_columns = f"{scalar_build:13.3f} {scalar_canon:13.3f}"
+        else:
+            scalar_columns = f"{'skipped':>13} {'skipped':>13}"
+        matrix_build, matrix_canon = construction_time(matrix_model, v)
+        print(f"{num_of_agents:7} {num_of_objects:8} | {scalar_columns} | {matrix_build:13.3f} {matrix_canon:13.3f}", flush=True)
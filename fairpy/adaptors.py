@@ -10,9 +10,14 @@ Author: Erel Segal-Halevi
 Since: 2022-10
 """
 
-from typing import Callable, Any
+from typing import Callable, Any, Iterable, Iterator
 from fairpy import AgentList, Allocation, ValuationMatrix, AllocationMatrix, FractionalBundle
-import numpy as np
+from fairpy.time_limit import time_limit
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, contextlib, functools, time, collections, itertools, os
+
+import logging
+logger = logging.getLogger(__name__)
 
 
 def divide(algorithm: Callable, input: Any, *args, **kwargs):
@@ -134,8 +139,7 @@ def divide(algorithm: Callable, input: Any, *args, **kwargs):
     Alice gets {(0, 1.4)} with value 46.2.
     <BLANKLINE>
     """
-    annotations_list = list(algorithm.__annotations__.items())
-    first_argument_type = annotations_list[0][1]
+    first_argument_type = _first_argument_type(algorithm)
 
 
     ### Convert input to AgentList
@@ -150,59 +154,225 @@ def divide(algorithm: Callable, input: Any, *args, **kwargs):
 
     ### Convert input to ValuationMatrix
     elif first_argument_type==ValuationMatrix:
-        # Step 1. Adapt the input:
-        valuation_matrix = list_of_valuations = object_names = agent_names = None
-        if isinstance(input, ValuationMatrix): # instance is already a valuation matrix
-            valuation_matrix = input
-        elif isinstance(input, np.ndarray):    # instance is a numpy valuation matrix
-            valuation_matrix = ValuationMatrix(input)
-        elif isinstance(input, list) and isinstance(input[0], list):            # list of lists
-            list_of_valuations = input
-            valuation_matrix = ValuationMatrix(list_of_valuations)
-        elif isinstance(input, dict):  
-            agent_names = list(input.keys())
-            list_of_valuations = list(input.values())
-            if isinstance(list_of_valuations[0], dict): # maps agent names to dicts of valuations
-                object_names = list(list_of_valuations[0].keys())
-                list_of_valuations = [
-                    [valuation[object] for object in object_names]
-                    for valuation in list_of_valuations
-                ]
-            valuation_matrix = ValuationMatrix(list_of_valuations)
-        else:
-            raise TypeError(f"Unsupported input type: {type(input)}")
-
-        # Step 2. Run the algorithm:
+        valuation_matrix, agent_names, object_names = _valuation_matrix_from(input)
         output = algorithm(valuation_matrix, *args, **kwargs)
-        
-        # Step 3. Adapt the output:
-        if isinstance(output,Allocation):
-            return output
-        if agent_names is None:
-            agent_names = [f"Agent #{i}" for i in valuation_matrix.agents()]
-        if isinstance(output, np.ndarray) or isinstance(output, AllocationMatrix):  # allocation matrix
-            allocation_matrix = AllocationMatrix(output)
-            if isinstance(input, dict):
-                list_of_bundles = [FractionalBundle(allocation_matrix[i], object_names) for i in allocation_matrix.agents()]
-                dict_of_bundles = dict(zip(agent_names,list_of_bundles))
-                return Allocation(input, dict_of_bundles, matrix=allocation_matrix)
-            else:
-                return Allocation(valuation_matrix, allocation_matrix)
-        elif isinstance(output, list):
-            if object_names is None:
-                list_of_bundles = output
-            else:
-                list_of_bundles = [
-                    [object_names[object_index] for object_index in bundle]
-                    for bundle in output
-                ]
+        return _allocation_from(input, valuation_matrix, output, agent_names, object_names)
+
+    else:
+        return algorithm(input, *args, **kwargs)
+
+
+
+def _valuation_matrix_from(input: Any)->tuple:
+    """
+    Adapt the input of an algorithm that expects a ValuationMatrix.
+    :return (valuation_matrix, agent_names, object_names). The names are None if the input does not contain them.
+
+    >>> _valuation_matrix_from({"Alice": {"x":1,"y":2}, "George": {"x":3,"y":4}})
+    ([[1 2]
+     [3 4]], ['Alice', 'George'], ['x', 'y'])
+    """
+    valuation_matrix = list_of_valuations = object_names = agent_names = None
+    if isinstance(input, ValuationMatrix): # instance is already a valuation matrix
+        valuation_matrix = input
+    elif isinstance(input, np.ndarray):    # instance is a numpy valuation matrix
+        valuation_matrix = ValuationMatrix(input)
+    elif isinstance(input, list) and isinstance(input[0], list):            # list of lists
+        list_of_valuations = input
+        valuation_matrix = ValuationMatrix(list_of_valuations)
+    elif isinstance(input, dict):  
+        agent_names = list(input.keys())
+        list_of_valuations = list(input.values())
+        if isinstance(list_of_valuations[0], dict): # maps agent names to dicts of valuations
+            object_names = list(list_of_valuations[0].keys())
+            list_of_valuations = [
+                [valuation[object] for object in object_names]
+                for valuation in list_of_valuations
+            ]
+        valuation_matrix = ValuationMatrix(list_of_valuations)
+    else:
+        raise TypeError(f"Unsupported input type: {type(input)}")
+    return valuation_matrix, agent_names, object_names
+
+
+def _allocation_from(input: Any, valuation_matrix: ValuationMatrix, output: Any, agent_names:list, object_names:list)->Allocation:
+    """
+    Adapt the output of an algorithm that expects a ValuationMatrix.
+    """
+    if isinstance(output,Allocation):
+        return output
+    if agent_names is None:
+        agent_names = [f"Agent #{i}" for i in valuation_matrix.agents()]
+    if isinstance(output, np.ndarray) or isinstance(output, AllocationMatrix):  # allocation matrix
+        allocation_matrix = AllocationMatrix(output)
+        if isinstance(input, dict):
+            list_of_bundles = [FractionalBundle(allocation_matrix[i], object_names) for i in allocation_matrix.agents()]
             dict_of_bundles = dict(zip(agent_names,list_of_bundles))
-            return Allocation(input if isinstance(input,dict) else valuation_matrix, dict_of_bundles)
+            return Allocation(input, dict_of_bundles, matrix=allocation_matrix)
         else:
-            raise TypeError(f"Unsupported output type: {type(output)}")
+            return Allocation(valuation_matrix, allocation_matrix)
+    elif isinstance(output, list):
+        if object_names is None:
+            list_of_bundles = output
+        else:
+            list_of_bundles = [
+                [object_names[object_index] for object_index in bundle]
+                for bundle in output
+            ]
+        dict_of_bundles = dict(zip(agent_names,list_of_bundles))
+        return Allocation(input if isinstance(input,dict) else valuation_matrix, dict_of_bundles)
+    else:
+        raise TypeError(f"Unsupported output type: {type(output)}")
+
+
+
+def divide_many(algorithm: Callable, inputs: Iterable, *args, workers:int=None, chunksize:int=1, timeout:float=None, **kwargs)->Iterator:
+    """
+    An adaptor function for running a single item-allocation algorithm on many inputs, in a pool of processes.
+
+    :param algorithm: a fair item allocation algorithm, as in `divide`.
+    :param inputs: an iterable of inputs; each of them can be in any form accepted by `divide`.
+    :param workers: number of worker processes. Default: the number of CPUs. If workers==1, the inputs are divided in the current process.
+    :param chunksize: number of inputs sent to a worker in a single batch. Larger chunks reduce the communication overhead.
+    :param timeout: maximum number of seconds for dividing a single input (not supported on Windows).
+    :param kwargs: any other arguments expected by `algorithm`.
+
+    :return: a generator that yields, for each input in order, either its allocation,
+       or the exception raised when dividing it (e.g. TimeoutException or cvxpy.SolverError).
+       An error in one input does not affect the others.
 
+    For algorithms that accept a ValuationMatrix, each input is converted to a numpy array before it is sent to a worker,
+    and the allocation is built from the algorithm output in the main process.
+    The inputs are read lazily: at most 2*workers chunks are sent and not yet yielded, so `inputs` can be a long generator.
+
+    >>> import fairpy
+    >>> inputs = [[[11,22,44,0],[22,11,66,33]], {"Alice": [1,2], "George": [2,1]}, [[1,2,3]]]
+    >>> for result in divide_many(fairpy.items.utilitarian_matching, inputs, workers=2): print(result)
+    Agent #0 gets {1} with value 22.
+    Agent #1 gets {2} with value 66.
+    <BLANKLINE>
+    Alice gets {1} with value 2.
+    George gets {0} with value 2.
+    <BLANKLINE>
+    Agent #0 gets {2} with value 3.
+    <BLANKLINE>
+    >>> results = list(divide_many(fairpy.items.max_sum_allocation, [[[3,2],[1,4]], "not an instance"], workers=1))
+    >>> results[0]
+    Agent #0 gets { 100.0% of 0} with value 3.
+    Agent #1 gets { 100.0% of 1} with value 4.
+    <BLANKLINE>
+    >>> results[1]
+    TypeError("Unsupported input type: <class 'str'>")
+    >>> import itertools
+    >>> endless_inputs = ([[i,1],[1,i]] for i in itertools.count(2))
+    >>> for result in itertools.islice(divide_many(fairpy.items.utilitarian_matching, endless_inputs, workers=2), 2): print(result)
+    Agent #0 gets {0} with value 2.
+    Agent #1 gets {1} with value 2.
+    <BLANKLINE>
+    Agent #0 gets {0} with value 3.
+    Agent #1 gets {1} with value 3.
+    <BLANKLINE>
+    """
+    tasks = (_divide_many_task(algorithm, input) for input in inputs)   # the inputs are converted only when they are about to be sent
+    divide_one = functools.partial(_divide_one, algorithm, args, kwargs, timeout)
+    num_of_results = 0
+    start_time = time.perf_counter()
+    try:
+        if workers==1:
+            for payload, context in tasks:
+                result = _divide_many_result(divide_one(payload), context)
+                num_of_results += 1
+                yield result
+        else:
+            max_chunks_in_flight = 2*(workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunks_in_flight = collections.deque()   # pairs (future of the outputs of a chunk, contexts of the chunk)
+                def yield_first_chunk():
+                    nonlocal num_of_results
+                    future, contexts = chunks_in_flight.popleft()
+                    for output, context in zip(future.result(), contexts):
+                        result = _divide_many_result(output, context)
+                        num_of_results += 1
+                        yield result
+                try:
+                    for chunk in _chunks(tasks, chunksize):
+                        future = executor.submit(_divide_chunk, divide_one, [payload for payload,_ in chunk])
+                        chunks_in_flight.append((future, [context for _,context in chunk]))
+                        if len(chunks_in_flight) >= max_chunks_in_flight:
+                            yield from yield_first_chunk()
+                    while chunks_in_flight:
+                        yield from yield_first_chunk()
+                finally:
+                    for future,_ in chunks_in_flight:   # the caller stopped early - do not divide the remaining chunks
+                        future.cancel()
+    finally:
+        elapsed_time = time.perf_counter() - start_time
+        logger.info("Divided %d instances in %g seconds (%g instances per second)", num_of_results, elapsed_time, num_of_results/elapsed_time if elapsed_time>0 else np.inf)
+
+
+def _divide_many_task(algorithm: Callable, input: Any)->tuple:
+    """
+    :return (payload, context): the payload is sent to a worker; the context remains in the main process.
+    """
+    if _first_argument_type(algorithm)==ValuationMatrix:
+        try:
+            valuation_matrix, agent_names, object_names = _valuation_matrix_from(input)
+        except Exception as err:
+            return (err, None)
+        return (valuation_matrix._v, (input, valuation_matrix, agent_names, object_names))
     else:
-        return algorithm(input, *args, **kwargs)
+        return (input, None)
+
+
+def _divide_one(algorithm: Callable, args: tuple, kwargs: dict, timeout: float, payload: Any):
+    """
+    Runs in a worker process. Returns either the output of the algorithm, or the exception it raised.
+    """
+    if isinstance(payload, Exception):
+        return payload
+    try:
+        with (time_limit(timeout) if timeout is not None else contextlib.nullcontext()):
+            if isinstance(payload, np.ndarray):
+                return algorithm(ValuationMatrix(payload), *args, **kwargs)
+            else:
+                return divide(algorithm, payload, *args, **kwargs)
+    except Exception as err:
+        return err
+
+
+def _divide_chunk(divide_one: Callable, payloads: list)->list:
+    """
+    Runs in a worker process. Divides all payloads of a single chunk.
+    """
+    return [divide_one(payload) for payload in payloads]
+
+
+def _chunks(iterable: Iterable, size: int)->Iterator:
+    """
+    >>> list(_chunks(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _divide_many_result(output: Any, context: tuple):
+    if context is None or isinstance(output, Exception):
+        return output
+    input, valuation_matrix, agent_names, object_names = context
+    try:
+        return _allocation_from(input, valuation_matrix, output, agent_names, object_names)
+    except Exception as err:
+        return err
+
+
+def _first_argument_type(algorithm: Callable):
+    annotations_list = list(algorithm.__annotations__.items())
+    return annotations_list[0][1]
 
 
 
@@ -61,6 +61,9 @@ class Agent(ABC):
     def all_items(self):
         return self.valuation.all_items()
 
+    def item_values(self, items:List[Item])->np.ndarray:
+        return self.valuation.item_values(items)
+
 
     def best_index(self, allocation:List[Bundle])->int:
         """
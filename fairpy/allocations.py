@@ -13,6 +13,7 @@ Since: 2021-04
 
 from typing import List, Any, Dict
 import numpy as np
+import scipy.sparse
 from collections import defaultdict
 from collections.abc import Iterable
 import fairpy
@@ -266,7 +267,18 @@ class Allocation:
         self.num_of_bundles = num_of_bundles
         self.agents = agents
         self.bundles = bundles
-        self.agent_bundle_value_matrix = compute_agent_bundle_value_matrix(agents, bundles, num_of_agents, num_of_bundles)
+        self._agent_bundle_value_matrix = None   # computed on first use
+
+    @property
+    def agent_bundle_value_matrix(self)->np.ndarray:
+        """
+        A matrix U in which U[i,j] is the value of agent i to bundle j.
+        It is computed only when it is first used (e.g. by utility_profile or str_with_values), since it is not needed
+        for merely constructing an allocation, and it takes O(n^2) value computations.
+        """
+        if self._agent_bundle_value_matrix is None:
+            self._agent_bundle_value_matrix = compute_agent_bundle_value_matrix(self.agents, self.bundles, self.num_of_agents, self.num_of_bundles)
+        return self._agent_bundle_value_matrix
 
 
     def get_bundles(self):
@@ -306,7 +318,7 @@ class Allocation:
         if isinstance(self.bundles[0],FractionalBundle):
             for bundle in self.bundles:
                 bundle.round(num_digits)
-        self.agent_bundle_value_matrix = compute_agent_bundle_value_matrix(self.agents, self.bundles, self.num_of_agents, self.num_of_bundles)
+        self._agent_bundle_value_matrix = None   # the values changed; recompute on next use
         return self
 
     def num_of_sharings(self)->int:
@@ -326,7 +338,7 @@ class Allocation:
         >>> Allocation(v,z).utility_profile()
         array([0.4, 0.9])
         """
-        return np.array([self.agent_bundle_value_matrix[i_agent,i_agent] for i_agent in range(self.num_of_agents)])
+        return np.diagonal(self.agent_bundle_value_matrix).copy()
 
     def utility_profile_matrix(self)->list:
         """
@@ -406,11 +418,19 @@ def compute_agent_bundle_value_matrix(agents, bundles, num_of_agents, num_of_bun
     array([[3. , 3.5],
            [9. , 6. ]])
 
+    >>> compute_agent_bundle_value_matrix(agents, [FractionalBundle([1,0.5,0]), FractionalBundle([0,0.5,1])], 2, 2)
+    array([[2. , 4.5],
+           [6.5, 8.5]])
+
     >>> agents=AgentList(agents)
     >>> compute_agent_bundle_value_matrix(agents, bundles, 2, 2)
     array([[3. , 3.5],
            [9. , 6. ]])
     """
+    if isinstance(agents, ValuationMatrix):
+        bundle_matrix = _bundle_matrix(bundles, agents.num_of_objects)
+        if bundle_matrix is not None:
+            return np.asarray(bundle_matrix @ agents._v.T, dtype=float).T   # U = V @ X^T
     agent_bundle_value_matrix = np.zeros([num_of_agents,num_of_bundles])
     # print("bundles: ",bundles)
     if hasattr(agents, 'agent_value_for_bundle'):  # E.g. when agents is a ValuationMatrix.
@@ -438,6 +458,43 @@ def compute_agent_bundle_value_matrix(agents, bundles, num_of_agents, num_of_bun
     return agent_bundle_value_matrix
 
 
+def _bundle_matrix(bundles, num_of_objects:int):
+    """
+    Compute a matrix X in which each row is a bundle, each column is an object,
+    and X[j,o] is the fraction (or number of copies) of object o in bundle j.
+    The matrix is dense if the bundles are fractional, and sparse if they are lists of object indices.
+
+    :return: the matrix, or None if some bundle cannot be represented in this way (e.g. it contains object names).
+
+    >>> _bundle_matrix([FractionalBundle([1,0.5,0]), FractionalBundle([0,0.5,1])], 3)
+    array([[1. , 0.5, 0. ],
+           [0. , 0.5, 1. ]])
+    >>> _bundle_matrix([[0,2], None, [1,1]], 3).toarray()
+    array([[1., 0., 1.],
+           [0., 0., 0.],
+           [0., 2., 0.]])
+    >>> _bundle_matrix([["x"]], 3) is None
+    True
+    """
+    if len(bundles) > 0 and all(isinstance(bundle, FractionalBundle) for bundle in bundles):
+        fractions = [np.asarray(bundle.fractions, dtype=float) for bundle in bundles]
+        if any(len(bundle_fractions) != num_of_objects for bundle_fractions in fractions):
+            return None
+        return np.array(fractions)
+    rows, columns = [], []
+    for i_bundle, bundle in enumerate(bundles):
+        if bundle is None:
+            continue
+        if isinstance(bundle, FractionalBundle):
+            return None
+        for item in bundle:
+            if not isinstance(item, (int, np.integer)) or not 0 <= item < num_of_objects:
+                return None
+            rows.append(i_bundle)
+            columns.append(item)
+    return scipy.sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(bundles), num_of_objects))
+
+
 if __name__ == "__main__":
     import doctest
     (failures, tests) = doctest.testmod(report=True)
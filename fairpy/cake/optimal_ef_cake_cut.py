@@ -151,8 +151,8 @@ def opt_piecewise_linear(agents: AgentList) -> Allocation:
     >>> alice = PiecewiseLinearAgent([11,22,33,44],[1,0,3,-2],name="alice")
     >>> bob = PiecewiseLinearAgent([11,22,33,44],[-1,0,-3,2],name="bob")
     >>> print(str(opt_piecewise_linear([alice,bob])))
-    alice gets {(0.5, 1),(1, 1.466),(2.5, 3),(3, 3.5)} with value 55.
-    bob gets {(0, 0.5),(1.466, 2),(2, 2.5),(3.5, 4)} with value 55.
+    alice gets {(0.5, 1),(1, 1.4659090909090908),(2.5, 3),(3, 3.5)} with value 55.
+    bob gets {(0, 0.5),(1.4659090909090908, 2),(2, 2.5),(3.5, 4)} with value 56.5.
     <BLANKLINE>
     >>> alice = PiecewiseLinearAgent([5], [0], name='alice')
     >>> bob = PiecewiseLinearAgent([5], [0], name='bob')
@@ -169,8 +169,8 @@ def opt_piecewise_linear(agents: AgentList) -> Allocation:
     >>> alice = PiecewiseLinearAgent([5], [-1], name='alice')
     >>> bob = PiecewiseLinearAgent([5], [-1], name='bob')
     >>> print(str(opt_piecewise_linear([alice,bob])))
-    alice gets {(0, 0.475)} with value 2.5.
-    bob gets {(0.475, 1)} with value 2.25.
+    alice gets {(0, 0.47506218943955486)} with value 2.5.
+    bob gets {(0.47506218943955486, 1)} with value 2.5.
     <BLANKLINE>
     >>> alice = PiecewiseLinearAgent([0,1,0,2,0,3], [0,0,0,0,0,0], name='alice')
     >>> bob = PiecewiseLinearAgent([1,0,2,0,3,0], [0,0,0,0,0,0],name='bob')
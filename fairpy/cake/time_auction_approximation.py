@@ -19,6 +19,7 @@ import random, logging
 from typing import *
 from networkx import *
 from math import *
+from fairpy.matching import max_weight_matching
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +31,7 @@ def stringify_edge_set(s: set):
     """ Convert an agent-piece graph into a string, for display and testing """
     return str(sorted([(agent.name(), piece) for (agent,piece) in s]))
 
-def equally_sized_pieces(agents: AgentList, piece_size: float) -> Allocation:
+def equally_sized_pieces(agents: AgentList, piece_size: float, backend: str = "auto") -> Allocation:
     """
     Algorithm 1.
     Approximation algorithm of the optimal auction for uniform-size pieces.
@@ -42,6 +43,7 @@ def equally_sized_pieces(agents: AgentList, piece_size: float) -> Allocation:
 
     :param agents: A list of Agent objects.
     :param piece_size: Size of an equally sized piece (in the paper: l).
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
     :return: A cake-allocation, not necessarily all the cake will be allocated.
 
     The doctest will work when the set of edges will return according lexicographic order
@@ -107,9 +109,9 @@ def equally_sized_pieces(agents: AgentList, piece_size: float) -> Allocation:
 
     # Set the edges to be in order, (Agent, partition)
     logger.info("Compute maximum weight matchings for each graph respectively")
-    edges_set_0_l = fix_edges(max_weight_matching(g_0_l))
+    edges_set_0_l = fix_edges(max_weight_matching(g_0_l, backend=backend))
     logger.info("  The edges in G_0_l = %s", stringify_edge_set(edges_set_0_l))
-    edges_set_delta_l = fix_edges(max_weight_matching(g_delta_l))
+    edges_set_delta_l = fix_edges(max_weight_matching(g_delta_l, backend=backend))
     logger.info("  The edges in G_d_l = %s", stringify_edge_set(edges_set_delta_l))
 
     logger.info("Choose the heavier among the matchings")
@@ -131,7 +133,7 @@ def equally_sized_pieces(agents: AgentList, piece_size: float) -> Allocation:
     return Allocation(chosen_agents, pieces)
 
 
-def discrete_setting(agents: AgentList, pieces: List[Tuple[float, float]]) -> Allocation:
+def discrete_setting(agents: AgentList, pieces: List[Tuple[float, float]], backend: str = "auto") -> Allocation:
     """
     Algorithm 2.
     Approximation algorithm of the optimal auction for a discrete cake with known piece sizes.
@@ -143,6 +145,7 @@ def discrete_setting(agents: AgentList, pieces: List[Tuple[float, float]]) -> Al
 
     :param agents: A list of Agent objects.
     :param pieces: List of sized pieces.
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
     :return: A cake-allocation.
 
     The doctest will work when the set of edges will return according lexicographic order
@@ -185,7 +188,7 @@ def discrete_setting(agents: AgentList, pieces: List[Tuple[float, float]]) -> Al
         g_i = create_matching_graph(agents, partition_i, evaluations)
         logger.info("Compute a maximum weight matching Mt in the graph GPt")
         # Find the max weight matching of the graph and get the set of edges of the matching
-        edges_set = max_weight_matching(g_i)
+        edges_set = max_weight_matching(g_i, backend=backend)
         # Set the edges to be in order, (Agent, partition)
         edges_set = fix_edges(edges_set)
         # Calculate the sum of the weights in the edges set
@@ -207,7 +210,7 @@ def discrete_setting(agents: AgentList, pieces: List[Tuple[float, float]]) -> Al
     return Allocation(chosen_agents, pieces)
 
 
-def continuous_setting(agents: AgentList) -> Allocation:
+def continuous_setting(agents: AgentList, backend: str = "auto") -> Allocation:
     """
     Algorithm 3.
     Approximation algorithm of the optimal auction for a continuous cake.
@@ -218,6 +221,7 @@ def continuous_setting(agents: AgentList) -> Allocation:
     - Approximates the optimal welfare by a factor of O(log n).
 
     :param agents: A list of Agent objects.
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
     :return: A cake-allocation.
 
     >>> Alice1 = PiecewiseConstantAgent([100, 1], "Alice")
@@ -269,7 +273,7 @@ def continuous_setting(agents: AgentList) -> Allocation:
     # Get the agents that were nor chosen
     agents = list(set(agents) - set(s))
     # Find the best allocation for those agents with the partition we generated and use Algo 2 to do that
-    res = discrete_setting(agents, pieces)
+    res = discrete_setting(agents, pieces, backend=backend)
     # Return the allocation
     return res
 
@@ -8,10 +8,10 @@ Since: 2019-11
 """
 
 from abc import ABC, abstractmethod
+import functools
 import numpy as np
 from typing import *
 
-from scipy import integrate
 
 
 class Valuation(ABC):
@@ -56,6 +56,25 @@ class Valuation(ABC):
         """
         pass
 
+    def eval_many(self, starts:np.ndarray, ends:np.ndarray)->np.ndarray:
+        """
+        Answer many Eval queries at once.
+
+        :param starts, ends: arrays of the same length.
+        :return: an array whose i-th element is the value of [starts[i], ends[i]].
+        """
+        return np.array([self.eval(start, end) for start,end in zip(starts, ends)], dtype=float)
+
+    def mark_many(self, starts:np.ndarray, target_values:np.ndarray)->np.ndarray:
+        """
+        Answer many Mark queries at once.
+
+        :param starts, target_values: arrays of the same length.
+        :return: an array whose i-th element is mark(starts[i], target_values[i]), or nan if the target value is too high.
+        """
+        marks = [self.mark(start, target_value) for start,target_value in zip(starts, target_values)]
+        return np.array([np.nan if mark is None else mark for mark in marks], dtype=float)
+
     def value(self, piece:List[tuple]):
         """
         Evaluate a piece made of several intervals.
@@ -86,9 +105,13 @@ class Valuation(ABC):
         return values
 
 
+SHORT_RANGE = 16   # ranges of at most this number of segments are summed directly rather than by prefix sums
+
+
 class PiecewiseConstantValuation(Valuation):
     """
     A PiecewiseConstantValuation is a valuation with a constant density on a finite number of intervals.
+    The cumulative values are computed once, so that each Eval query takes O(1) time and each Mark query takes O(log n) time.
 
     >>> a = PiecewiseConstantValuation([11,22,33,44]) # Four desired intervals: the leftmost has value 11, the second one 22, etc.
     >>> a.total_value()
@@ -107,6 +130,7 @@ class PiecewiseConstantValuation(Valuation):
         self.values = np.array(values)
         self.length = len(values)
         self.total_value_cache = sum(values)
+        self.cumulative_values = np.concatenate(([0], np.cumsum(self.values)))  # cumulative_values[i] = value of [0,i]
 
     def __repr__(self):
         return f"Piecewise-constant valuation with values {self.values} and total value={self.total_value_cache}"
@@ -117,6 +141,25 @@ class PiecewiseConstantValuation(Valuation):
     def cake_length(self):
         return self.length
 
+    def _cumulative_value(self, x:np.ndarray)->np.ndarray:
+        """
+        :return: the value of [0,x], for each x in the given array.
+        """
+        # the cake to the left of 0 and to the right of length is considered worthless.
+        x = np.clip(x, 0, self.length)
+        floor = np.minimum(np.floor(x).astype(int), self.length-1)
+        return self.cumulative_values[floor] + self.values[floor] * (x - floor)
+
+    def _sum_of_segments(self, first:int, last:int):
+        """
+        :return: the total value of the segments first, ..., last-1.
+        Short ranges are summed directly, which is as fast as subtracting prefix sums, and avoids its rounding error.
+        """
+        if last - first <= SHORT_RANGE:
+            return self.values[first:last].sum()
+        else:
+            return self.cumulative_values[last] - self.cumulative_values[first]
+
     def eval(self, start:float, end:float):
         """
         Answer an Eval query: return the value of the interval [start,end].
@@ -140,12 +183,14 @@ class PiecewiseConstantValuation(Valuation):
         44.0
         >>> a.eval(-1,7)
         110.0
+        >>> PiecewiseConstantValuation(range(1000)).eval(0.5, 999.5)
+        499000.5
         """
         # the cake to the left of 0 and to the right of length is considered worthless.
         start = max(0, min(start, self.length))
         end   = max(0, min(end,   self.length))
         if end <= start:
-            return 0.0  # special case not covered by loop below
+            return 0.0  # special case not covered below
 
         fromFloor = int(np.floor(start))
         fromFraction = (fromFloor + 1 - start)
@@ -154,11 +199,24 @@ class PiecewiseConstantValuation(Valuation):
 
         val = 0.0
         val += (self.values[fromFloor] * fromFraction)
-        val += self.values[fromFloor + 1:toCeiling].sum()
+        val += self._sum_of_segments(fromFloor + 1, toCeiling)
         val -= (self.values[toCeiling - 1] * toCeilingRemovedFraction)
 
         return val
 
+    def eval_many(self, starts:np.ndarray, ends:np.ndarray)->np.ndarray:
+        """
+        Answer many Eval queries at once.
+
+        >>> a = PiecewiseConstantValuation([11,22,33,44])
+        >>> a.eval_many([1, 1.5, 3, -1], [3, 3.25, 3, 7])
+        array([ 55.,  55.,   0., 110.])
+        """
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        values = self._cumulative_value(ends) - self._cumulative_value(starts)
+        return np.where(ends <= starts, 0.0, values)
+
     def mark(self, start:float, target_value:float):
         """
         Answer a Mark query: return "end" such that the value of the interval [start,end] is target_value.
@@ -189,26 +247,47 @@ class PiecewiseConstantValuation(Valuation):
             return None  # value is too high
 
         if target_value < 0:
-            raise ValueError("sum out of range (should be positive): {}".format(sum))
+            raise ValueError("sum out of range (should be positive): {}".format(target_value))
 
         start_floor = int(np.floor(start))
-        if start_floor >= len(self.values):
-            raise ValueError("mark({},{}): start_floor ({}) is >= length of values ({})".format(start, target_value, start_floor, self.values))
-
         start_fraction = (start_floor + 1 - start)
 
         value = self.values[start_floor]
         if value * start_fraction >= target_value:
-            return start + (target_value / value)
+            return start + (target_value / value) if value > 0 else start
         target_value -= (value * start_fraction)
-        for i in range(start_floor + 1, self.length):
-            value = self.values[i]
-            if target_value <= value:
-                return i + (target_value / value)
-            target_value -= value
 
-        # Value is too high: return None
-        return None
+        # Binary search for the first segment i such that the value of [start_floor+1, i+1] is at least target_value:
+        goal = self.cumulative_values[start_floor + 1] + target_value
+        i = max(int(np.searchsorted(self.cumulative_values, goal, side='left')) - 1, start_floor + 1)
+        if i >= self.length:
+            return None  # value is too high
+        target_value -= self._sum_of_segments(start_floor + 1, i)
+        return i + (target_value / self.values[i])
+
+    def mark_many(self, starts:np.ndarray, target_values:np.ndarray)->np.ndarray:
+        """
+        Answer many Mark queries at once, using binary search on the cumulative values.
+
+        >>> a = PiecewiseConstantValuation([11,22,33,44])
+        >>> a.mark_many([1, 1.5, 1, 1], [55, 55, 100, 0])
+        array([3.  , 3.25,  nan, 1.  ])
+        >>> PiecewiseConstantValuation([0,0,5]).mark_many([0.5, 0.5], [0, 5])
+        array([0.5, 3. ])
+        """
+        # the cake to the left of 0 is considered worthless.
+        starts = np.maximum(np.asarray(starts, dtype=float), 0)
+        target_values = np.asarray(target_values, dtype=float)
+        goals = self._cumulative_value(starts) + target_values       # the cumulative value at the mark
+        segments = np.searchsorted(self.cumulative_values[1:], goals, side='left')   # the first segment whose end has a cumulative value of at least goal
+        segments = np.maximum(segments, np.floor(starts).astype(int))
+        is_too_high = (starts >= self.length) | (segments >= self.length)
+        segments = np.minimum(segments, self.length-1)
+        segment_values = self.values[segments]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            marks = segments + (goals - self.cumulative_values[segments]) / segment_values
+        marks = np.where(segment_values > 0, np.maximum(marks, starts), starts)   # a zero-valued segment is reached only when target_value is 0
+        return np.where(is_too_high, np.nan, marks)
 
 
 
@@ -706,11 +785,24 @@ class PiecewiseLinearValuation(Valuation):
         if len(values) != len(slopes):
             raise ValueError(f'Values amount: {len(values)} not equal to slopes: {len(slopes)} ')
         super().__init__()
-        self.piece_poly = [set_poly_func(values[i], slopes[i], 0, 1) for i in range(len(values))]
-        self.values_integral = [set_integral_func(self.piece_poly[i], 0, 1) for i in range(len(values))]
         self.values = np.array(values)
+        self.slopes = np.array(slopes, dtype=float)
+        # In each segment, the density at local position x (0<=x<=1) is slopes*x + intercepts,
+        #    so the value of the local interval [0,x] is slopes/2*x^2 + intercepts*x.
+        self.intercepts = self.values - self.slopes / 2
         self.length = len(values)
         self.total_value_cache = sum(values)
+        self.cumulative_values = np.concatenate(([0], np.cumsum(self.values, dtype=float)))  # cumulative_values[i] = value of [0,i]
+
+    @functools.cached_property
+    def piece_poly(self)->List[np.poly1d]:
+        """
+        The density function of each segment, as a polynomial over the local interval [0,1].
+
+        >>> PiecewiseLinearValuation([2,2],[1,0]).piece_poly
+        [poly1d([1. , 1.5]), poly1d([2.])]
+        """
+        return [np.poly1d([slope, intercept]) for slope, intercept in zip(self.slopes, self.intercepts)]
 
     def __repr__(self):
         return f"Piecewise-linear valuation with values {self.values} and total value={self.total_value_cache}"
@@ -721,6 +813,16 @@ class PiecewiseLinearValuation(Valuation):
     def cake_length(self):
         return self.length
 
+    def _cumulative_value(self, x:np.ndarray)->np.ndarray:
+        """
+        :return: the value of [0,x], for each x in the given array.
+        """
+        # the cake to the left of 0 and to the right of length is considered worthless.
+        x = np.clip(x, 0, self.length)
+        floor = np.minimum(np.floor(x).astype(int), self.length-1)
+        fraction = x - floor
+        return self.cumulative_values[floor] + (self.slopes[floor] / 2 * fraction + self.intercepts[floor]) * fraction
+
     def eval(self, start: float, end: float):
         """
         Answer an Eval query: return the value of the interval [start,end].
@@ -740,25 +842,29 @@ class PiecewiseLinearValuation(Valuation):
         55.4375
         >>> a.eval(3,3)
         0.0
+        >>> a.eval(1.25,1.5)   # density 2x+21 on [0.25,0.5]
+        5.4375
         """
         if start < 0 or end > self.length:
             raise ValueError(f'Interval range are invalid start={start}, end={end}, length={self.length}')
-
         if end <= start:
-            return 0.0  # special case not covered by loop below
+            return 0.0
+        return float(self._cumulative_value(end) - self._cumulative_value(start))
 
-        fromFloor = int(np.floor(start))
-        fromFraction = (fromFloor + 1 - start) if start > fromFloor else 0.0
-        toCeiling = int(np.ceil(end))
-        toCeilingRemovedFraction = (toCeiling - end)
+    def eval_many(self, starts:np.ndarray, ends:np.ndarray)->np.ndarray:
+        """
+        Answer many Eval queries at once.
 
-        val = 0.0
-        for func_i in range(fromFloor, toCeiling):
-            interval_start = fromFraction
-            interval_end = 1 if (func_i + 1) != toCeiling else 1 - toCeilingRemovedFraction
-            val += self.values_integral[func_i](interval_start, interval_end)
-            fromFraction = 0
-        return val
+        >>> a = PiecewiseLinearValuation([11,22,33,44],[1,2,3,-2])
+        >>> a.eval_many([1, 1.5, 1, 3], [3, 3, 3.25, 3])
+        array([55.    , 44.25  , 66.1875,  0.    ])
+        """
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        if np.any(starts < 0) or np.any(ends > self.length):
+            raise ValueError(f'Interval range are invalid starts={starts}, ends={ends}, length={self.length}')
+        values = self._cumulative_value(ends) - self._cumulative_value(starts)
+        return np.where(ends <= starts, 0.0, values)
 
     def mark(self, start: float, target_value: float):
         """
@@ -771,77 +877,66 @@ class PiecewiseLinearValuation(Valuation):
 
         >>> a = PiecewiseLinearValuation([11,22,33,44],[1,2,0,-4])
         >>> a.mark(1, 55)
-        3
-        >>> a.mark(1.5, 44)
-        2.992
-        >>> a.mark(1, 66)
-        3.242
-        >>> a.mark(1.5, 55)
-        3.236
+        3.0
+        >>> round(a.mark(1.5, 44), 6)
+        2.992424
+        >>> round(a.mark(1, 66), 6)
+        3.24167
+        >>> round(a.mark(1.5, 55), 6)
+        3.23612
         >>> a.mark(1, 99)
-        4
+        4.0
         >>> a.mark(1, 100)
         >>> a.mark(1, 0)
         1.0
         >>> a = PiecewiseLinearValuation([2,2],[1,0])
-        >>> a.mark(0,1)
-        0.562
+        >>> round(a.mark(0,1), 6)
+        0.561553
         >>> a.mark(1,1)
         1.5
         >>> a.mark(1,2)
-        2
+        2.0
         >>> a.mark(0,3)
         1.5
         >>> a.mark(0,6) # returns none since no such value exists
-        >>> a.mark(0,0.2)
-        0.128
+        >>> round(a.mark(0,0.2), 6)
+        0.127882
+        >>> a.mark(0.5, a.eval(0.5, 0.75))
+        0.75
         """
-        # the cake to the left of 0 and to the right of length is considered worthless.
-        start = max(0, start)
-        if start >= self.length:
-            return None  # value is too high
-
         if target_value < 0:
-            raise ValueError("sum out of range (should be positive): {}".format(sum))
-
-        start_floor = int(np.floor(start))
-        if start_floor >= len(self.values):
-            raise ValueError(
-                f"mark({start},{target_value}): start_floor ({start_floor}) is >= length of values ({self.values})")
-
-        start_fraction = (start_floor + 1 - start) if start > start_floor else 0.0
-        current_value = self.values_integral[start_floor](start_fraction, 1)
-        if current_value == target_value:
-            return start_floor + 1
-        elif current_value < target_value:
-            return self.mark(start_floor + 1, target_value - current_value)
-        else:
-            inte_poly = np.polyint(self.piece_poly[start_floor])
-            if inte_poly.order > 1:
-                temp_poly = np.poly1d([target_value])
-                target_poly = inte_poly - temp_poly
-                for root in target_poly.r:
-                    if 0 <= root <= 1:
-                        return round(start_floor + root, 3)
-            else:
-                return round((target_value / current_value) + start_floor, 3)
-        # Value is too high: return None
-        return None
-
-
-def set_poly_func(value, slope, x_0, x_1):
-    value_0, _ = integrate.quad(func_x(slope), x_0, x_1)
-    const = (value - value_0)/(x_1 - x_0)
-    return np.poly1d([slope, const])
-
-
-def set_integral_func(poly, x_0, x_1):
-    integ = poly.integ()
-    return lambda start, end: ((integ(end) - integ(start)) if x_0 <= start and end <= x_1 else 0)
+            raise ValueError("sum out of range (should be positive): {}".format(target_value))
+        mark = self.mark_many([start], [target_value])[0]
+        return None if np.isnan(mark) else float(mark)
 
+    def mark_many(self, starts:np.ndarray, target_values:np.ndarray)->np.ndarray:
+        """
+        Answer many Mark queries at once: binary search on the cumulative values finds the segment of each mark,
+        and the quadratic equation within that segment is solved in closed form.
 
-def func_x(m, c=0):
-    return lambda x: m * x + c
+        >>> a = PiecewiseLinearValuation([11,22,33,44],[1,2,0,-4])
+        >>> a.mark_many([1, 1, 1, 1], [55, 99, 100, 0])
+        array([ 3.,  4., nan,  1.])
+        >>> PiecewiseLinearValuation([0,0,5],[0,0,2]).mark_many([0.5, 0.5], [0, 5])
+        array([0.5, 3. ])
+        """
+        # the cake to the left of 0 is considered worthless.
+        starts = np.maximum(np.asarray(starts, dtype=float), 0)
+        target_values = np.asarray(target_values, dtype=float)
+        goals = self._cumulative_value(starts) + target_values       # the cumulative value at the mark
+        segments = np.searchsorted(self.cumulative_values[1:], goals, side='left')   # the first segment whose end has a cumulative value of at least goal
+        segments = np.maximum(segments, np.floor(starts).astype(int))
+        is_too_high = (starts >= self.length) | (segments >= self.length)
+        segments = np.minimum(segments, self.length-1)
+        # Solve slope/2*x^2 + intercept*x = remaining, using the form of the root that is stable when slope is near 0:
+        remaining = np.maximum(goals - self.cumulative_values[segments], 0)
+        slopes = self.slopes[segments]
+        intercepts = self.intercepts[segments]
+        denominators = intercepts + np.sqrt(np.maximum(intercepts**2 + 2 * slopes * remaining, 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fractions = np.where(denominators > 0, 2 * remaining / denominators, 0.0)
+        marks = np.maximum(segments + np.minimum(fractions, 1), starts)
+        return np.where(is_too_high, np.nan, marks)
 
 
 if __name__ == "__main__":
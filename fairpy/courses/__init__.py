@@ -1,5 +1,5 @@
 # Infrastructure:
-from fairpy.courses.instance import Instance
+from fairpy.courses.instance import Instance, DenseInstance
 from fairpy.courses.adaptors import divide
 from fairpy.courses.satisfaction import AgentBundleValueMatrix
 from fairpy.courses.allocation_utils import validate_allocation
@@ -10,5 +10,5 @@ from fairpy.courses.iterated_maximum_matching import iterated_maximum_matching,
 from fairpy.courses.utilitarian_matching import utilitarian_matching
 from fairpy.courses.picking_sequence import picking_sequence, serial_dictatorship, round_robin,  bidirectional_round_robin
 from fairpy.courses.yekta_day import yekta_day
-from fairpy.courses.almost_egalitarian import almost_egalitarian_allocation, almost_egalitarian_with_donation, almost_egalitarian_without_donation
+from fairpy.courses.almost_egalitarian import almost_egalitarian_allocation, almost_egalitarian_with_donation, almost_egalitarian_without_donation, almost_egalitarian_leximin
 from fairpy.courses.othman_sandholm_budish import general_course_allocation as othman_sandholm_budish
@@ -11,9 +11,9 @@ Since: 2023-07
 """
 
 import fairpy, numpy as np
-from fairpy.courses.instance import Instance
+from fairpy.courses.instance import Instance, DenseInstance
 from fairpy.courses.satisfaction import AgentBundleValueMatrix
-from fairpy.courses.allocation_utils import validate_allocation, allocation_is_fractional, AllocationBuilder
+from fairpy.courses.allocation_utils import validate_allocation, allocation_is_fractional, AllocationBuilder, DenseAllocationBuilder
 from fairpy.courses.explanations import ExplanationLogger
 
 def divide(
@@ -45,7 +45,7 @@ def divide(
     """
     if instance is None:
         instance = Instance(valuations=valuations, agent_capacities=agent_capacities, item_capacities=item_capacities)
-    alloc = AllocationBuilder(instance)
+    alloc = DenseAllocationBuilder(instance) if isinstance(instance, DenseInstance) else AllocationBuilder(instance)
     explanation_logger:ExplanationLogger = kwargs.get("explanation_logger", None)
     if explanation_logger:
         # instance.explain_valuations(explanation_logger)
@@ -96,7 +96,7 @@ def divide_with_priorities(
     """
     if instance is None:
         instance = Instance(valuations=valuations, agent_capacities=agent_capacities, item_capacities=item_capacities)
-    alloc = AllocationBuilder(instance)
+    alloc = DenseAllocationBuilder(instance) if isinstance(instance, DenseInstance) else AllocationBuilder(instance)
     explanation_logger = kwargs.get("explanation_logger",None)
     if explanation_logger:
         # instance.explain_valuations(explanation_logger)
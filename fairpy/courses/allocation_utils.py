@@ -4,8 +4,9 @@ Utils for post-processing allocations
 
 import numpy as np
 
-from fairpy.courses.instance import Instance
-from collections import defaultdict
+from fairpy.courses.instance import Instance, DenseInstance
+from collections import defaultdict, Counter
+from collections.abc import Mapping, MutableMapping, KeysView
 
 # The following constant is used as an item value, to indicate that this item must not be allocated to the agent.
 FORBIDDEN_ALLOCATION = -np.inf
@@ -143,6 +144,8 @@ class AllocationBuilder:
         for agent in self.remaining_agents():
             for conflicting_item in self.instance.agent_conflicts(agent):
                 self.remaining_agent_item_value[agent][conflicting_item] = FORBIDDEN_ALLOCATION
+        # map each item to the items that conflict with it (including itself), so that 'give' does not call the instance.
+        self.item_conflict_index = {item: (item,)+tuple(instance.item_conflicts(item)) for item in instance.items}
         self.bundles = {agent: set() for agent in instance.agents}    # Each bundle is a set, since each agent can get at most one seat in each course
 
     def remaining_items(self)->list: 
@@ -177,9 +180,9 @@ class AllocationBuilder:
         self.remaining_item_capacities[item] -= 1
         if self.remaining_item_capacities[item] <= 0:
             self.remove_item(item)
-        self.remaining_agent_item_value[agent][item] = FORBIDDEN_ALLOCATION
-        for conflicting_item in self.instance.item_conflicts(item):
-            self.remaining_agent_item_value[agent][conflicting_item] = FORBIDDEN_ALLOCATION
+        agent_item_value = self.remaining_agent_item_value[agent]
+        for forbidden_item in self.item_conflict_index[item]:
+            agent_item_value[forbidden_item] = FORBIDDEN_ALLOCATION
 
 
     def give_bundle(self, agent:any, new_bundle:list, logger=None):
@@ -192,10 +195,7 @@ class AllocationBuilder:
         NOTE: No validity check is done - use at your own risk!
         """
         map_agent_to_num_of_items = {agent: len(bundle) for agent,bundle in new_bundles.items()}
-        map_item_to_num_of_owners = {item: 0 for item in self.instance.items}
-        for agent,bundle in new_bundles.items():
-            for item in bundle:
-                map_item_to_num_of_owners[item] += 1
+        map_item_to_num_of_owners = Counter(item for bundle in new_bundles.values() for item in bundle)
 
         for agent,num_of_items in map_agent_to_num_of_items.items():
             if num_of_items==0: continue
@@ -234,6 +234,220 @@ class AllocationBuilder:
         return self.bundles
 
 
+class DenseAllocationBuilder(AllocationBuilder):
+    """
+    An AllocationBuilder for a DenseInstance.
+
+    The remaining capacities and values are kept in arrays, and 'give' and 'give_bundles' update them in place.
+    The fields 'remaining_agent_capacities', 'remaining_item_capacities' and 'remaining_agent_item_value' are dict-like views of these arrays,
+    so every algorithm that works with an AllocationBuilder works with it too.
+
+    >>> instance = DenseInstance(
+    ...   agent_capacities = [2, 3], 
+    ...   item_capacities  = [4, 5], 
+    ...   valuations       = [[11, 22], [33, 44]],
+    ...   agent_conflicts  = [[False, False], [False, True]],
+    ...   item_conflicts   = [[False, True], [True, False]],
+    ...   agents = ["Alice", "Bob"], items = ["c1", "c2"])
+    >>> alloc = DenseAllocationBuilder(instance)
+    >>> alloc.remaining_agent_item_value
+    {'Alice': {'c1': 11.0, 'c2': 22.0}, 'Bob': {'c1': 33.0, 'c2': -inf}}
+    >>> alloc.give('Alice', 'c1')
+    >>> alloc.remaining_agent_capacities
+    {'Alice': 1, 'Bob': 3}
+    >>> alloc.remaining_item_capacities
+    {'c1': 3, 'c2': 5}
+    >>> alloc.remaining_agent_item_value
+    {'Alice': {'c1': -inf, 'c2': -inf}, 'Bob': {'c1': 33.0, 'c2': -inf}}
+    >>> alloc.give_bundles({"Bob": ["c1"]})
+    >>> alloc.remaining_item_capacities
+    {'c1': 2, 'c2': 5}
+    >>> list(reversed(alloc.remaining_agents()))
+    ['Bob', 'Alice']
+    >>> remaining_instance = alloc.remaining_instance()
+    >>> list(remaining_instance.agents), remaining_instance.agent_capacity("Bob"), remaining_instance.item_capacity("c1")
+    (['Alice', 'Bob'], 2, 2)
+    >>> alloc.sorted()
+    {'Alice': ['c1'], 'Bob': ['c1']}
+    """
+    def __init__(self, instance:DenseInstance):
+        self.instance = instance
+        self.agent_rows = np.array([instance.agent_index[agent] for agent in instance.agents], dtype=int)
+        self.item_columns = np.array([instance.item_index[item] for item in instance.items], dtype=int)
+        self.remaining_agent_capacity_vector = instance.agent_capacities.copy()
+        self.remaining_item_capacity_vector = instance.item_capacities.copy()
+        self.remaining_value_matrix = instance.valuations.copy()
+        self.remaining_value_matrix[instance.agent_conflict_matrix] = FORBIDDEN_ALLOCATION
+        self._remaining_agent_capacities = _CapacityView(self.remaining_agent_capacity_vector, instance.agents, self.agent_rows, instance.agent_index)
+        self._remaining_item_capacities  = _CapacityView(self.remaining_item_capacity_vector, instance.items, self.item_columns, instance.item_index)
+        self.remaining_agent_item_value  = _ValueMatrixView(self.remaining_value_matrix, instance)
+        self.bundles = {agent: set() for agent in instance.agents}    # Each bundle is a set, since each agent can get at most one seat in each course
+
+    @property
+    def remaining_agent_capacities(self)->MutableMapping:
+        return self._remaining_agent_capacities
+
+    @remaining_agent_capacities.setter
+    def remaining_agent_capacities(self, new_capacities:dict):
+        self._remaining_agent_capacities.reset(new_capacities)
+
+    @property
+    def remaining_item_capacities(self)->MutableMapping:
+        return self._remaining_item_capacities
+
+    @remaining_item_capacities.setter
+    def remaining_item_capacities(self, new_capacities:dict):
+        self._remaining_item_capacities.reset(new_capacities)
+
+    def remaining_instance(self)->DenseInstance:
+        """
+        Return a view of the remaining instance, that shares the arrays of this builder (no copying).
+        """
+        return self.instance.view(
+            agents=list(self.remaining_agents()), items=list(self.remaining_items()),
+            valuations=self.remaining_value_matrix, 
+            agent_capacities=self.remaining_agent_capacity_vector, item_capacities=self.remaining_item_capacity_vector)
+
+    def give(self, agent:any, item:any, logger=None):
+        i, j = self.instance.agent_index[agent], self.instance.item_index[item]
+        if self.remaining_agent_capacity_vector[i] <= 0:
+            raise ValueError(f"Agent {agent} has no remaining capacity for item {item}")
+        if self.remaining_item_capacity_vector[j] <= 0:
+            raise ValueError(f"Item {item} has no remaining capacity for agent {agent}")
+        self.bundles[agent].add(item)
+        if logger is not None:
+            logger.info("Agent %s takes item %s with value %s", agent, item, self.instance.agent_item_value(agent, item))
+        self.remaining_agent_capacity_vector[i] -= 1
+        self.remaining_item_capacity_vector[j] -= 1
+        self.remaining_value_matrix[i,j] = FORBIDDEN_ALLOCATION
+        self.remaining_value_matrix[i, self.instance.item_conflict_matrix[j]] = FORBIDDEN_ALLOCATION
+
+    def give_bundles(self, new_bundles:dict, logger=None):
+        """
+        Add an entire set of bundles to this allocation.
+        NOTE: No validity check is done - use at your own risk!
+        """
+        rows, columns = [], []
+        for agent,bundle in new_bundles.items():
+            i = self.instance.agent_index[agent]
+            for item in bundle:
+                rows.append(i)
+                columns.append(self.instance.item_index[item])
+        rows, columns = np.array(rows, dtype=int), np.array(columns, dtype=int)
+        # Only the rows and columns that appear in the bundles are touched:
+        agent_rows, num_of_new_items = np.unique(rows, return_counts=True)
+        item_columns, num_of_new_owners = np.unique(columns, return_counts=True)
+        for i,count in zip(agent_rows, num_of_new_items):
+            if count > self.remaining_agent_capacity_vector[i]:
+                raise ValueError(f"Agent {self.instance.agents[i]} has no remaining capacity for {count} new items")
+        for j,count in zip(item_columns, num_of_new_owners):
+            if count > self.remaining_item_capacity_vector[j]:
+                raise ValueError(f"Item {self.instance.items[j]} has no remaining capacity for {count} new agents")
+        self.remaining_agent_capacity_vector[agent_rows] -= num_of_new_items
+        self.remaining_item_capacity_vector[item_columns] -= num_of_new_owners
+        self.remaining_value_matrix[rows, columns] = -1  # prevent the agent from getting the same item again.
+        for agent,bundle in new_bundles.items():
+            self.bundles[agent].update(bundle)
+
+
+class _CapacityView(MutableMapping):
+    """
+    A dict-like view of a capacity vector, that contains only the keys with a positive capacity.
+    Deleting a key sets its capacity to 0.
+    """
+    def __init__(self, vector:np.ndarray, keys:list, positions:np.ndarray, index:dict):
+        self.vector, self.keys_list, self.positions, self.index = vector, list(keys), positions, index
+
+    def __getitem__(self, key):
+        capacity = self.vector[self.index[key]]
+        if capacity <= 0:
+            raise KeyError(key)
+        return int(capacity)
+
+    def __setitem__(self, key, capacity:int):
+        self.vector[self.index[key]] = capacity
+
+    def __delitem__(self, key):
+        self.vector[self.index[key]] = 0
+
+    def __contains__(self, key):
+        return key in self.index and self.vector[self.index[key]] > 0
+
+    def __iter__(self):
+        return (self.keys_list[k] for k in np.flatnonzero(self.vector[self.positions] > 0))
+
+    def __reversed__(self):
+        return (self.keys_list[k] for k in np.flatnonzero(self.vector[self.positions] > 0)[::-1])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.vector[self.positions] > 0))
+
+    def keys(self):
+        return _ReversibleKeysView(self)
+
+    def reset(self, new_capacities:dict):
+        self.vector[self.positions] = 0
+        for key,capacity in new_capacities.items():
+            self[key] = capacity
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _ReversibleKeysView(KeysView):
+    """
+    A keys view that can be reversed, like the keys view of a dict.
+    """
+    def __reversed__(self):
+        return reversed(self._mapping)
+
+
+class _ValueMatrixView(Mapping):
+    """
+    A dict-of-dicts-like view of a value matrix: view[agent][item] is the value of agent to item.
+    """
+    def __init__(self, matrix:np.ndarray, instance:DenseInstance):
+        self.matrix, self.instance = matrix, instance
+
+    def __getitem__(self, agent):
+        return _ValueRowView(self.matrix[self.instance.agent_index[agent]], self.instance)
+
+    def __iter__(self):
+        return iter(self.instance.agents)
+
+    def __len__(self):
+        return len(self.instance.agents)
+
+    def __repr__(self):
+        return repr({agent: dict(row) for agent,row in self.items()})
+
+
+class _ValueRowView(MutableMapping):
+    """
+    A dict-like view of a single row of a value matrix: row[item] is the value of the row's agent to item.
+    """
+    def __init__(self, row:np.ndarray, instance:DenseInstance):
+        self.row, self.instance = row, instance
+
+    def __getitem__(self, item):
+        return float(self.row[self.instance.item_index[item]])
+
+    def __setitem__(self, item, value):
+        self.row[self.instance.item_index[item]] = value
+
+    def __delitem__(self, item):
+        raise TypeError("Cannot delete an item from a value matrix")
+
+    def __iter__(self):
+        return iter(self.instance.items)
+
+    def __len__(self):
+        return len(self.instance.items)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 if __name__ == "__main__":
     import doctest
     print(doctest.testmod(optionflags=doctest.ELLIPSIS+doctest.NORMALIZE_WHITESPACE))
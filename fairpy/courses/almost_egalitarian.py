@@ -10,9 +10,10 @@ from fairpy.courses.instance    import Instance
 from fairpy.courses.allocation_utils import AllocationBuilder
 from fairpy.courses.iterated_maximum_matching import iterated_maximum_matching
 from fairpy.courses.fractional_egalitarian import fractional_egalitarian_utilitarian_allocation
+from fairpy.courses.fractional_egalitarian_leximin import fractional_leximin_saturation_allocation
 from fairpy.courses.explanations import *
 
-import cvxpy, numpy as np, networkx
+import cvxpy, numpy as np, networkx, heapq
 from cvxpy_leximin import Problem, Leximin
 from fairpy.solve import solve
 import matplotlib.pyplot as plt # for plotting the consumption graph (for debugging)
@@ -22,11 +23,14 @@ import logging
 logger = logging.getLogger(__name__)
 
 MIN_EDGE_FRACTION=0.01
-def almost_egalitarian_allocation(alloc: AllocationBuilder, surplus_donation:bool=False, explanation_logger:ExplanationLogger=ExplanationLogger(), **solver_options):
+def almost_egalitarian_allocation(alloc: AllocationBuilder, surplus_donation:bool=False, leximin:bool=False, explanation_logger:ExplanationLogger=ExplanationLogger(), **solver_options):
     """
     Finds an almost-egalitarian allocation.
     :param alloc: an allocation builder, which tracks the allocation and the remaining capacity for items and agents. of the fair course allocation problem. 
     :param surplus_donation: if True, agents who gain utility from previously-removed edges will donate some of their edges to others.
+    :param leximin: if True, round a leximin-optimal fractional allocation (computed by iterative saturation);
+         if False, round an egalitarian allocation that is utilitarian among the egalitarian ones.
+    :param solver_options: kwargs sent to the fractional allocation algorithm.
 
     >>> from fairpy.courses.adaptors import divide
 
@@ -47,137 +51,196 @@ def almost_egalitarian_allocation(alloc: AllocationBuilder, surplus_donation:boo
     >>> instance = Instance(valuations={"avi": {"x":5, "y":4, "z":3, "w":2}, "beni": {"x":2, "y":3, "z":4, "w":5}}, agent_capacities=4, item_capacities=2)
     >>> stringify(divide(almost_egalitarian_allocation, instance=instance))
     "{avi:['w', 'x', 'y', 'z'], beni:['w', 'x', 'y', 'z']}"
-    """
-    # fractional_allocation = fractional_leximin_optimal_allocation(alloc.remaining_instance(), **solver_options) # Too slow
 
+    >>> instance = Instance(valuations={"avi": {"x":5, "y":4, "z":3, "w":2}, "beni": {"x":2, "y":3, "z":4, "w":5}}, agent_capacities=2, item_capacities=1)
+    >>> stringify(divide(almost_egalitarian_allocation, instance=instance, leximin=True))
+    "{avi:['x', 'y'], beni:['w', 'z']}"
+    """
     explanation_logger.info("\nAlgorithm Almost-Egalitarian starts.\n")
 
-    fractional_allocation = fractional_egalitarian_utilitarian_allocation(alloc.remaining_instance(), **solver_options)
+    if leximin:
+        fractional_allocation = fractional_leximin_saturation_allocation(alloc.remaining_instance(), **solver_options)
+    else:
+        fractional_allocation = fractional_egalitarian_utilitarian_allocation(alloc.remaining_instance(), **solver_options)
     explanation_logger.explain_fractional_allocation(fractional_allocation, alloc.instance)
 
-    fractional_allocation_graph = consumption_graph(fractional_allocation, min_fraction=MIN_EDGE_FRACTION, agent_item_value=lambda agent,item:alloc.remaining_agent_item_value[agent][item])
-    explanation_logger.debug("\nfractional_allocation_graph:\n%s", fractional_allocation_graph.edges.data())
+    # The consumption graph is kept as arrays indexed by edge, with an adjacency dict (neighbor index -> edge index) for each node.
+    # Candidate leaves are kept in heaps that are updated whenever an edge is removed or re-weighted,
+    # so that each rounding step does not need a scan of the whole graph.
+    # The heaps are ordered so that the rounding visits the leaves and edges in the same order as a scan of the consumption graph would.
+    agents = list(fractional_allocation.keys())
+    items = list(alloc.remaining_items())
+    item_index = {item:j for j,item in enumerate(items)}
+    edge_agent, edge_item, edge_weight, edge_fraction = [], [], [], []
+    agent_neighbors = [{} for _ in agents]   # agent_neighbors[i][j] is the index of the edge between agent i and item j.
+    item_neighbors  = [{} for _ in items]    # item_neighbors[j][i] is the index of the edge between agent i and item j.
+    for i,agent in enumerate(agents):
+        for item,fraction in fractional_allocation[agent].items():
+            if fraction>=MIN_EDGE_FRACTION:
+                j = item_index[item]
+                agent_neighbors[i][j] = item_neighbors[j][i] = len(edge_agent)
+                edge_agent.append(i)
+                edge_item.append(j)
+                edge_weight.append(np.round(fraction,2))
+                edge_fraction.append(fraction)
+    num_of_edges = len(edge_agent)
+    explanation_logger.debug("\nfractional_allocation_graph:\n%s", [(agents[edge_agent[e]], items[edge_item[e]], edge_weight[e]) for e in range(num_of_edges)])
+
+    # Agent leaves are handled in the order of the remaining agents, and edges of equal weight in the order of consumption_graph(...).edges().
+    agent_rank = {agent:r for r,agent in enumerate(alloc.remaining_agents())}
+    agent_rank = [agent_rank.get(agent, len(agent_rank)+i) for i,agent in enumerate(agents)]
+    edge_rank = _consumption_graph_edge_order(edge_agent, edge_item, agent_neighbors, item_neighbors)
+
+    # The items are scanned in passes; a near-1 edge that appears behind the current position of the scan waits for the next pass.
+    NEAR_1_FRACTION = 1-2*MIN_EDGE_FRACTION
+    scan_position = -1   # the index of the item currently scanned, or -1 between passes.
+    items_in_this_pass = list({edge_item[e] for e in range(num_of_edges) if edge_fraction[e] >= NEAR_1_FRACTION})
+    items_in_next_pass = []
+    agent_leaves = [(agent_rank[i], i) for i in range(len(agents)) if len(agent_neighbors[i])==1]
+    min_weight_edges = [(edge_weight[e], edge_rank[e], e) for e in range(num_of_edges)]
+    heapq.heapify(items_in_this_pass)
+    heapq.heapify(agent_leaves)
+    heapq.heapify(min_weight_edges)
 
     explanation_logger.info("\nStarting to round the fractional allocation.\n")
 
-
-    def agent_item_tuple(edge):
-        if edge[0] in alloc.remaining_agents():
-            return (edge[0],edge[1])
-        else:
-            return (edge[1],edge[0])
-        
-    agent_surplus = {agent: 0 for agent in alloc.remaining_agents()}
-
-    def add_surplus (agent, value_to_add):
-        agent_surplus[agent] += value_to_add
+    def edge_exists(e)->bool:
+        return item_neighbors[edge_item[e]].get(edge_agent[e]) == e
+
+    def remove_edge(e):
+        nonlocal num_of_edges
+        i, j = edge_agent[e], edge_item[e]
+        del agent_neighbors[i][j]
+        del item_neighbors[j][i]
+        num_of_edges -= 1
+        fractional_allocation[agents[i]][items[j]] = 0
+        if len(agent_neighbors[i])==1:
+            heapq.heappush(agent_leaves, (agent_rank[i], i))
+
+    def set_edge_fraction(e, new_fraction):
+        edge_weight[e] = edge_fraction[e] = new_fraction
+        fractional_allocation[agents[edge_agent[e]]][items[edge_item[e]]] = new_fraction
+        heapq.heappush(min_weight_edges, (new_fraction, edge_rank[e], e))
+        if new_fraction >= NEAR_1_FRACTION:
+            j = edge_item[e]
+            heapq.heappush(items_in_this_pass if j > scan_position else items_in_next_pass, j)
+
+    agent_surplus = [0 for _ in agents]
+
+    def add_surplus (i, value_to_add):
+        agent = agents[i]
+        agent_surplus[i] += value_to_add
         items_to_remove = []
-        for neighbor_item in fractional_allocation_graph.neighbors(agent):
-            current_neighbor_weight = fractional_allocation_graph[agent][neighbor_item]['weight']
+        for j,e in agent_neighbors[i].items():
+            neighbor_item = items[j]
+            current_neighbor_weight = edge_weight[e]
             current_neighbor_value  = current_neighbor_weight * alloc.remaining_agent_item_value[agent][neighbor_item]
-            if current_neighbor_value <= agent_surplus[agent]:
-                explanation_logger.info("  You have a surplus of %g, so you donate your share of %g%% in course %s (value %g)", agent_surplus[agent], np.round(100*current_neighbor_weight), neighbor_item, current_neighbor_value, agents=agent)
-                items_to_remove.append(neighbor_item)
-                agent_surplus[agent] -= current_neighbor_value
-        for neighbor_item in items_to_remove:
-            remove_edge_from_graph(agent, neighbor_item)
+            if current_neighbor_value <= agent_surplus[i]:
+                explanation_logger.info("  You have a surplus of %g, so you donate your share of %g%% in course %s (value %g)", agent_surplus[i], np.round(100*current_neighbor_weight), neighbor_item, current_neighbor_value, agents=agent)
+                items_to_remove.append(j)
+                agent_surplus[i] -= current_neighbor_value
+        for j in items_to_remove:
+            remove_edge_from_graph(i, j)
 
 
-    def remove_edge_from_graph(agent,item):
+    def remove_edge_from_graph(i,j):
         """
-        Remove the edge (agent,item) from the graph, and redistribute its weight among the neighboring agents of item.
+        Remove the edge (agent i, item j) from the graph, and redistribute its weight among the neighboring agents of item j.
         """
-        weight_for_redistribution = fractional_allocation[agent][item] # this weight should be redistributed to other neighbors of the item
-        fractional_allocation[agent][item] = 0
-        if fractional_allocation_graph.has_edge(agent,item):
-            fractional_allocation_graph.remove_edge(agent,item)
+        agent, item = agents[i], items[j]
+        e = agent_neighbors[i].get(j)
+        if e is None:   # the edge was already removed, e.g. by a donation, so there is nothing to redistribute.
+            weight_for_redistribution = 0
+        else:
+            weight_for_redistribution = edge_fraction[e] # this weight should be redistributed to other neighbors of the item
+            remove_edge(e)
         surplus_to_add = {}
-        for neighbor_agent in fractional_allocation_graph.neighbors(item):
-            current_neighbor_weight = fractional_allocation_graph[neighbor_agent][item]['weight']
+        for neighbor_index,neighbor_edge in item_neighbors[j].items():
+            current_neighbor_weight = edge_weight[neighbor_edge]
 
             weight_to_add = min(weight_for_redistribution, 1-current_neighbor_weight)
-            fractional_allocation[neighbor_agent][item] = fractional_allocation_graph[neighbor_agent][item]['weight'] = current_neighbor_weight + weight_to_add
+            set_edge_fraction(neighbor_edge, current_neighbor_weight + weight_to_add)
             weight_for_redistribution -= weight_to_add
 
             value_to_add = weight_to_add*alloc.remaining_agent_item_value[agent][item]
-            explanation_logger.info("  Edge (%s,%s) is removed, so you receive additional %g%% of course %s (value %g).", agent,item,np.round(100*weight_to_add),item, value_to_add, agents=neighbor_agent)
-            surplus_to_add[neighbor_agent] = value_to_add
+            explanation_logger.info("  Edge (%s,%s) is removed, so you receive additional %g%% of course %s (value %g).", agent,item,np.round(100*weight_to_add),item, value_to_add, agents=agents[neighbor_index])
+            surplus_to_add[neighbor_index] = value_to_add
             if weight_for_redistribution<=0:
                 break
         if surplus_donation:
-            for neighbor_agent,value_to_add in surplus_to_add.items():
-                add_surplus(neighbor_agent, value_to_add)
+            for neighbor_index,value_to_add in surplus_to_add.items():
+                add_surplus(neighbor_index, value_to_add)
 
 
-    def remove_agent_from_graph(agent):
+    def remove_agent_from_graph(i):
         """
-        Remove the agent from the graph, and redistribute its belongings among the neighboring agents of these items.
+        Remove the agent i from the graph, and redistribute its belongings among the neighboring agents of these items.
         """
-        neighbors = list(fractional_allocation_graph.neighbors(agent))
-        for item in neighbors:
-            remove_edge_from_graph(agent,item)
-
-    # draw_bipartite_weighted_graph(fractional_allocation_graph, alloc.remaining_agents())
-    while fractional_allocation_graph.number_of_edges()>0:
-        # Look for an item leaf:
-        # edges_with_fraction_near_1 = [(u,v) for u,v in fractional_allocation_graph.edges if fractional_allocation_graph[u][v]['weight'] >= 1-2*MIN_EDGE_FRACTION]
-        # max_value_edge = max(edges_with_fraction_near_1, key=lambda u,v: fractional_allocation_graph[u][v]['value'])
+        for j in list(agent_neighbors[i]):
+            remove_edge_from_graph(i,j)
 
+    while num_of_edges>0:
+        # Look for items with a neighbor whose fraction is near 1, in one pass over the items:
         found_item_leaf = False
-        for item in list(alloc.remaining_items()):
-            if item in fractional_allocation_graph.nodes:
-                item_neighbors = list(fractional_allocation_graph.neighbors(item))
-                for agent in item_neighbors:
-                    if fractional_allocation[agent][item] >= 1-2*MIN_EDGE_FRACTION:
-                        # Give an entire unit of the item to the neighbor agent
-                        alloc.give(agent, item)
-                        explanation_logger.info("Course %s is a leaf node, and you are its only neighbor, so you get all of it to yourself.", item, agents=agent)
-                        fractional_allocation[agent][item] = 0
-                        fractional_allocation_graph.remove_edge(agent,item)
-                        if not agent in alloc.remaining_agent_capacities:
-                            explanation_logger.info("You have received %s and you have no remaining capacity.", alloc.bundles[agent], agents=agent)
-                            remove_agent_from_graph(agent)
-                        explanation_logger.debug("\nfractional_allocation_graph:\n%s", fractional_allocation_graph.edges.data())
-                        found_item_leaf = True
+        while items_in_this_pass:
+            j = heapq.heappop(items_in_this_pass)
+            if j <= scan_position:
+                continue   # a duplicate entry
+            scan_position = j
+            item = items[j]
+            if item not in alloc.remaining_item_capacities:
+                continue
+            for i in list(item_neighbors[j]):
+                e = item_neighbors[j].get(i)
+                if e is None or edge_fraction[e] < NEAR_1_FRACTION or item not in alloc.remaining_item_capacities:
+                    continue
+                agent = agents[i]
+                # Give an entire unit of the item to the neighbor agent
+                alloc.give(agent, item)
+                explanation_logger.info("Course %s is a leaf node, and you are its only neighbor, so you get all of it to yourself.", item, agents=agent)
+                remove_edge(e)
+                if not agent in alloc.remaining_agent_capacities:
+                    explanation_logger.info("You have received %s and you have no remaining capacity.", alloc.bundles[agent], agents=agent)
+                    remove_agent_from_graph(i)
+                found_item_leaf = True
+        scan_position = -1
+        items_in_this_pass, items_in_next_pass = items_in_next_pass, items_in_this_pass
+        heapq.heapify(items_in_this_pass)
         if found_item_leaf:
-            # draw_bipartite_weighted_graph(fractional_allocation_graph, alloc.remaining_agents())
             continue
 
         # No item is a leaf - look for an agent leaf:
-        found_agent_leaf = False
-        for agent in alloc.remaining_agents():
-            if not agent in fractional_allocation_graph:
-                continue
-            if fractional_allocation_graph.degree[agent]==1:
-                # A leaf agent: disconnect him from his only neighbor (since it is a good)
-                item = next(fractional_allocation_graph.neighbors(agent))
-                if fractional_allocation_graph.degree[item]>1:
-                    explanation_logger.info("\nYou are a leaf node, so you lose your only neighbor %s", item, agents=agent)
-                    remove_agent_from_graph(agent)
+        if agent_leaves:
+            _,i = heapq.heappop(agent_leaves)
+            agent = agents[i]
+            if len(agent_neighbors[i])!=1 or agent not in alloc.remaining_agent_capacities:
+                continue   # a stale entry
+            # A leaf agent: disconnect him from his only neighbor (since it is a good)
+            (j,e), = agent_neighbors[i].items()
+            item = items[j]
+            if len(item_neighbors[j])>1:
+                explanation_logger.info("\nYou are a leaf node, so you lose your only neighbor %s", item, agents=agent)
+                remove_agent_from_graph(i)
+            else:
+                remove_edge(e)
+                if agent not in alloc.remaining_agent_capacities:
+                    logger.warn("Agent %s is the only one who could get item %s, but the agent has no remaining capacity!", agent, item)
+                elif item not in alloc.remaining_item_capacities:
+                    logger.warn("Agent %s is the only one who could get item %s, but the item has no remaining capacity!", agent, item)
                 else:
-                    fractional_allocation[agent][item] = 0
-                    fractional_allocation_graph.remove_edge(agent,item)
-                    if agent not in alloc.remaining_agent_capacities:
-                        logger.warn("Agent %s is the only one who could get item %s, but the agent has no remaining capacity!", agent, item)
-                    elif item not in alloc.remaining_item_capacities:
-                        logger.warn("Agent %s is the only one who could get item %s, but the item has no remaining capacity!", agent, item)
-                    else:
-                        alloc.give(agent, item)
-                        explanation_logger.info("Both you and course %s are leaf nodes, so you get all of it to yourself.", item, agents=agent)
-
-                explanation_logger.debug("\nfractional_allocation_graph:\n%s", fractional_allocation_graph.edges.data())
-                found_agent_leaf = True
-                break  # after removing one agent, proceed to remove leaf items
-        if found_agent_leaf:
-            # draw_bipartite_weighted_graph(fractional_allocation_graph, alloc.remaining_agents())
+                    alloc.give(agent, item)
+                    explanation_logger.info("Both you and course %s are leaf nodes, so you get all of it to yourself.", item, agents=agent)
             continue
 
         # No leaf at all - remove an edge with a small weight:
-        edge_with_min_weight = min(fractional_allocation_graph.edges(), key=lambda edge:fractional_allocation_graph[edge[0]][edge[1]]["weight"])
-        min_weight = fractional_allocation_graph[edge_with_min_weight[0]][edge_with_min_weight[1]]["weight"]
+        min_weight,_,e = heapq.heappop(min_weight_edges)
+        if not edge_exists(e) or edge_weight[e]!=min_weight:
+            continue   # a stale entry
+        i, j = edge_agent[e], edge_item[e]
+        edge_with_min_weight = (agents[i], items[j])
         logger.warn("No leafs - removing edge %s with minimum weight %g", edge_with_min_weight, min_weight)
-        explanation_logger.info("There are no leaf nodes, but the edge %s has minimum weight %g, so it is removed.", edge_with_min_weight, min_weight, agents=agent)
-        remove_edge_from_graph(*agent_item_tuple(edge_with_min_weight))
+        explanation_logger.info("There are no leaf nodes, but the edge %s has minimum weight %g, so it is removed.", edge_with_min_weight, min_weight, agents=agents[i])
+        remove_edge_from_graph(i,j)
 
     iterated_maximum_matching(alloc)  # Avoid waste
     return alloc.sorted()
@@ -189,6 +252,9 @@ def almost_egalitarian_without_donation(alloc:AllocationBuilder, **kwargs):
 def almost_egalitarian_with_donation(alloc:AllocationBuilder, **kwargs):
     return almost_egalitarian_allocation(alloc, surplus_donation=True, **kwargs)
 
+def almost_egalitarian_leximin(alloc:AllocationBuilder, **kwargs):
+    return almost_egalitarian_allocation(alloc, leximin=True, **kwargs)
+
 
 almost_egalitarian_allocation.logger = logger
 
@@ -207,6 +273,41 @@ def consumption_graph(allocation:dict, min_fraction=0.01, agent_item_value=None)
     return G
 
 
+def _consumption_graph_edge_order(edge_agent:list, edge_item:list, agent_neighbors:list, item_neighbors:list)->list:
+    """
+    :return the rank of each edge in the order in which consumption_graph(...).edges() lists it,
+            when the edges are created in the order of their indices.
+    The order does not change when edges are removed, so it can be computed once.
+
+    >>> # agent 0 consumes items 0,1; agent 1 consumes items 1,0:
+    >>> edge_agent, edge_item = [0,0,1,1], [0,1,1,0]
+    >>> agent_neighbors, item_neighbors = [{0:0, 1:1}, {1:2, 0:3}], [{0:0, 1:3}, {0:1, 1:2}]
+    >>> _consumption_graph_edge_order(edge_agent, edge_item, agent_neighbors, item_neighbors)
+    [0, 1, 3, 2]
+    """
+    nodes, seen = [], set()
+    for i,j in zip(edge_agent, edge_item):
+        for node in (("agent",i), ("item",j)):
+            if node not in seen:
+                seen.add(node)
+                nodes.append(node)
+    edge_rank = [None]*len(edge_agent)
+    visited = set()
+    rank = 0
+    for node in nodes:
+        kind, index = node
+        if kind=="agent":
+            neighbors = ((("item",j),e) for j,e in agent_neighbors[index].items())
+        else:
+            neighbors = ((("agent",i),e) for i,e in item_neighbors[index].items())
+        for neighbor,e in neighbors:
+            if neighbor not in visited:
+                edge_rank[e] = rank
+                rank += 1
+        visited.add(node)
+    return edge_rank
+
+
 
 def draw_bipartite_weighted_graph(G: networkx.Graph, top_nodes:list):
     draw_options = {
@@ -53,7 +53,7 @@ def fractional_egalitarian_allocation(instance: Instance, normalize_utilities=Tr
     )
     solve(problem, solvers = [(cvxpy.SCIPY, {'method':'highs-ds'})])  # highs-ds is a variant of simplex (guaranteed to return a corner solution)
 
-    allocation_matrix = {agent: {item: allocation_vars[agent][item].value+0 for item in instance.items} for agent in instance.agents}
+    allocation_matrix = allocation_vars.value_matrix()
     logger.debug("\nAllocation_matrix:\n%s", allocation_matrix)
     logger.debug("\nUtilities:\n%s", {agent: utilities[agent].value+0 for agent in instance.agents})
     # logger.debug("\nRaw utilities:\n%s", {agent: raw_utilities[agent].value+0 for agent in instance.agents})
@@ -141,7 +141,7 @@ def fractional_egalitarian_utilitarian_allocation(instance: Instance, normalize_
     )
     solve(problem, solvers = [(cvxpy.SCIPY, {'method':'highs-ds'})])
 
-    allocation_matrix = {agent: {item: allocation_vars[agent][item].value+0 for item in instance.items} for agent in instance.agents}
+    allocation_matrix = allocation_vars.value_matrix()
     logger.debug("\nAllocation_matrix:\n%s", allocation_matrix)
     logger.debug("\nUtilities:\n%s", {agent: utilities[agent].value+0 for agent in instance.agents})
     # logger.debug("\nRaw utilities:\n%s", {agent: raw_utilities[agent].value+0 for agent in instance.agents})
@@ -7,9 +7,10 @@ Since: 2023-07
 """
 
 from fairpy.courses.instance import Instance
-from fairpy.courses.linear_programming_utils import allocation_variables, allocation_constraints
+from fairpy.courses.linear_programming_utils import allocation_variables, allocation_constraints, AllocationVariables
 
-import cvxpy
+import cvxpy, highspy, numpy as np
+from scipy import sparse
 from fairpy.solve import solve
 from cvxpy_leximin import Problem, Leximin
 
@@ -78,7 +79,7 @@ def fractional_leximin_optimal_allocation(instance: Instance, normalize_utilitie
         **solver_options
     )
     solve(problem, solvers = [(cvxpy.SCIPY, {'method':'highs-ds'})])  # highs-ds is a variant of simplex (guaranteed to return a corner solution)
-    allocation_matrix = {agent: {item: allocation_vars[agent][item].value+0 for item in instance.items} for agent in instance.agents}
+    allocation_matrix = allocation_vars.value_matrix()
     # logger.debug("\nAllocation_matrix:\n%s", allocation_matrix)
     # logger.debug("\nRaw utilities:\n%s", {agent: raw_utilities[agent].value+0 for agent in instance.agents})
     # logger.debug("\nMax utilities:\n%s", {agent: instance.agent_maximum_value(agent) for agent in instance.agents})
@@ -86,7 +87,114 @@ def fractional_leximin_optimal_allocation(instance: Instance, normalize_utilitie
     return allocation_matrix
 
 
-fractional_leximin_optimal_allocation.logger = logger
+def fractional_leximin_saturation_allocation(instance: Instance, normalize_utilities=True, round_time_limit:float=60, tolerance:float=1e-7):
+    """
+    Find a leximin-optimal allocation, using the iterative saturation algorithm, solved directly by HiGHS.
+
+    Each round solves the LP "maximize t subject to: utility(i) >= t for every free agent i,
+    and utility(i) >= z(i) for every saturated agent i".
+    Every free agent whose utility constraint has a non-zero dual value in the optimal solution
+    has utility exactly t in *every* optimal solution (by complementary slackness),
+    so all these agents are saturated at once: z(i)=t, and they are freed from the t variable.
+    The LP is modified in-place between rounds, so HiGHS hot-starts each round from the previous basis.
+
+    :param instance: a fair-course-allocation instance.
+    :param normalize_utilities: True to use utilities normalized by the max possible agent value; False to use raw utilities.
+    :param round_time_limit: maximum number of seconds for a single round.
+        If a round runs out of time, the allocation of the previous round is returned: it is feasible,
+        and leximin-optimal with respect to the agents saturated so far.
+    :param tolerance: a saturated agent i is required to have utility at least z(i) minus this tolerance
+        (relative to max(1,z(i))), to avoid infeasibility due to numeric errors.
+
+    :return a fractional allocation --- a dict of dicts, in which alloc[i][j] is the fraction allocated to agent i from object j.
+
+    >>> logger.setLevel(logging.WARNING)
+    >>> from fairpy.courses.allocation_utils import rounded_allocation
+
+    >>> instance = Instance(valuations=[[5,0],[3,3]])
+    >>> a = fractional_leximin_saturation_allocation(instance, normalize_utilities=False)
+    >>> rounded_allocation(a,3)
+    {0: {0: 0.75, 1: 0.0}, 1: {0: 0.25, 1: 1.0}}
+
+    >>> instance = Instance(valuations=[[4,0,0],[0,3,0],[5,5,10],[5,5,10]])
+    >>> a = fractional_leximin_saturation_allocation(instance, normalize_utilities=False)
+    >>> rounded_allocation(a,3)
+    {0: {0: 1.0, 1: 0.0, 2: 0.0}, 1: {0: 0.0, 1: 1.0, 2: 0.0}, 2: {0: 0.0, 1: 0.0, 2: 0.5}, 3: {0: 0.0, 1: 0.0, 2: 0.5}}
+
+    >>> instance = Instance(valuations=[[1/3, 0, 1/3, 1/3],[1, 1, 1, 0]])
+    >>> a = fractional_leximin_saturation_allocation(instance, normalize_utilities=False)
+    >>> rounded_allocation(a,3)
+    {0: {0: 1.0, 1: 0.0, 2: 1.0, 3: 1.0}, 1: {0: 0.0, 1: 1.0, 2: 0.0, 3: 0.0}}
+    """
+    allocation_vars = AllocationVariables(instance)
+    num_of_agents, num_of_items, num_of_entries = len(allocation_vars.agents), len(allocation_vars.items), allocation_vars.num_of_entries
+    if num_of_agents == 0:
+        return {}
+    item_values = allocation_vars.normalized_values if normalize_utilities else allocation_vars.raw_values
+    t_column = num_of_entries    # the index of the variable t.
+    first_utility_row = num_of_items + num_of_agents
+
+    # Rows: item capacities, agent capacities, and agent utilities (utility(i) - t >= 0).
+    # Columns: one for each entry in the support, and one for t.
+    constraint_matrix = sparse.vstack([
+        sparse.hstack([allocation_vars.item_matrix, sparse.csr_matrix((num_of_items, 1))]),
+        sparse.hstack([allocation_vars.agent_matrix, sparse.csr_matrix((num_of_agents, 1))]),
+        sparse.hstack([allocation_vars.agent_matrix.multiply(np.array(item_values, dtype=float)), -np.ones((num_of_agents, 1))]),
+    ]).tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_ = num_of_entries + 1
+    lp.num_row_ = num_of_items + 2*num_of_agents
+    lp.sense_ = highspy.ObjSense.kMaximize
+    lp.col_cost_ = np.append(np.zeros(num_of_entries), 1.0)
+    lp.col_lower_ = np.append(np.zeros(num_of_entries), -highspy.kHighsInf)
+    lp.col_upper_ = np.append(np.ones(num_of_entries), highspy.kHighsInf)
+    lp.row_lower_ = np.concatenate([np.full(num_of_items+num_of_agents, -highspy.kHighsInf), np.zeros(num_of_agents)])
+    lp.row_upper_ = np.concatenate([
+        [instance.item_capacity(item) for item in allocation_vars.items],
+        [instance.agent_capacity(agent) for agent in allocation_vars.agents],
+        np.full(num_of_agents, highspy.kHighsInf)])
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = constraint_matrix.indptr
+    lp.a_matrix_.index_ = constraint_matrix.indices
+    lp.a_matrix_.value_ = constraint_matrix.data
+    highs = highspy.Highs()
+    highs.setOptionValue("output_flag", False)
+    highs.setOptionValue("solver", "ipm")   # the first round is solved by interior-point with crossover; it is much faster than simplex on these degenerate LPs.
+    highs.passModel(lp)
+
+    free_agents = np.ones(num_of_agents, dtype=bool)
+    solution = None
+    while free_agents.any():
+        highs.setOptionValue("time_limit", highs.getRunTime() + round_time_limit)
+        highs.run()
+        status = highs.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            if solution is None:
+                raise ValueError(f"HiGHS failed in the first round of leximin: {highs.modelStatusToString(status)}")
+            logger.warning("HiGHS stopped with status %s; returning the allocation of the previous round, with %d free agents", highs.modelStatusToString(status), free_agents.sum())
+            break
+        highs_solution = highs.getSolution()
+        solution = np.array(highs_solution.col_value)
+        saturation_value = solution[t_column]
+        utility_duals = np.abs(np.array(highs_solution.row_dual)[first_utility_row:])
+        newly_saturated = np.flatnonzero(free_agents & (utility_duals > tolerance))
+        if len(newly_saturated)==0:   # Should not happen, since the duals of the free agents sum up to 1; it can only happen due to numeric errors.
+            newly_saturated = np.flatnonzero(free_agents)
+        logger.info("Leximin round: %d agents saturated at utility %g; %d agents remain free", len(newly_saturated), saturation_value, free_agents.sum()-len(newly_saturated))
+        saturated_lower_bound = saturation_value - tolerance*max(1, abs(saturation_value))
+        for agent_index in newly_saturated:
+            highs.changeCoeff(first_utility_row + agent_index, t_column, 0)
+            highs.changeRowBounds(first_utility_row + agent_index, saturated_lower_bound, highspy.kHighsInf)
+        free_agents[newly_saturated] = False
+        highs.setOptionValue("solver", "simplex")   # the next rounds are hot-started by simplex from the current basis.
+
+    if num_of_entries == 0:
+        return allocation_vars.value_matrix()
+    allocation_vars.variable.value = np.clip(solution[:num_of_entries], 0, 1)
+    return allocation_vars.value_matrix()
+
+
+fractional_leximin_optimal_allocation.logger = fractional_leximin_saturation_allocation.logger = logger
 
 if __name__ == "__main__":
     import doctest, sys
@@ -6,9 +6,11 @@ Author: Erel Segal-Halevi
 Since : 2021-04
 """
 
-import networkx
+import networkx, highspy, numpy as np
 from collections import defaultdict
 from itertools import product
+from scipy import sparse, optimize
+from scipy.sparse import csgraph
 
 def many_to_many_matching(item_capacities: dict[any,int], agent_capacities:dict[any,int], valuations:dict[any,dict[any,int]], agent_entitlement:callable=lambda x:1)->networkx.Graph:
     """
@@ -32,7 +34,7 @@ def many_to_many_matching(item_capacities: dict[any,int], agent_capacities:dict[
     "{a:['y'], b:['x']}"
     """
     # subroutine = many_to_many_matching_using_node_cloning
-    subroutine = many_to_many_matching_using_network_flow
+    subroutine = many_to_many_matching_using_automatic_backend
     return subroutine(
         items = item_capacities.keys(), 
         item_capacity = item_capacities.__getitem__,
@@ -79,6 +81,226 @@ def many_to_many_matching_using_network_flow(items:list, item_capacity: callable
     return map_agent_name_to_bundle
 
 
+def many_to_many_matching_using_sparse_flow(items:list, item_capacity: callable, agents:list, agent_capacity: callable, agent_item_value:callable, agent_entitlement:callable=lambda x:1, allow_negative_value_assignments=False)->dict:
+    """
+    Computes a many-to-many matching of items to agents. 
+
+    Algorithm: the same reduction to min-cost-max-flow, solved on a compact sparse (CSR) network.
+    The maximum flow value is computed by scipy.sparse.csgraph; then, a min-cost flow with this value is computed by the HiGHS dual simplex.
+    Since the constraint matrix of a network-flow problem is totally unimodular, the simplex returns an integral flow.
+
+    >>> from dicttools import stringify
+    >>> valuations = {"a":{"x":11, "y":22}, "b":{"x":33,"y":55}}
+    >>> stringify(many_to_many_matching_using_sparse_flow(items=["x","y"], item_capacity={"x":2, "y":2}.__getitem__, agents=["a","b"], agent_capacity={"a":1, "b":2}.__getitem__, agent_item_value=lambda agent,item: valuations[agent][item]))
+    "{a:['y'], b:['x', 'y']}"
+    >>> stringify(many_to_many_matching_using_sparse_flow(items=["x","y"], item_capacity={"x":3, "y":1}.__getitem__, agents=["a","b"], agent_capacity=lambda agent:1, agent_item_value=lambda agent,item: valuations[agent][item]))
+    "{a:['x'], b:['y']}"
+
+    # Negative valuations
+    >>> valuations = {"a":{"x":11, "y":22}, "b":{"x":33,"y":-1}}
+    >>> stringify(many_to_many_matching_using_sparse_flow(items=["x","y"], item_capacity=lambda item:2, agents=["a","b"], agent_capacity={"a":1, "b":3}.__getitem__, agent_item_value=lambda agent,item: valuations[agent][item]))
+    "{a:['y'], b:['x']}"
+    """
+    agents, items = list(agents), list(items)
+    num_of_agents, num_of_items = len(agents), len(items)
+    map_agent_name_to_bundle = defaultdict(list)
+    for agent in agents:
+        map_agent_name_to_bundle[agent] = []
+
+    ### a. Construct the edges between agents and items:
+    edge_agents, edge_items, edge_weights = [], [], []
+    for i,agent in enumerate(agents):
+        entitlement = agent_entitlement(agent)
+        for j,item in enumerate(items):
+            value = agent_item_value(agent, item)
+            if value<0 and not allow_negative_value_assignments:
+                continue
+            edge_agents.append(i)
+            edge_items.append(j)
+            edge_weights.append(value * entitlement)
+    num_of_edges = len(edge_weights)
+    if num_of_edges==0:
+        return map_agent_name_to_bundle
+    agent_capacities = np.array([agent_capacity(agent) for agent in agents])
+    item_capacities  = np.array([item_capacity(item) for item in items])
+
+    ### b. Compute the maximum flow value. Nodes: 0 is the source, then the agents, then the items, and the last node is the sink.
+    sink = num_of_agents + num_of_items + 1
+    agent_nodes = np.arange(1, num_of_agents+1)
+    item_nodes = np.arange(num_of_agents+1, sink)
+    network = sparse.csr_matrix((
+        np.concatenate([agent_capacities, np.ones(num_of_edges), item_capacities]).astype(np.int32),
+        (np.concatenate([np.zeros(num_of_agents, dtype=int), agent_nodes[edge_agents], item_nodes]),
+         np.concatenate([agent_nodes, item_nodes[edge_items], np.full(num_of_items, sink)]))
+        ), shape=(sink+1, sink+1))
+    max_flow_value = csgraph.maximum_flow(network, 0, sink).flow_value
+
+    ### c. Compute a maximum-weight flow among the maximum flows:
+    edge_indices = np.arange(num_of_edges)
+    agent_matrix = sparse.csr_matrix((np.ones(num_of_edges), (edge_agents, edge_indices)), shape=(num_of_agents, num_of_edges))
+    item_matrix  = sparse.csr_matrix((np.ones(num_of_edges), (edge_items, edge_indices)), shape=(num_of_items, num_of_edges))
+    result = optimize.linprog(
+        c=-np.array(edge_weights, dtype=float),
+        A_ub=sparse.vstack([agent_matrix, item_matrix]).tocsr(),
+        b_ub=np.concatenate([agent_capacities, item_capacities]),
+        A_eq=sparse.csr_matrix(np.ones((1, num_of_edges))),
+        b_eq=[max_flow_value],
+        bounds=(0,1),
+        method="highs-ds")   # dual simplex, guaranteed to return a corner (hence integral) solution
+    if result.status!=0:
+        raise ValueError(f"Min-cost flow failed: {result.message}")
+
+    ### d. Convert the flow to a many-to-many matching:
+    for e in np.flatnonzero(result.x > 0.5):
+        map_agent_name_to_bundle[agents[edge_agents[e]]].append(items[edge_items[e]])
+    for agent in agents:
+        map_agent_name_to_bundle[agent].sort()
+    return map_agent_name_to_bundle
+
+
+SPARSE_FLOW_MIN_EDGES = 1000   # below this number of (agent,item) pairs, the networkx flow is faster than building the sparse model.
+
+def many_to_many_matching_using_automatic_backend(items:list, item_capacity: callable, agents:list, agent_capacity: callable, agent_item_value:callable, agent_entitlement:callable=lambda x:1, allow_negative_value_assignments=False, backend:str="auto")->dict:
+    """
+    Computes a many-to-many matching of items to agents, 
+    using many_to_many_matching_using_network_flow for small instances, and many_to_many_matching_using_sparse_flow for large instances.
+
+    :param backend: "network_flow", "sparse_flow", or "auto" for "sparse_flow" when there are at least SPARSE_FLOW_MIN_EDGES (agent,item) pairs and "network_flow" otherwise.
+
+    NOTE: both backends return a matching of maximum value, but when several matchings have the maximum value,
+    they may return different ones. Hence, with backend="auto", the matching chosen among ties may change when the
+    number of (agent,item) pairs crosses SPARSE_FLOW_MIN_EDGES. Pass a specific backend to break ties in the same way for all instance sizes.
+
+    >>> valuations = {"a": {"x":1, "y":1}, "b": {"x":1, "y":1}}
+    >>> for backend in ["network_flow", "sparse_flow"]:
+    ...     matching = many_to_many_matching_using_automatic_backend(items=["x","y"], item_capacity=lambda item:1, agents=["a","b"], agent_capacity=lambda agent:1, agent_item_value=lambda agent,item: valuations[agent][item], backend=backend)
+    ...     print(sorted(len(bundle) for bundle in matching.values()))
+    [1, 1]
+    [1, 1]
+    """
+    if backend not in ["auto", "network_flow", "sparse_flow"]:
+        raise ValueError(f"Unknown backend {backend}")
+    agents, items = list(agents), list(items)
+    if backend=="auto":
+        backend = "network_flow" if len(agents)*len(items) < SPARSE_FLOW_MIN_EDGES else "sparse_flow"
+    if backend=="network_flow":
+        subroutine = many_to_many_matching_using_network_flow
+    else:
+        subroutine = many_to_many_matching_using_sparse_flow
+    return subroutine(items=items, item_capacity=item_capacity, agents=agents, agent_capacity=agent_capacity, agent_item_value=agent_item_value,
+                      agent_entitlement=agent_entitlement, allow_negative_value_assignments=allow_negative_value_assignments)
+
+
+class IncrementalManyToManyMatching:
+    """
+    Computes a sequence of many-to-many matchings of the same items to the same agents,
+    where only the capacities and the values change between consecutive matchings.
+
+    The min-cost-max-flow LP is built once, and kept in a HiGHS model.
+    In each matching, the capacities and values are updated in-place, 
+    and the simplex re-optimizes from the optimal basis (i.e., the dual potentials) of the previous matching.
+
+    An edge is created only for an (agent,item) pair with a non-negative initial value.
+    An edge whose value becomes negative is disabled; a negative value cannot become non-negative later.
+
+    >>> from dicttools import stringify
+    >>> valuations = {"a":{"x":11, "y":22}, "b":{"x":33,"y":55}}
+    >>> matching = IncrementalManyToManyMatching(items=["x","y"], agents=["a","b"], agent_item_value=lambda agent,item: valuations[agent][item])
+    >>> stringify(matching.match(item_capacity=lambda item:2, agent_capacity=lambda agent:1, agent_item_value=lambda agent,item: valuations[agent][item]))
+    "{a:['y'], b:['y']}"
+    >>> stringify(matching.match(item_capacity={"x":3, "y":1}.__getitem__, agent_capacity=lambda agent:1, agent_item_value=lambda agent,item: valuations[agent][item]))
+    "{a:['x'], b:['y']}"
+    >>> valuations["b"]["y"] = -1
+    >>> stringify(matching.match(item_capacity=lambda item:2, agent_capacity={"a":1, "b":3}.__getitem__, agent_item_value=lambda agent,item: valuations[agent][item]))
+    "{a:['y'], b:['x']}"
+    >>> stringify(matching.match(item_capacity=lambda item:2, agent_capacity={"a":0, "b":1}.__getitem__, agent_item_value=lambda agent,item: valuations[agent][item]))
+    "{b:['x']}"
+    """
+    def __init__(self, items:list, agents:list, agent_item_value:callable, agent_entitlement:callable=lambda x:1):
+        self.agents, self.items = list(agents), list(items)
+        self.agent_entitlement = agent_entitlement
+        self.edge_agents, self.edge_items = [], []
+        for i,agent in enumerate(self.agents):
+            for j,item in enumerate(self.items):
+                if agent_item_value(agent, item) >= 0:
+                    self.edge_agents.append(i)
+                    self.edge_items.append(j)
+        num_of_agents, num_of_items, num_of_edges = len(self.agents), len(self.items), len(self.edge_agents)
+        self.num_of_edges = num_of_edges
+        self.edge_indices = np.arange(num_of_edges, dtype=np.int32)
+        self.capacity_rows = np.arange(num_of_agents+num_of_items, dtype=np.int32)
+        self.flow_row = num_of_agents+num_of_items  # the total flow: sum of all edges.
+
+        # Rows: agent capacities, item capacities, total flow. Each column (edge) has 1 in its agent row, its item row and the flow row.
+        lp = highspy.HighsLp()
+        lp.num_col_ = num_of_edges
+        lp.num_row_ = num_of_agents + num_of_items + 1
+        lp.sense_ = highspy.ObjSense.kMaximize
+        lp.col_cost_ = np.zeros(num_of_edges)
+        lp.col_lower_ = np.zeros(num_of_edges)
+        lp.col_upper_ = np.ones(num_of_edges)
+        lp.row_lower_ = np.full(lp.num_row_, -highspy.kHighsInf)
+        lp.row_upper_ = np.full(lp.num_row_, highspy.kHighsInf)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = np.arange(0, 3*num_of_edges+1, 3)
+        lp.a_matrix_.index_ = np.column_stack([
+            self.edge_agents, 
+            num_of_agents + np.array(self.edge_items, dtype=int), 
+            np.full(num_of_edges, self.flow_row)]).flatten() if num_of_edges>0 else np.array([], dtype=int)
+        lp.a_matrix_.value_ = np.ones(3*num_of_edges)
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue("output_flag", False)
+        self.highs.setOptionValue("solver", "simplex")   # simplex is guaranteed to return a corner (hence integral) solution, and can be hot-started.
+        self.highs.passModel(lp)
+
+    def match(self, item_capacity: callable, agent_capacity: callable, agent_item_value:callable)->dict:
+        """
+        Compute a max-value maximum-cardinality matching with the given capacities and values.
+        :return a dict mapping each agent with a positive capacity to its (sorted) bundle.
+        """
+        agent_capacities = [agent_capacity(agent) for agent in self.agents]
+        map_agent_name_to_bundle = defaultdict(list)
+        for agent,capacity in zip(self.agents, agent_capacities):
+            if capacity>0:
+                map_agent_name_to_bundle[agent] = []
+        if self.num_of_edges==0:
+            return map_agent_name_to_bundle
+        capacities = np.array(agent_capacities + [item_capacity(item) for item in self.items], dtype=float)
+        self._change_row_bounds(self.capacity_rows, np.full(len(capacities), -highspy.kHighsInf), capacities)
+        edge_weights = np.array([
+            agent_item_value(self.agents[i], self.items[j]) * self.agent_entitlement(self.agents[i])
+            for i,j in zip(self.edge_agents, self.edge_items)], dtype=float)
+        self.highs.changeColsBounds(self.num_of_edges, self.edge_indices, np.zeros(self.num_of_edges), np.where(edge_weights>=0, 1.0, 0.0))
+
+        ### a. Maximize the total flow:
+        self._change_row_bounds([self.flow_row], [-highspy.kHighsInf], [highspy.kHighsInf])
+        self.highs.changeColsCost(self.num_of_edges, self.edge_indices, np.ones(self.num_of_edges))
+        self._run()
+        max_flow_value = np.round(self.highs.getInfo().objective_function_value)
+
+        ### b. Maximize the total value among the maximum flows:
+        self._change_row_bounds([self.flow_row], [max_flow_value], [max_flow_value])
+        self.highs.changeColsCost(self.num_of_edges, self.edge_indices, edge_weights)
+        self._run()
+
+        ### c. Convert the flow to a many-to-many matching:
+        flow = np.array(self.highs.getSolution().col_value)
+        for e in np.flatnonzero(flow > 0.5):
+            map_agent_name_to_bundle[self.agents[self.edge_agents[e]]].append(self.items[self.edge_items[e]])
+        for bundle in map_agent_name_to_bundle.values():
+            bundle.sort()
+        return map_agent_name_to_bundle
+
+    def _change_row_bounds(self, rows, lower, upper):
+        self.highs.changeRowsBounds(len(rows), np.array(rows, dtype=np.int32), np.array(lower, dtype=float), np.array(upper, dtype=float))
+
+    def _run(self):
+        self.highs.run()
+        status = self.highs.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            raise ValueError(f"Min-cost flow failed: {self.highs.modelStatusToString(status)}")
+
+
 def many_to_many_matching_using_node_cloning(items:list, item_capacity: callable, agents:list, agent_capacity: callable, agent_item_value:callable, agent_entitlement:callable=lambda x:1)->networkx.Graph:
     """
     Computes a many-to-many matching of items to agents. 
@@ -316,7 +316,186 @@ class Instance:
                         item_capacities=item_capacities, item_conflicts=item_conflicts)
 
 
-        
+
+
+class DenseInstance(Instance):
+    """
+    Represents an instance of the fair course-allocation problem, backed by arrays:
+     * valuations:       a float matrix; valuations[i,j] is the value of agent i to item j.
+     * agent_capacities, agent_entitlements, item_capacities: vectors (or constants).
+     * agent_conflicts:  a boolean matrix; agent_conflicts[i,j] is True iff item j conflicts with agent i.
+     * item_conflicts:   a boolean matrix; item_conflicts[j,k] is True iff items j and k conflict.
+    The conflicts can also be given as dicts, as in Instance (e.g. agent_conflicts={"Bob": ["c2"]}).
+    By default, the agents and items are their integer indices; lists of names can be given instead.
+    It exposes the same functions as Instance, so every algorithm can use it;
+    algorithms that are aware of it can use the arrays directly (through agent_index and item_index).
+
+    >>> instance = DenseInstance(
+    ...   valuations       = [[11, 22], [33, 44]],
+    ...   agent_capacities = [2, 3], 
+    ...   item_capacities  = [4, 5], 
+    ...   agent_conflicts  = [[False, False], [False, True]],
+    ...   agents = ["Alice", "Bob"], items = ["c1", "c2"])
+    >>> instance.agent_capacity("Alice")
+    2
+    >>> instance.item_capacity("c2")
+    5
+    >>> instance.agent_item_value("Bob", "c1")
+    33.0
+    >>> instance.agent_bundle_value("Bob", ["c1","c2"])
+    77.0
+    >>> instance.agent_maximum_value("Bob")
+    77.0
+    >>> instance.agent_conflicts("Bob")
+    {'c2'}
+    >>> instance.item_conflicts("c1")
+    set()
+
+    ### conflicts given as dicts:
+    >>> instance = DenseInstance(valuations=[[11, 22], [33, 44]], agent_conflicts={1: [1]}, item_conflicts={0: [1], 1: [0]})
+    >>> instance.agent_conflicts(1), instance.item_conflicts(0)
+    ({1}, {1})
+    >>> DenseInstance(valuations=[[11, 22], [33, 44]], agent_conflicts=[[False, True]])
+    Traceback (most recent call last):
+    ...
+    ValueError: agent_conflicts should be a dict or a boolean matrix of shape (2, 2), but its shape is (1, 2)
+
+    ### integer ids and default values:
+    >>> instance = DenseInstance(valuations=np.array([[5, 4], [2, 3]]))
+    >>> list(instance.agents), list(instance.items)
+    ([0, 1], [0, 1])
+    >>> instance.agent_capacity(1), instance.item_capacity(1), instance.agent_entitlement(1)
+    (2, 1, 1.0)
+
+    ### conversion from an Instance:
+    >>> instance = DenseInstance.from_instance(Instance(valuations={"avi": {"x":5, "y": 4}, "beni": {"x":2, "y":3}}, item_conflicts={"x": ["y"]}))
+    >>> instance.valuations
+    array([[5., 4.],
+           [2., 3.]])
+    >>> instance.item_conflicts("x")
+    {'y'}
+    """
+
+    def __init__(self, valuations:any, agent_capacities:any=None, agent_entitlements:any=None, item_capacities:any=None, agent_conflicts:any=None, item_conflicts:any=None, agents:list=None, items:list=None):
+        self.valuations = np.asarray(valuations, dtype=float)
+        num_of_agents, num_of_items = self.valuations.shape
+        self.agents = range(num_of_agents) if agents is None else list(agents)
+        self.items  = range(num_of_items)  if items  is None else list(items)
+        self.num_of_agents = len(self.agents)
+        self.num_of_items = len(self.items)
+        self.agent_index = {agent:i for i,agent in enumerate(self.agents)}
+        self.item_index  = {item:j  for j,item  in enumerate(self.items)}
+        self.agent_capacities   = _as_vector(agent_capacities, num_of_agents, num_of_items, dtype=int)
+        self.agent_entitlements = _as_vector(agent_entitlements, num_of_agents, 1, dtype=float)
+        self.item_capacities    = _as_vector(item_capacities, num_of_items, 1, dtype=int)
+        self.agent_conflict_matrix = _as_conflict_matrix(agent_conflicts, self.agent_index, self.item_index, "agent_conflicts")
+        self.item_conflict_matrix  = _as_conflict_matrix(item_conflicts, self.item_index, self.item_index, "item_conflicts")
+
+        # The arrays and the index maps refer to all agents and items; a view (see below) may contain only some of them.
+        self.all_agents, self.all_items = self.agents, self.items
+        self.item_mask = None   # a boolean vector over all_items, marking the items of a view (None means all items).
+
+        # Keep the input parameters, for debug
+        self._agent_capacities = agent_capacities
+        self._item_capacities  = item_capacities
+        self._valuations       = valuations
+
+    @staticmethod
+    def from_instance(instance:Instance):
+        """
+        Convert an Instance to a DenseInstance with the same agents and items.
+        """
+        agents, items = list(instance.agents), list(instance.items)
+        item_index = {item:j for j,item in enumerate(items)}
+        agent_conflicts = np.zeros((len(agents), len(items)), dtype=bool)
+        for i,agent in enumerate(agents):
+            agent_conflicts[i, [item_index[item] for item in instance.agent_conflicts(agent) if item in item_index]] = True
+        item_conflicts = np.zeros((len(items), len(items)), dtype=bool)
+        for j,item in enumerate(items):
+            item_conflicts[j, [item_index[other] for other in instance.item_conflicts(item) if other in item_index]] = True
+        return DenseInstance(
+            valuations = [[instance.agent_item_value(agent,item) for item in items] for agent in agents],
+            agent_capacities = [instance.agent_capacity(agent) for agent in agents],
+            agent_entitlements = [instance.agent_entitlement(agent) for agent in agents],
+            item_capacities = [instance.item_capacity(item) for item in items],
+            agent_conflicts = agent_conflicts, item_conflicts = item_conflicts,
+            agents = agents, items = items)
+
+    def view(self, agents:list, items:list, valuations:np.ndarray=None, agent_capacities:np.ndarray=None, item_capacities:np.ndarray=None):
+        """
+        Return a DenseInstance restricted to the given agents and items, that shares the arrays of this instance (no copying).
+        The valuations and capacities can be replaced by other arrays of the same shape.
+        """
+        result = DenseInstance.__new__(DenseInstance)
+        result.__dict__.update(self.__dict__)
+        result.agents, result.items = agents, items
+        result.num_of_agents, result.num_of_items = len(agents), len(items)
+        result.item_mask = np.zeros(len(self.all_items), dtype=bool)
+        result.item_mask[[self.item_index[item] for item in items]] = True
+        if valuations is not None:       result.valuations = valuations
+        if agent_capacities is not None: result.agent_capacities = agent_capacities
+        if item_capacities is not None:  result.item_capacities = item_capacities
+        return result
+
+    def agent_capacity(self, agent:any)->int:
+        return int(self.agent_capacities[self.agent_index[agent]])
+
+    def agent_entitlement(self, agent:any)->float:
+        return float(self.agent_entitlements[self.agent_index[agent]])
+
+    def item_capacity(self, item:any)->int:
+        return int(self.item_capacities[self.item_index[item]])
+
+    def agent_item_value(self, agent:any, item:any)->float:
+        return float(self.valuations[self.agent_index[agent], self.item_index[item]])
+
+    def agent_conflicts(self, agent:any)->set:
+        return self._items_in(self.agent_conflict_matrix[self.agent_index[agent]])
+
+    def item_conflicts(self, item:any)->set:
+        return self._items_in(self.item_conflict_matrix[self.item_index[item]])
+
+    def _items_in(self, row:np.ndarray)->set:
+        """
+        :param row: a boolean vector over all_items.
+        :return the items of this instance that are marked in the given row.
+        """
+        if self.item_mask is not None:
+            row = row & self.item_mask
+        return {self.all_items[j] for j in np.flatnonzero(row)}
+
+    def agent_maximum_value(self, agent:any)->float:
+        item_indices = [self.item_index[item] for item in self.items]
+        values = np.sort(self.valuations[self.agent_index[agent], item_indices])[::-1]
+        return float(values[:self.agent_capacity(agent)].sum())
+
+
+def _as_conflict_matrix(conflicts:any, row_index:dict, column_index:dict, name:str)->np.ndarray:
+    """
+    Convert conflicts, given either as a dict (key -> conflicting items) or as a boolean matrix, to a boolean matrix.
+    """
+    shape = (len(row_index), len(column_index))
+    if conflicts is None:
+        return np.zeros(shape, dtype=bool)
+    if isinstance(conflicts, dict):
+        matrix = np.zeros(shape, dtype=bool)
+        for key,conflicting_items in conflicts.items():
+            matrix[row_index[key], [column_index[item] for item in conflicting_items]] = True
+        return matrix
+    matrix = np.asarray(conflicts, dtype=bool)
+    if matrix.shape != shape:
+        raise ValueError(f"{name} should be a dict or a boolean matrix of shape {shape}, but its shape is {matrix.shape}")
+    return matrix
+
+
+def _as_vector(container:any, size:int, default_value:any, dtype)->np.ndarray:
+    if container is None:
+        return np.full(size, default_value, dtype=dtype)
+    elif isinstance(container, Number):
+        return np.full(size, container, dtype=dtype)
+    else:
+        return np.asarray(container, dtype=dtype)
+
 
 def random_valuation(numitems:int, item_value_bounds: tuple[float,float])->np.ndarray:
     """
@@ -483,7 +662,7 @@ def get_conflicts(container:any):
     return func
     
 
-Instance.logger = logger
+Instance.logger = DenseInstance.logger = logger
 
 def constant_function(constant_value)->callable:
     return lambda key:constant_value
@@ -12,15 +12,22 @@ Since : 2021-05
 
 
 from fairpy.courses.instance    import Instance
-from fairpy.courses.graph_utils import many_to_many_matching_using_network_flow
+from fairpy.courses.graph_utils import many_to_many_matching_using_automatic_backend, IncrementalManyToManyMatching
 from fairpy.courses.allocation_utils import AllocationBuilder
 from fairpy.courses.explanations import *
+import time
 
-def iterated_maximum_matching(alloc:AllocationBuilder, adjust_utilities:bool=False, explanation_logger:ExplanationLogger=ExplanationLogger()):
+import logging
+logger = logging.getLogger(__name__)
+
+def iterated_maximum_matching(alloc:AllocationBuilder, adjust_utilities:bool=False, incremental:bool=False, explanation_logger:ExplanationLogger=ExplanationLogger(), backend:str="auto"):
     """
     Builds a allocation using Iterated Maximum Matching.
     :param alloc: an allocation builder, which tracks the allocation and the remaining capacity for items and agents. of the fair course allocation problem. 
     :param adjust_utilities: if True, the utilities of agents, who did not get their max-value item in the current iteration, will be adjusted to give them a higher chance in the next iteration.
+    :param incremental: if True, the flow network is built once, and each iteration re-optimizes it from the optimal solution of the previous iteration.
+    :param backend: when incremental is False, the backend of many_to_many_matching_using_automatic_backend in each iteration
+        (it may affect which of several optimal matchings is chosen).
 
     >>> from dicttools import stringify
     >>> from fairpy.courses.adaptors import divide
@@ -50,6 +57,13 @@ def iterated_maximum_matching(alloc:AllocationBuilder, adjust_utilities:bool=Fal
     >>> map_agent_name_to_bundle = divide(iterated_maximum_matching,instance=instance)
     >>> stringify(map_agent_name_to_bundle)
     "{avi:['x', 'y', 'z'], beni:['w', 'y', 'z']}"
+
+    ### incremental mode:
+    >>> instance = Instance(valuations={"avi": {"x":5, "y":4, "z":3, "w":2}, "beni": {"x":2, "y":3, "z":4, "w":5}}, agent_capacities=3, item_capacities=2)
+    >>> stringify(divide(iterated_maximum_matching, instance=instance, incremental=True))
+    "{avi:['x', 'y', 'z'], beni:['w', 'y', 'z']}"
+    >>> stringify(divide(iterated_maximum_matching, instance=instance, incremental=True, adjust_utilities=True))
+    "{avi:['x', 'y', 'z'], beni:['w', 'y', 'z']}"
     """
 
     TEXTS = {
@@ -84,17 +98,32 @@ def iterated_maximum_matching(alloc:AllocationBuilder, adjust_utilities:bool=Fal
     }
     def _(code:str): return TEXTS[code][explanation_logger.language]
 
+    if incremental:
+        incremental_matching = IncrementalManyToManyMatching(
+            items=alloc.remaining_items(),
+            agents=alloc.remaining_agents(),
+            agent_item_value=lambda agent,item: alloc.remaining_agent_item_value[agent][item])
+
     iteration = 1
     explanation_logger.info("\n"+_("algorithm_starts")+"\n")
     while len(alloc.remaining_item_capacities)>0 and len(alloc.remaining_agent_capacities)>0:
         explanation_logger.info("\n== "+_("iteration_number")+" ==", iteration, agents=alloc.remaining_agents())
         explanation_logger.info(_("remaining_seats")+"\n", alloc.remaining_item_capacities, agents=alloc.remaining_agents())
-        map_agent_to_bundle = many_to_many_matching_using_network_flow(
-            items=alloc.remaining_items(), 
-            item_capacity=alloc.remaining_item_capacities.__getitem__, 
-            agents=alloc.remaining_agents(),
-            agent_capacity=lambda _:1,
-            agent_item_value=lambda agent,item: alloc.remaining_agent_item_value[agent][item])
+        start_time = time.perf_counter()
+        if incremental:
+            map_agent_to_bundle = incremental_matching.match(
+                item_capacity=lambda item: alloc.remaining_item_capacities.get(item,0),
+                agent_capacity=lambda agent: 1 if agent in alloc.remaining_agent_capacities else 0,
+                agent_item_value=lambda agent,item: alloc.remaining_agent_item_value[agent][item])
+        else:
+            map_agent_to_bundle = many_to_many_matching_using_automatic_backend(
+                items=alloc.remaining_items(), 
+                item_capacity=alloc.remaining_item_capacities.__getitem__, 
+                agents=alloc.remaining_agents(),
+                agent_capacity=lambda _:1,
+                agent_item_value=lambda agent,item: alloc.remaining_agent_item_value[agent][item],
+                backend=backend)
+        logger.info("Iteration %d: matching took %g seconds", iteration, time.perf_counter()-start_time)
 
         agents_with_empty_bundles = [agent for agent,bundle in map_agent_to_bundle.items() if len(bundle)==0]
         for agent in agents_with_empty_bundles:
@@ -142,6 +171,9 @@ def iterated_maximum_matching(alloc:AllocationBuilder, adjust_utilities:bool=Fal
         iteration += 1
 
 
+iterated_maximum_matching.logger = logger
+
+
 def iterated_maximum_matching_adjusted(alloc:AllocationBuilder, **kwargs):
     return iterated_maximum_matching(alloc, adjust_utilities=True, **kwargs)
 
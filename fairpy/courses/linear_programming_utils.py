@@ -6,49 +6,153 @@ Since: 2023-07
 """
 
 from fairpy.courses.instance import Instance
-import cvxpy
+from collections.abc import Mapping
+import cvxpy, numpy as np
+from scipy import sparse
+
+
+class AllocationVariables(Mapping):
+    """
+    The cvxpy variables representing a fractional allocation.
+
+    The model has a single vector variable, with one entry for each (agent,item) pair in the *support* -
+    the pairs in which the item has a non-zero value to the agent, and is not in the agent's conflicts.
+    Pairs outside the support get no variable, since they are never allocated.
+
+    allocation_vars[agent][item] is the entry of the pair, or the constant 0 if the pair is not in the support.
+
+    >>> instance = Instance(valuations={"Alice": {"x": 5, "y": 0}, "Bob": {"x": 3, "y": 3}}, agent_conflicts={"Bob": ["x"]})
+    >>> allocation_vars = AllocationVariables(instance)
+    >>> allocation_vars.support.toarray()
+    array([[ True, False],
+           [False,  True]])
+    >>> allocation_vars.variable.shape
+    (2,)
+    >>> allocation_vars["Alice"]["y"].value + 0
+    0.0
+    """
+
+    def __init__(self, instance: Instance):
+        self.agents = list(instance.agents)
+        self.items  = list(instance.items)
+        agent_indices, item_indices, self.raw_values, self.normalized_values = [], [], [], []
+        self._entry_index = {agent: {} for agent in self.agents}
+        for i,agent in enumerate(self.agents):
+            conflicts = instance.agent_conflicts(agent)
+            for j,item in enumerate(self.items):
+                value = instance.agent_item_value(agent,item)
+                if value==0 or item in conflicts:
+                    continue
+                self._entry_index[agent][item] = len(agent_indices)
+                agent_indices.append(i)
+                item_indices.append(j)
+                self.raw_values.append(value)
+                self.normalized_values.append(instance.agent_normalized_item_value(agent,item))
+        self.num_of_entries = num_of_entries = len(agent_indices)
+        self.support = sparse.csr_matrix(
+            (np.ones(num_of_entries, dtype=bool), (agent_indices, item_indices)),
+            shape=(len(self.agents), len(self.items)))
+        entries = np.arange(num_of_entries)
+        # agent_matrix[i,k]==1 iff entry k belongs to agent i;  item_matrix[j,k]==1 iff entry k belongs to item j.
+        self.agent_matrix = sparse.csr_matrix((np.ones(num_of_entries), (agent_indices, entries)), shape=(len(self.agents), num_of_entries))
+        self.item_matrix  = sparse.csr_matrix((np.ones(num_of_entries), (item_indices, entries)), shape=(len(self.items), num_of_entries))
+        self.variable = cvxpy.Variable(num_of_entries) if num_of_entries > 0 else None
+
+    def utilities(self, item_values:list)->dict:
+        """
+        :param item_values: the value of each entry in the support to its agent.
+        :return a dict mapping each agent to a cvxpy expression representing its utility.
+        """
+        if self.variable is None:
+            return {agent: cvxpy.Constant(0) for agent in self.agents}
+        utility_vector = sparse.csr_matrix(self.agent_matrix.multiply(np.array(item_values, dtype=float))) @ self.variable
+        return {agent: utility_vector[i] for i,agent in enumerate(self.agents)}
+
+    def constraints(self, instance: Instance)->list:
+        """
+        :return a list of cvxpy constraints for a feasible fractional allocation:
+        item capacity, agent capacity, positivity and uniqueness (no agent gets more than one unit of an item).
+        """
+        if self.variable is None:
+            return []
+        item_capacities  = np.array([instance.item_capacity(item) for item in self.items])
+        agent_capacities = np.array([instance.agent_capacity(agent) for agent in self.agents])
+        return [
+            self.item_matrix @ self.variable <= item_capacities,
+            self.agent_matrix @ self.variable <= agent_capacities,
+            0 <= self.variable,
+            self.variable <= 1,
+        ]
+
+    def value_matrix(self)->dict:
+        """
+        :return the solution as a dict of dicts, in which alloc[agent][item] is the fraction allocated to agent from item.
+        """
+        values = self.variable.value if self.variable is not None else []
+        return {
+            agent: {item: (values[self._entry_index[agent][item]]+0 if item in self._entry_index[agent] else 0.0) for item in self.items}
+            for agent in self.agents
+        }
+
+    def __getitem__(self, agent):
+        return _AgentAllocationVariables(self, agent)
+
+    def __iter__(self):
+        return iter(self.agents)
+
+    def __len__(self):
+        return len(self.agents)
+
+
+class _AgentAllocationVariables(Mapping):
+    """
+    The allocation variables of a single agent: maps each item to a cvxpy expression.
+    """
+    def __init__(self, allocation_vars: AllocationVariables, agent):
+        self.allocation_vars = allocation_vars
+        self.entry_index = allocation_vars._entry_index[agent]
+
+    def __getitem__(self, item):
+        if item in self.entry_index:
+            return self.allocation_vars.variable[self.entry_index[item]]
+        elif item in self.allocation_vars.items:
+            return cvxpy.Constant(0)
+        else:
+            raise KeyError(item)
+
+    def __iter__(self):
+        return iter(self.allocation_vars.items)
+
+    def __len__(self):
+        return len(self.allocation_vars.items)
+
 
 def allocation_variables(instance: Instance)->tuple:
     """
     Construct cvxpy variables representing a fractional allocation, and construct expressions representing the utilities.
 
     :return allocation_vars, raw_utilities, normalized_utilities
+
+    >>> instance = Instance(valuations=[[5,0],[3,3]])
+    >>> allocation_vars, raw_utilities, normalized_utilities = allocation_variables(instance)
+    >>> allocation_vars.variable.shape
+    (3,)
+    >>> raw_utilities[1].shape
+    ()
     """
-    allocation_vars = {agent: {item: cvxpy.Variable() for item in instance.items} for agent in instance.agents}
-    raw_utilities = {
-        agent:
-        sum([allocation_vars[agent][item] * instance.agent_item_value(agent,item) for item in instance.items])
-        for agent in instance.agents
-    }
-    normalized_utilities = {
-        agent:
-        sum([allocation_vars[agent][item] * instance.agent_normalized_item_value(agent,item) for item in instance.items])
-        for agent in instance.agents
-    }
+    allocation_vars = AllocationVariables(instance)
+    raw_utilities = allocation_vars.utilities(allocation_vars.raw_values)
+    normalized_utilities = allocation_vars.utilities(allocation_vars.normalized_values)
     return allocation_vars, raw_utilities, normalized_utilities
 
-def allocation_constraints(instance: Instance, allocation_vars:list):
+def allocation_constraints(instance: Instance, allocation_vars:AllocationVariables):
     """
     Construct cvxpy constraints for a feasible fractional allocation:
     item_capacity_constraints, agent_capacity_constraints, positivity_constraints, uniqueness_constraints.
 
     :return a list of all constraints
     """
-    item_capacity_constraints = [
-        sum([allocation_vars[agent][item] for agent in instance.agents]) <= instance.item_capacity(item)
-        for item in instance.items
-    ]
-    agent_capacity_constraints = [
-        sum([allocation_vars[agent][item] for item in instance.items]) <= instance.agent_capacity(agent)
-        for agent in instance.agents
-    ]
-    positivity_constraints = [
-        0 <= allocation_vars[agent][item] for agent in instance.agents for item in instance.items
-    ]
-    uniqueness_constraints = [
-        allocation_vars[agent][item] <= 1 for agent in instance.agents for item in instance.items
-    ]
-    return item_capacity_constraints + agent_capacity_constraints + positivity_constraints + uniqueness_constraints
+    return allocation_vars.constraints(instance)
 
 
 
@@ -18,10 +18,13 @@ between courses for students given a list of preferences for each student.
 
 import logging
 import math
+import multiprocessing
+import time
 import numpy as np
 from fairpy.valuations import ValuationMatrix
 from fairpy.courses.allocation_utils import AllocationBuilder
 from queue import PriorityQueue
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import cvxpy as cp
 
 
@@ -30,16 +33,27 @@ logger = logging.getLogger(__name__)
 
 Epsilon = 0.01
 
+PRICE_RESOLUTION = 1000       # the knapsack solvers work on prices and budgets in units of 1/PRICE_RESOLUTION.
+MAX_KNAPSACK_TABLE_SIZE = 10**7   # above this table size, the knapsack solvers give up and the generic MIP solver is used.
+
 
 def general_course_allocation(
         alloc:AllocationBuilder, 
-        bound: int = 0, effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None):
+        bound: int = 0, effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None, workers: int = 1,
+        num_of_starts: int = 1, random_seed: int = None):
     """
     This function finds the optimal course package for each student.
     The function inserts random values for the price of each course (between 0 and 1)
     and for the budget of each student (between 1 and 2).
     The function returns for each student a list containing the courses to which he was assigned.
 
+    :param workers: number of worker processes. With a single start, they evaluate the neighbor price vectors in the tabu search;
+        with several starts, they run the starts in parallel.
+    :param num_of_starts: number of independent tabu searches, each with its own random budgets and initial prices.
+        The placement with the smallest market-clearing error is returned.
+    :param random_seed: the seed from which the random generators of all starts are derived.
+        If None, it is drawn from the global numpy random state.
+
     >>> from fairpy.courses.adaptors import divide
 
     Example 1: simple example. NOTE: The results depend on the random budget, so they are not tested accurately.
@@ -57,10 +71,17 @@ def general_course_allocation(
     Example 4: input with popular courses.
     >>> divide(general_course_allocation, valuations=[[49, 40, 8, 3], [53, 29, 15, 3], [61, 30, 7, 2]], item_capacities=[2,2,2,2], agent_capacities=2)
     {0: [...], 1: [...], 2: [...]}
+
+    Example 5: several starts with a fixed seed are reproducible.
+    >>> from fairpy.courses.instance import Instance
+    >>> instance = Instance(valuations=[[49, 40, 8, 3], [53, 29, 15, 3], [61, 30, 7, 2]], item_capacities=[2,2,2,2], agent_capacities=2)
+    >>> divide(general_course_allocation, instance=instance, num_of_starts=3, random_seed=1) == divide(general_course_allocation, instance=instance, num_of_starts=3, random_seed=1)
+    True
     """
 
-    budgets = [1 + np.random.randint(1, 100)/100 for agent in alloc.remaining_agents()]
-    prices  = [np.random.randint(1, 100)/100 for item in alloc.remaining_items()]
+    if random_seed is None:
+        random_seed = np.random.randint(1, 2**31)
+    logger.info("Random seed: %d", random_seed)
     utilities = ValuationMatrix([
         [alloc.remaining_agent_item_value[agent][item] for item in alloc.remaining_items()]
         for agent in alloc.remaining_agents()
@@ -69,9 +90,9 @@ def general_course_allocation(
     remaining_agents = list(alloc.remaining_agents())
     item_capacities = [alloc.remaining_item_capacities[item] for item in remaining_items]
     agent_capacities = [alloc.remaining_agent_capacities[agent] for agent in remaining_agents]
-    allocation_matrix = course_allocation(utilities, budgets, prices, 
-        item_capacities, agent_capacities, 
-        bound, effect_variables, constraint)
+    allocation_matrix = multi_start_course_allocation(utilities, item_capacities, agent_capacities, 
+        np.random.SeedSequence(random_seed).spawn(num_of_starts), bound, workers=workers, 
+        effect_variables=effect_variables, constraint=constraint)
 
     for iagent,agent in enumerate(remaining_agents):
         for iitem,item in enumerate(remaining_items):
@@ -83,7 +104,8 @@ general_course_allocation.logger = logger
 
 def course_allocation(utilities:ValuationMatrix, budgets: list[float], prices: list[float], 
                       item_capacity: list[int], agent_capacity: list[int], 
-                      bound: int = 0, effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None) \
+                      bound: int = 0, effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None,
+                      workers: int = 1) \
         -> list[list[bool]]:
     """
     The main function.
@@ -113,40 +135,165 @@ def course_allocation(utilities:ValuationMatrix, budgets: list[float], prices: l
     """
 
     logger.debug('course_allocation function')
+    best_node, _ = _tabu_search(utilities, budgets, prices, item_capacity, agent_capacity, bound, workers=workers, 
+                                effect_variables=effect_variables, constraint=constraint)
+    return best_node.placement
+
 
+def _tabu_search(utilities, budgets: list[float], prices: list[float], 
+                 item_capacity: list[int], agent_capacity: list[int], bound: float, 
+                 workers: int = 1, stop_event = None,
+                 effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None) -> tuple:
+    """
+    Run the tabu search of course_allocation.
+    :param stop_event: an optional multiprocessing Event; the search stops when it is set.
+    :param effect_variables, constraint: sent to max_utilities. When they are given, the demands are not cached by the oracle,
+        and they are computed in this process.
+    :return the best node, and the history of the best clearing error: a list of pairs (seconds since start, score).
+    """
+    start_time = time.perf_counter()
     q = PriorityQueue()
-    tabu = []
-    curr_node: Course_Bundle = Course_Bundle(utilities, budgets, prices, item_capacity, agent_capacity)
+    tabu = set()     # the price vectors that were already visited
+    oracle = DemandOracle(utilities, budgets, agent_capacity)
+    valuation_matrix = ValuationMatrix(utilities)
+    def demands(prices):
+        return max_utilities(valuation_matrix, budgets, prices, agent_capacity, effect_variables, constraint, oracle=oracle)
+    curr_node: Course_Bundle = Course_Bundle(utilities, budgets, prices, item_capacity, agent_capacity, placement=demands(prices))
     best_node = curr_node
+    history = [(time.perf_counter()-start_time, best_node.score())]
 
     counter = 0
     max_iterations = 100
 
-    while best_node.score() > bound:
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_oracle, initargs=(oracle.utilities, oracle.budgets, oracle.agent_capacity)) \
+        if workers > 1 and effect_variables is None and constraint is None else None
+    try:
+        while best_node.score() > bound:
+
+            if counter == max_iterations:
+                break
+            if stop_event is not None and stop_event.is_set():
+                break
+
+            tabu.add(curr_node.key())
+            neighbor_prices = curr_node.neighbors()
+            if executor is None:
+                neighbor_placements = [demands(p) for p in neighbor_prices]
+            else:
+                neighbor_placements = executor.map(_worker_demands, neighbor_prices)
+            for p,placement in zip(neighbor_prices, neighbor_placements):
+                q.put(Course_Bundle(utilities, budgets, p, item_capacity, agent_capacity, oracle=oracle, placement=placement))
 
-        if counter == max_iterations:
-            break
+            curr_node = q.get()
+            while curr_node.key() in tabu:
+                curr_node = q.get()
 
-        tabu.append(curr_node)
-        for p in curr_node.neighbors():
-            q.put(Course_Bundle(utilities, budgets, p, item_capacity, agent_capacity))
+            if curr_node.score() < best_node.score():
+                logger.info('The new best_node score is: %g', best_node.score())
+                best_node = curr_node
+                history.append((time.perf_counter()-start_time, best_node.score()))
 
-        curr_node = q.get()
-        while tabu.__contains__(curr_node):
-            curr_node = q.get()
+            counter += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-        if curr_node.score() < best_node.score():
-            logger.info('The new best_node score is: %g', best_node.score())
-            best_node = curr_node
+    return best_node, history
 
-        counter += 1
 
-    return best_node.placement
+def multi_start_course_allocation(utilities:ValuationMatrix, item_capacity: list[int], agent_capacity: list[int], 
+                                  seeds: list[np.random.SeedSequence], bound: float = 0, workers: int = 1,
+                                  effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None,
+                                  return_history: bool = False) \
+        -> list[list[bool]]:
+    """
+    Run an independent tabu search from each seed: each start draws its budgets (between 1 and 2) and initial prices (between 0 and 1)
+    from its own numpy random Generator. The starts run in a pool of 'workers' processes.
+    When some start reaches the bound, the starts with a larger index are stopped; the starts with a smaller index run to completion,
+    so the result does not depend on the number of workers or on the order in which the starts finish.
+    The clearing error over wall time of each start is logged.
+
+    :param return_history: if True, return also the history of each start.
+    :return the placement of the first start (by index) that reaches the bound;
+        if no start reaches the bound, the placement with the smallest market-clearing error (ties are broken by the start index).
+        If return_history is True, return a pair (placement, histories), where histories[i] is the history of start i:
+        a list of pairs (seconds since the start, best clearing error so far); it is None if start i did not run.
+
+    >>> utilities = ValuationMatrix([[36, 35, 13, 10, 4, 2], [1, 3, 43, 37, 7, 9], [5, 13, 12, 17, 25, 28]])
+    >>> seeds = np.random.SeedSequence(1).spawn(2)
+    >>> placement = multi_start_course_allocation(utilities, [1,1,1,1,1,1], [2,2,2], seeds)
+    >>> len(placement), len(placement[0])
+    (3, 6)
+
+    The result with several workers is the same as with a single worker:
+    >>> seeds = np.random.SeedSequence(2).spawn(4)
+    >>> multi_start_course_allocation(utilities, [1,1,1,1,1,1], [2,2,2], seeds, workers=2) == multi_start_course_allocation(utilities, [1,1,1,1,1,1], [2,2,2], seeds)
+    True
+
+    The histories of the starts (here, the first start reaches the bound, so the other starts do not run):
+    >>> placement, histories = multi_start_course_allocation(utilities, [1,1,1,1,1,1], [2,2,2], seeds, return_history=True)
+    >>> [None if history is None else [error for _,error in history] for history in histories]
+    [[0.0], None, None, None]
+    """
+    utilities = np.array([np.asarray(utilities[agent], dtype=float) for agent in range(len(agent_capacity))])
+    results = []
+    if workers == 1 or len(seeds) == 1:
+        for index,seed in enumerate(seeds):
+            results.append(_run_start(index, utilities, item_capacity, agent_capacity, seed, bound, workers=workers, 
+                                      effect_variables=effect_variables, constraint=constraint))
+            if results[-1][1] <= bound:
+                break
+    else:
+        with multiprocessing.Manager() as manager:
+            stop_events = [manager.Event() for _ in seeds]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_run_start, index, utilities, item_capacity, agent_capacity, seed, bound, stop_event=stop_events[index],
+                                           effect_variables=effect_variables, constraint=constraint) 
+                           for index,seed in enumerate(seeds)]
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    results.append(future.result())
+                    index, best_score, _, _ = results[-1]
+                    if best_score <= bound:
+                        for later_index in range(index+1, len(seeds)):
+                            stop_events[later_index].set()
+                            futures[later_index].cancel()
+
+    for index, best_score, _, history in sorted(results, key=lambda result: result[0]):
+        logger.info("Start %d: clearing error %g; history (seconds, error): %s", index, best_score, [(round(seconds,3), error) for seconds,error in history])
+    results_within_bound = [result for result in results if result[1] <= bound]
+    if results_within_bound:
+        _, _, best_placement, _ = min(results_within_bound, key=lambda result: result[0])
+    else:
+        _, _, best_placement, _ = min(results, key=lambda result: (result[1], result[0]))
+    if return_history:
+        histories = [None] * len(seeds)
+        for index, _, _, history in results:
+            histories[index] = history
+        return best_placement, histories
+    return best_placement
+
+
+def _run_start(index: int, utilities: np.ndarray, item_capacity: list[int], agent_capacity: list[int], 
+               seed: np.random.SeedSequence, bound: float, workers: int = 1, stop_event = None,
+               effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None) -> tuple:
+    """
+    A single start of multi_start_course_allocation.
+    :return (index, best score, best placement, history).
+    """
+    generator = np.random.default_rng(seed)
+    budgets = (1 + generator.integers(1, 100, size=len(agent_capacity))/100).tolist()
+    prices  = (generator.integers(1, 100, size=len(item_capacity))/100).tolist()
+    best_node, history = _tabu_search(utilities, budgets, prices, item_capacity, agent_capacity, bound, workers=workers, stop_event=stop_event,
+                                      effect_variables=effect_variables, constraint=constraint)
+    return index, best_node.score(), best_node.placement, history
 
 
 def neighbors(utilities, budgets: list[float], prices: list[float], 
               item_capacity: list[int], agent_capacity:list[int],
-              effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None) \
+              effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None,
+              placement: list[list[bool]] = None) \
         -> list[list[float]]:
     """
     The neighbors function receives a current price vector, and produces for it a list of
@@ -170,7 +317,8 @@ def neighbors(utilities, budgets: list[float], prices: list[float],
     logger.debug('neighbors function')
 
     neighbors_list = []
-    placement = max_utilities(utilities, budgets, prices, agent_capacity)
+    if placement is None:
+        placement = max_utilities(utilities, budgets, prices, agent_capacity)
     placement_sum = np.sum(placement, axis=0)
 
     # 1) find neighbor by gradiant:
@@ -198,34 +346,38 @@ def neighbors(utilities, budgets: list[float], prices: list[float],
                 if placement[agent][item] == 1:
 
                     # 2.1) Looking for the package with the maximum value that *does not* contain the current course:
-                    x1 = cp.Variable(shape=(courses_num, 1), boolean=True)
-                    x1_price = sum(np.array(prices) @ x1)
-                    x1_utility = np.array(utilities[agent]) @ x1
-                    # x1_utility = sum([utilities[student][item] * x1[item] for item in range(len(courses_num))])
-                    objective1 = cp.Maximize(x1_utility)
-                    constraints = [
-                        x1_price <= budgets[agent],
-                        x1[item] == 0,
-                        sum(x1) <= agent_capacity[agent]
-                    ]
-                    prob = cp.Problem(objective1, constraints)
-                    prob.solve()
-                    # The maximum value of the package without the current course for the current student:
-                    O1 = prob.value
+                    O1 = knapsack_max_value_without(utilities[agent], budgets[agent], prices, agent_capacity[agent], item)
+                    if O1 is None:
+                        x1 = cp.Variable(shape=(courses_num, 1), boolean=True)
+                        x1_price = sum(np.array(prices) @ x1)
+                        x1_utility = np.array(utilities[agent]) @ x1
+                        # x1_utility = sum([utilities[student][item] * x1[item] for item in range(len(courses_num))])
+                        objective1 = cp.Maximize(x1_utility)
+                        constraints = [
+                            x1_price <= budgets[agent],
+                            x1[item] == 0,
+                            sum(x1) <= agent_capacity[agent]
+                        ]
+                        prob = cp.Problem(objective1, constraints)
+                        prob.solve()
+                        # The maximum value of the package without the current course for the current student:
+                        O1 = prob.value
                     logger.info('The maximum value without course %g for student %g is: %g', item, agent, O1)
 
                     # 2.2) Looking for the package with the minimum price whose value is greater than O1 and contains the current course:
-                    x2 = cp.Variable(shape=(courses_num, 1), boolean=True)
-                    objective2 = cp.Minimize(np.array(prices) @ x2)
-                    constraints = [
-                        sum(np.array(utilities[agent]) @ x2) >= O1 + Epsilon,
-                        # sum([utilities[student][item] * x2[item] for item in range(len(courses_num))]) >= O1 + Epsilon,
-                        x2[item] == 1,
-                        sum(x2) <= agent_capacity[agent]
-                    ]
-                    prob = cp.Problem(objective2, constraints)
-                    prob.solve()
-                    O2 = prob.value
+                    O2 = knapsack_min_price_with(utilities[agent], budgets[agent], prices, agent_capacity[agent], item, O1 + Epsilon)
+                    if O2 is None:
+                        x2 = cp.Variable(shape=(courses_num, 1), boolean=True)
+                        objective2 = cp.Minimize(np.array(prices) @ x2)
+                        constraints = [
+                            sum(np.array(utilities[agent]) @ x2) >= O1 + Epsilon,
+                            # sum([utilities[student][item] * x2[item] for item in range(len(courses_num))]) >= O1 + Epsilon,
+                            x2[item] == 1,
+                            sum(x2) <= agent_capacity[agent]
+                        ]
+                        prob = cp.Problem(objective2, constraints)
+                        prob.solve()
+                        O2 = prob.value
                     logger.info('The minimum price with course %g for student %g is: %g', item, agent, O2)
 
                     if (budgets[agent] - O2 + Epsilon) < pi:
@@ -291,6 +443,11 @@ def max_utility(utility: list[float], budget: float, prices: list[float], capaci
     [0, 1, 0, 0, 0, 1]
     """
 
+    if effect_variables is None and constraint is None:
+        placement = knapsack_demand(utility, budget, prices, capacity_of_agent)
+        if placement is not None:
+            return placement
+
     size = len(utility)
     # Create binary variables
     x = cp.Variable(shape=(size, 1), boolean=True)
@@ -308,7 +465,8 @@ def max_utility(utility: list[float], budget: float, prices: list[float], capaci
 
 
 def max_utilities(utilities: ValuationMatrix, budgets: list[float], prices: list[float], agent_capacity: list[int],
-                  effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None) \
+                  effect_variables: list[dict[set, int]] = None, constraint: list[dict[set, int]] = None,
+                  oracle: 'DemandOracle' = None) \
         -> list[list[bool]]:
 
     """
@@ -316,6 +474,7 @@ def max_utilities(utilities: ValuationMatrix, budgets: list[float], prices: list
     and calculates with the help of the max_utility function for each of the students
     the most affordable course package for him.
     Finally the function returns a matrix containing all the placements for all the students.
+    If a DemandOracle is given, the placements are taken from (and stored in) its cache.
 
     Example 1:
     >>> max_utilities(ValuationMatrix([[60,30,6,4],[62,32,4,2]]),[1.1,1.0],[1.1,0.9,0.1,0.0], [2,2])
@@ -334,6 +493,9 @@ def max_utilities(utilities: ValuationMatrix, budgets: list[float], prices: list
 
     logger.debug('max_utilities function')
 
+    if oracle is not None and effect_variables is None and constraint is None:
+        return oracle.demands(prices)
+
     placements = []
 
     # print("utilities: ", utilities)
@@ -341,7 +503,7 @@ def max_utilities(utilities: ValuationMatrix, budgets: list[float], prices: list
     # print("prices: ", prices)
     # print("agent_capacity: ", agent_capacity)
     for agent in utilities.agents():
-        placement: list[bool] = max_utility(utilities[agent], budgets[agent], prices, agent_capacity[agent])
+        placement: list[bool] = max_utility(utilities[agent], budgets[agent], prices, agent_capacity[agent], effect_variables, constraint)
         placements.append(placement)
 
     return placements
@@ -371,19 +533,26 @@ class Course_Bundle:
     """
 
     def __init__(self, utilities: ValuationMatrix, budgets: list[float], prices: list[float], 
-                 item_capacity: list[int], agent_capacity: list[int]):
+                 item_capacity: list[int], agent_capacity: list[int], oracle: 'DemandOracle' = None, placement: list[list[bool]] = None):
         self.utilities = utilities
         self.budgets = budgets
         self.prices = prices
         self.item_capacity = item_capacity
         self.agent_capacity = agent_capacity
-        self.placement = max_utilities(self.utilities, self.budgets, self.prices, self.agent_capacity)
+        self.placement = placement if placement is not None else max_utilities(self.utilities, self.budgets, self.prices, self.agent_capacity, oracle=oracle)
+        self._score = None
 
     def score(self):
-        return score(self.placement, self.item_capacity)
+        if self._score is None:
+            self._score = score(self.placement, self.item_capacity)
+        return self._score
 
     def neighbors(self):
-        return neighbors(self.utilities, self.budgets, self.prices, self.item_capacity, self.agent_capacity)
+        return neighbors(self.utilities, self.budgets, self.prices, self.item_capacity, self.agent_capacity, placement=self.placement)
+
+    def key(self)->tuple:
+        """ A hashable key of the price vector, for the tabu set. """
+        return tuple(self.prices)
 
     def __lt__(self, other):
         return self.score() < other.score()
@@ -391,6 +560,183 @@ class Course_Bundle:
     def __eq__(self, other):
         return np.array_equal(np.array(self.prices), np.array(other.prices))
 
+    def __hash__(self):
+        return hash(self.key())
+
+
+def _price_units(values) -> np.ndarray:
+    """
+    Convert prices to integer units of 1/PRICE_RESOLUTION.
+    :return None if some price is negative or is not a multiple of 1/PRICE_RESOLUTION.
+
+    >>> _price_units([1.1, 0.25, 0])
+    array([1100,  250,    0])
+    >>> _price_units([1.1, -1]) is None
+    True
+    """
+    scaled = np.asarray(values, dtype=float) * PRICE_RESOLUTION
+    units = np.round(scaled)
+    if np.any(units < 0) or not np.allclose(scaled, units, rtol=0, atol=1e-6):
+        return None
+    return units.astype(int)
+
+
+def _knapsack_table(utility: np.ndarray, weights: np.ndarray, max_weight: int, capacity: int, keep_choices: bool):
+    """
+    Dynamic programming for the cardinality-constrained knapsack:
+    table[c,w] is the maximum utility of a bundle with at most c items and total weight at most w.
+    :return the table, and (if keep_choices) a list with a boolean matrix per item, which is True where the item was taken.
+    """
+    table = np.zeros((capacity+1, max_weight+1))
+    choices = []
+    for value, weight in zip(utility, weights):
+        chosen = np.zeros(table.shape, dtype=bool)
+        if weight <= max_weight and value > 0:
+            for c in range(capacity, 0, -1):
+                candidate = table[c-1, :max_weight+1-weight] + value
+                improved = candidate > table[c, weight:]
+                table[c, weight:][improved] = candidate[improved]
+                chosen[c, weight:] = improved
+        if keep_choices:
+            choices.append(chosen)
+    return table, choices
+
+
+def _knapsack_is_small(num_of_items: int, max_weight: int, capacity: int) -> bool:
+    return num_of_items * (max_weight+1) * (capacity+1) <= MAX_KNAPSACK_TABLE_SIZE
+
+
+def knapsack_demand(utility: list[float], budget: float, prices: list[float], capacity: int) -> list[int]:
+    """
+    Find the demand of a student - a bundle with maximum utility among the bundles that fit the budget and capacity,
+    by dynamic programming on the budget (in units of 1/PRICE_RESOLUTION).
+    Only items with positive utility are taken.
+
+    :return a binary placement vector, or None if the prices are not non-negative multiples of 1/PRICE_RESOLUTION, or the table is too large
+        (then a generic MIP solver should be used).
+
+    >>> knapsack_demand([60,30,6,4],1.1,[1.1,0.9,0.1,0.0], 2)
+    [1, 0, 0, 1]
+    >>> knapsack_demand([36, 35, 13, 10, 4, 2], 1.0, [0.9, 0.3, 0.9, 1.1, 1.0, 0.2], 2)
+    [0, 1, 0, 0, 0, 1]
+    >>> knapsack_demand([30, 70], 1.0, [-1, 1], 1) is None
+    True
+    """
+    weights = _price_units(prices)
+    if weights is None or budget < 0:
+        return None
+    max_weight = int(np.floor(budget * PRICE_RESOLUTION + 1e-6))
+    capacity = int(min(capacity, len(weights)))
+    if not _knapsack_is_small(len(weights), max_weight, capacity):
+        return None
+    utility = np.asarray(utility, dtype=float)
+    table, choices = _knapsack_table(utility, weights, max_weight, capacity, keep_choices=True)
+    placement = [0]*len(weights)
+    c, w = capacity, max_weight
+    for item in range(len(weights)-1, -1, -1):
+        if choices[item][c, w]:
+            placement[item] = 1
+            c -= 1
+            w -= weights[item]
+    return placement
+
+
+def knapsack_max_value_without(utility: list[float], budget: float, prices: list[float], capacity: int, excluded_item: int) -> float:
+    """
+    :return the maximum utility of an affordable bundle that does not contain the excluded item,
+        or None if the knapsack solver cannot be used.
+
+    >>> knapsack_max_value_without([60,30,6,4], 1.1, [1.1,0.9,0.1,0.0], 2, excluded_item=0)
+    36.0
+    """
+    utility = np.array(utility, dtype=float)
+    utility[excluded_item] = 0
+    placement = knapsack_demand(utility, budget, prices, capacity)
+    if placement is None:
+        return None
+    return float(utility @ np.array(placement))
+
+
+def knapsack_min_price_with(utility: list[float], budget: float, prices: list[float], capacity: int, included_item: int, min_utility: float) -> float:
+    """
+    :return the minimum price of a bundle that contains the included item, has at most 'capacity' items, and has utility at least min_utility.
+        Only bundles with price at most the budget are searched; if there is no such bundle, or the knapsack solver cannot be used, return None.
+
+    >>> knapsack_min_price_with([60,30,6,4], 1.1, [1.1,0.9,0.1,0.0], 2, included_item=1, min_utility=35)
+    1.0
+    >>> knapsack_min_price_with([60,30,6,4], 1.1, [1.1,0.9,0.1,0.0], 2, included_item=1, min_utility=70) is None
+    True
+    """
+    weights = _price_units(prices)
+    if weights is None or capacity < 1:
+        return None
+    max_weight = int(np.floor(budget * PRICE_RESOLUTION + 1e-6)) - weights[included_item]
+    if max_weight < 0:
+        return None
+    capacity = int(min(capacity-1, len(weights)-1))
+    if not _knapsack_is_small(len(weights), max_weight, capacity):
+        return None
+    utility = np.array(utility, dtype=float)
+    included_utility = utility[included_item]
+    utility[included_item] = 0
+    table, _ = _knapsack_table(utility, weights, max_weight, capacity, keep_choices=False)
+    feasible_weights = np.flatnonzero(table[capacity] + included_utility >= min_utility)
+    if len(feasible_weights)==0:
+        return None
+    return float(feasible_weights[0] + weights[included_item]) / PRICE_RESOLUTION
+
+
+class DemandOracle:
+    """
+    Computes the demand (the optimal affordable bundle) of each student for given price vectors, and memoizes it.
+
+    A cached demand for prices p is reused for prices q if q >= p in every course, and the cached bundle is still affordable:
+    every bundle affordable at q was affordable at p, so the cached bundle is still optimal.
+    This is the typical case in the tabu search, where most neighbors raise the price of a single course.
+
+    >>> oracle = DemandOracle(ValuationMatrix([[60,30,6,4],[62,32,4,2]]), [1.1,1.0], [2,2])
+    >>> oracle.demands([1.1,0.9,0.1,0.0])
+    [[1, 0, 0, 1], [0, 1, 1, 0]]
+    >>> oracle.demands([1.1,0.9,0.2,0.0])   # student 0 keeps its bundle without solving
+    [[1, 0, 0, 1], [0, 1, 0, 1]]
+    >>> oracle.num_of_solves
+    3
+    """
+
+    def __init__(self, utilities, budgets: list[float], agent_capacity: list[int], max_cached_per_agent: int = 32):
+        self.utilities = np.array([np.asarray(utilities[agent], dtype=float) for agent in range(len(budgets))])
+        self.budgets = list(budgets)
+        self.agent_capacity = list(agent_capacity)
+        self.max_cached_per_agent = max_cached_per_agent
+        self.cache = [[] for _ in self.budgets]   # cache[agent] is a list of pairs (prices, placement), most recent last.
+        self.num_of_solves = 0
+
+    def demand(self, agent: int, prices: list[float]) -> list[int]:
+        prices = np.asarray(prices, dtype=float)
+        budget = self.budgets[agent]
+        for cached_prices, placement in reversed(self.cache[agent]):
+            if np.all(prices >= cached_prices) and prices @ placement <= budget + 1e-9:
+                return placement.tolist()
+        placement = max_utility(self.utilities[agent], budget, prices.tolist(), self.agent_capacity[agent])
+        self.num_of_solves += 1
+        self.cache[agent].append((prices, np.array(placement)))
+        if len(self.cache[agent]) > self.max_cached_per_agent:
+            self.cache[agent].pop(0)
+        return placement
+
+    def demands(self, prices: list[float]) -> list[list[int]]:
+        return [self.demand(agent, prices) for agent in range(len(self.budgets))]
+
+
+_worker_oracle = None     # the demand oracle of the current worker process.
+
+def _init_worker_oracle(utilities, budgets, agent_capacity):
+    global _worker_oracle
+    _worker_oracle = DemandOracle(utilities, budgets, agent_capacity)
+
+def _worker_demands(prices: list[float]) -> list[list[int]]:
+    return _worker_oracle.demands(prices)
+
 
 if __name__ == '__main__':
     import doctest
@@ -2,21 +2,22 @@
 Given an instance and an allocation, calculate various measures of satisfaction.
 """
 
-from fairpy.courses.instance import Instance
+from fairpy.courses.instance import Instance, DenseInstance
 from collections import defaultdict
 from fairpy.courses.explanations import *
 import numpy as np
-
-from functools import cache
+from scipy import sparse
 
 
 class AgentBundleValueMatrix:
 
-    def __init__(self, instance:Instance, allocation:dict[any, list[any]], normalized=True):
+    def __init__(self, instance:Instance, allocation:dict[any, list[any]], normalized=True, chunk_size:int=1000):
         """
         :param instance: an input instance to the fair-course-allocation problem.
         :param allocation: a dict mapping each agent to its bundle (a list)
         :param normalized: if True, it normalizes the valuations by the max-value.
+        :param chunk_size: the envy statistics are computed on blocks of this number of agents,
+            so that the full agent-bundle matrix is not materialized unless it is explicitly requested (via 'matrix' or 'envy_matrix').
 
         >>> instance = Instance(
         ...   agent_capacities = {"Alice": 2, "Bob": 3}, 
@@ -29,6 +30,8 @@ class AgentBundleValueMatrix:
         {'Alice': {'Alice': 11, 'Bob': 22}, 'Bob': {'Alice': 33, 'Bob': 44}}
         >>> matrix.utilitarian_value()
         27.5
+        >>> matrix.top_rank("Alice"), matrix.top_rank("Bob")
+        (2, 1)
         >>> matrix.egalitarian_value()
         11
 
@@ -43,120 +46,188 @@ class AgentBundleValueMatrix:
         1
         >>> matrix.count_agents_with_top_rank(2)
         2
+
+        ### computing the envy in blocks gives the same results:
+        >>> matrix = AgentBundleValueMatrix(instance, allocation, normalized=True, chunk_size=1)
+        >>> matrix.max_envy(), matrix.mean_envy()
+        (33.33333333333333, 16.666666666666664)
+        >>> matrix.mean_deficit(), matrix.max_deficit()
+        (1.5, 2)
+        >>> matrix.egalitarian_value()
+        33.33333333333333
         """
         self.instance = instance
         self.agents = instance.agents
-        self.raw_matrix = {
-            agent1: {
-                agent2: instance.agent_bundle_value(agent1, allocation[agent2])
-                for agent2 in self.agents
-            }
-            for agent1 in self.agents
-        }
-        self.maximum_values = {
-            agent: instance.agent_maximum_value(agent)
-            for agent in instance.agents
-        }
-        self.rankings = {
-            agent: instance.agent_ranking(agent, allocation[agent])
-            for agent in instance.agents
-        }
+        self.chunk_size = chunk_size
+        agents, items = list(instance.agents), list(instance.items)
+        self.agent_row = {agent:i for i,agent in enumerate(agents)}
+        item_index = {item:j for j,item in enumerate(items)}
+
+        # value_array[i,j] = the value of agent i to item j;  incidence[k,j] = 1 iff item j is in the bundle of agent k.
+        if isinstance(instance, DenseInstance):
+            self.value_array = instance.valuations[np.ix_([instance.agent_index[agent] for agent in agents], [instance.item_index[item] for item in items])]
+        else:
+            self.value_array = np.array([[instance.agent_item_value(agent,item) for item in items] for agent in agents])
+        bundle_rows = [k for k,agent in enumerate(agents) for item in allocation[agent]]
+        bundle_columns = [item_index[item] for agent in agents for item in allocation[agent]]
+        self.incidence = sparse.csr_matrix((np.ones(len(bundle_rows), dtype=int), (bundle_rows, bundle_columns)), shape=(len(agents), len(items)))
+
+        self.own_values = np.asarray(self.incidence.multiply(self.value_array).sum(axis=1)).ravel()
+        capacities = np.array([instance.agent_capacity(agent) for agent in agents])
+        sorted_values = -np.sort(-self.value_array, axis=1)
+        cumulative_values = np.concatenate([np.zeros((len(agents),1), dtype=sorted_values.dtype), np.cumsum(sorted_values, axis=1)], axis=1)
+        self.maximum_value_array = cumulative_values[np.arange(len(agents)), np.clip(capacities, 0, len(items))]
+        self.maximum_values = dict(zip(agents, self.maximum_value_array.tolist()))
+
+        # An agent's top rank is 1 + the number of items it values strictly more than its best item (ties are broken in favor of its own items).
+        best_own_values = np.where(self.incidence.toarray() > 0, self.value_array, -np.inf).max(axis=1, initial=-np.inf)
+        self.top_ranks = np.where(np.isfinite(best_own_values), 1 + (self.value_array > best_own_values[:, np.newaxis]).sum(axis=1), np.inf)
+        self.deficits = capacities - np.diff(self.incidence.indptr)
+
         self.allocation = {
-            agent: sorted(allocation[agent], key=self.rankings[agent].__getitem__)
-            for agent in instance.agents
-        }
-        self.normalized_matrix = {
-            agent1: {
-                agent2: self.raw_matrix[agent1][agent2] / self.maximum_values[agent1] * 100
-                for agent2 in self.agents
-            }
-            for agent1 in self.agents
+            agent: sorted(allocation[agent], key=lambda item: -self.value_array[i, item_index[item]])
+            for i,agent in enumerate(agents)
         }
-        self.matrix = self.raw_matrix
+        self.normalized = normalized
+        self._raw_value_matrix = None
         self.envy_matrix = None  # maps each agent-pair to the envy between them.
         self.envy_vector = None  # maps each agent to his maximum envy.
-        if normalized:
-            self.use_normalized_values()
+
+    @property
+    def raw_value_matrix(self)->np.ndarray:
+        """
+        An n*n array; entry [i,k] is the raw value of agent i to the bundle of agent k.
+        """
+        if self._raw_value_matrix is None:
+            self._raw_value_matrix = self._bundle_values(slice(None))
+        return self._raw_value_matrix
+
+    def _bundle_values(self, agent_rows:slice)->np.ndarray:
+        """
+        :return the raw values of the given agents (rows) to all bundles (columns).
+        """
+        return np.asarray(self.incidence @ self.value_array[agent_rows].T).T
+
+    def _value_array(self, raw_values:np.ndarray, agent_rows:slice)->np.ndarray:
+        """
+        :param raw_values: either a vector with one value per agent, or a block with one row per agent.
+        """
+        if self.normalized:
+            maximum_values = self.maximum_value_array[agent_rows]
+            if raw_values.ndim == 2:
+                maximum_values = maximum_values[:, np.newaxis]
+            return raw_values / maximum_values * 100
+        else:
+            return raw_values
+
+    def _to_dict(self, array:np.ndarray)->dict:
+        return {agent1: dict(zip(self.agents, row)) for agent1,row in zip(self.agents, array.tolist())}
+
+    @property
+    def raw_matrix(self)->dict:
+        return self._to_dict(self.raw_value_matrix)
+
+    @property
+    def normalized_matrix(self)->dict:
+        return self._to_dict(self.raw_value_matrix / self.maximum_value_array[:, np.newaxis] * 100)
+
+    @property
+    def matrix(self)->dict:
+        return self._to_dict(self._value_array(self.raw_value_matrix, slice(None)))
+
+    @property
+    def rankings(self)->dict:
+        return {
+            agent: self.instance.agent_ranking(agent, self.allocation[agent])
+            for agent in self.agents
+        }
 
     def use_raw_values(self)->float:
         """
         In the computations of utilitarian and egalitarian values, use the raw valuations of the agents.
         """
-        if self.matrix!=self.raw_matrix:
-           self.matrix = self.raw_matrix
+        if self.normalized:
+           self.normalized = False
            self.envy_matrix = self.envy_vector = None
 
     def use_normalized_values(self)->float:
         """
         In the computations of utilitarian and egalitarian values, use the valuations of the agents normalized such that their maximum possible value is 100.
         """
-        if self.matrix!=self.normalized_matrix:
-           self.matrix = self.normalized_matrix
+        if not self.normalized:
+           self.normalized = True
            self.envy_matrix = self.envy_vector = None
 
+    def _own_value_array(self)->np.ndarray:
+        return self._value_array(self.own_values, slice(None))
+
     def utilitarian_value(self)->float:
-        return sum([self.matrix[agent][agent] for agent in self.agents])/len(self.agents)
+        return self._own_value_array().mean().item()
 
     def egalitarian_value(self)->float:
-        return min([self.matrix[agent][agent] for agent in self.agents])
+        return self._own_value_array().min().item()
 
     def make_envy_matrix(self):
         if self.envy_matrix is not None:
             return
-        self.envy_matrix = {
-            agent1: {
-                agent2: self.matrix[agent1][agent2] - self.matrix[agent1][agent1]
-                for agent2 in self.agents
-            }
-            for agent1 in self.agents
-        }
-        self.envy_vector = {
-            agent1: max(self.envy_matrix[agent1].values())
-            for agent1 in self.agents
-        }
+        envy_array = self._value_array(self.raw_value_matrix, slice(None)) - self._own_value_array()[:, np.newaxis]
+        self.envy_matrix = self._to_dict(envy_array)
+        self.envy_vector = envy_array.max(axis=1)
+
+    def make_envy_vector(self):
+        """
+        Compute the maximum envy of each agent, in blocks of chunk_size agents, without materializing the full envy matrix.
+        """
+        if self.envy_vector is not None:
+            return
+        own_values = self._own_value_array()
+        envy_vector = np.empty(len(own_values), dtype=np.result_type(own_values, self.value_array))
+        for start in range(0, len(own_values), self.chunk_size):
+            rows = slice(start, start+self.chunk_size)
+            if self._raw_value_matrix is not None:
+                raw_values = self._raw_value_matrix[rows]
+            else:
+                raw_values = self._bundle_values(rows)
+            envy_vector[rows] = self._value_array(raw_values, rows).max(axis=1) - own_values[rows]
+        self.envy_vector = envy_vector
 
     def max_envy(self):
-        self.make_envy_matrix()
-        return max(self.envy_vector.values())
+        self.make_envy_vector()
+        return self.envy_vector.max().item()
 
     def mean_envy(self):
-        self.make_envy_matrix()
-        return sum([max(envy,0) for envy in self.envy_vector.values()]) / len(self.agents)
+        self.make_envy_vector()
+        return np.maximum(self.envy_vector, 0).mean().item()
 
-    def egalitarian_value(self):
-        return min([self.matrix[agent][agent] for agent in self.agents])
-
-    @cache
     def agent_deficit(self, agent):
         """ A "deficit" is the number of courses the agent received below its capacity. """
         return self.instance.agent_capacity(agent) - len(self.allocation[agent])
 
     def mean_deficit(self):
-        return sum([self.agent_deficit(agent) for agent in self.agents])/len(self.agents)
+        return self.deficits.mean().item()
 
     def max_deficit(self):
-        return max([self.agent_deficit(agent) for agent in self.agents])
+        return self.deficits.max().item()
 
-    @cache
     def top_rank(self, agent):
-        if len(self.allocation[agent])>0:
-            return self.rankings[agent][self.allocation[agent][0]]
-        else:
-            return np.inf
+        top_rank = self.top_ranks[self.agent_row[agent]]
+        return int(top_rank) if np.isfinite(top_rank) else np.inf
     
     def count_agents_with_top_rank(self, rank=1):
-        return sum([self.top_rank(agent)<=rank for agent in self.agents])
+        return int((self.top_ranks <= rank).sum())
 
     def explain(self, explanation_logger:ExplanationLogger, map_course_to_name:dict={}):
         """
         Generate a verbal explanation for the given agent.
         """
-        for agent in self.instance.agents:
+        rankings = self.rankings
+        normalized_own_values = self.own_values / self.maximum_value_array * 100
+        for i,agent in enumerate(self.instance.agents):
             explanation_logger.info("\nHere is your final allocation: ", agents=agent)
             for item in self.allocation[agent]:
-                explanation_logger.info(f" * Course {map_course_to_name.get(item,item)}: number {self.rankings[agent][item]} in your ranking, with value {self.instance.agent_item_value(agent,item)}", agents=agent)
+                explanation_logger.info(f" * Course {map_course_to_name.get(item,item)}: number {rankings[agent][item]} in your ranking, with value {self.instance.agent_item_value(agent,item)}", agents=agent)
             explanation_logger.info(f"The maximum possible value you could get for {self.instance.agent_capacity(agent)} courses is {self.maximum_values[agent]}.", agents=agent)
-            explanation_logger.info(f"Your total value is {self.raw_matrix[agent][agent]}, which is {np.round(self.normalized_matrix[agent][agent])}% of the maximum.", agents=agent)
+            explanation_logger.info(f"Your total value is {self.own_values[i].item()}, which is {np.round(normalized_own_values[i])}% of the maximum.", agents=agent)
 
 
 
@@ -9,7 +9,7 @@ Since : 2023-07
 """
 
 
-from fairpy.courses.graph_utils import many_to_many_matching_using_network_flow
+from fairpy.courses.graph_utils import many_to_many_matching_using_automatic_backend
 from fairpy.courses.instance    import Instance
 from fairpy.courses.allocation_utils import AllocationBuilder
 
@@ -17,10 +17,12 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def utilitarian_matching(alloc: AllocationBuilder):
+def utilitarian_matching(alloc: AllocationBuilder, backend:str="auto"):
     """
     Finds an allocation maximizing the sum of utilities for the given instance, using max-weight many-to-many matching.
 
+    :param backend: the backend of many_to_many_matching_using_automatic_backend (it may affect which of several optimal allocations is returned).
+
     >>> from dicttools import stringify
     >>> from fairpy.courses.adaptors import divide
 
@@ -45,12 +47,13 @@ def utilitarian_matching(alloc: AllocationBuilder):
     "{avi:['w', 'x', 'y', 'z'], beni:['w', 'x', 'y', 'z']}"
     """
     instance = alloc.remaining_instance()
-    alloc.give_bundles(many_to_many_matching_using_network_flow(
+    alloc.give_bundles(many_to_many_matching_using_automatic_backend(
         items=instance.items,
         item_capacity=instance.item_capacity,
         agents=instance.agents,
         agent_capacity=instance.agent_capacity,
-        agent_item_value=instance.agent_item_value))
+        agent_item_value=instance.agent_item_value,
+        backend=backend))
 
 
 utilitarian_matching.logger = logger
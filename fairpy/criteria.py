@@ -7,6 +7,11 @@ Programmer: Erel Segal-Halevi
 Since: 2021-04
 """
 
+import numpy as np
+from fairpy.valuations import ValuationMatrix
+from fairpy.allocations import Allocation, AllocationMatrix, _bundle_matrix
+
+
 def is_envyfree(agents, bundles, roundAcc:int=2)->bool:
 	"""
 	checks whether or not the allocation is envy free.
@@ -31,6 +36,149 @@ def is_envyfree(agents, bundles, roundAcc:int=2)->bool:
 				return False
 	return True
 
+
+class AllocationAuditor:
+	"""
+	Checks the envy-freeness and proportionality of a whole allocation at once,
+	when the agents have additive valuations given by a ValuationMatrix.
+	All checks are array operations on the n*m valuation matrix and the allocation matrix,
+	rather than per-agent calls to Valuation.is_EF1, is_EFx etc.
+
+	The EF1 and EFx checks consider every object that appears in a bundle (with a positive fraction) as a good of that bundle,
+	so they are meaningful for indivisible allocations.
+
+	>>> v = ValuationMatrix([[10,20,30,40],[40,30,20,10]])
+	>>> auditor = AllocationAuditor(v, [[0,1],[2,3]])
+	>>> auditor.value_matrix
+	array([[30., 70.],
+	       [70., 30.]])
+	>>> auditor.envy_matrix
+	array([[ 0., 40.],
+	       [40.,  0.]])
+	>>> auditor.is_EF(), auditor.is_EF1(), auditor.is_EFx()
+	(False, True, False)
+	>>> auditor.efx_violations()
+	array([[False,  True],
+	       [ True, False]])
+	>>> auditor.prop_slacks()
+	array([-20., -20.])
+	>>> auditor.propc_slacks(c=1)
+	array([0., 0.])
+	>>> auditor.max_envy(), auditor.mean_envy()
+	(40.0, 40.0)
+
+	>>> auditor = AllocationAuditor(v, [[2,3],[0,1]])   # each agent gets its two best goods
+	>>> auditor.is_EF(), auditor.is_PROP(), auditor.max_envy()
+	(True, True, 0.0)
+
+	>>> auditor = AllocationAuditor(v, AllocationMatrix([[0,0,0.5,1],[1,1,0.5,0]]))   # a fractional allocation
+	>>> auditor.utility_profile
+	array([55., 80.])
+	>>> auditor.is_EF()
+	True
+	"""
+
+	def __init__(self, valuation_matrix:ValuationMatrix, allocation, tolerance:float=0):
+		"""
+		:param valuation_matrix: a ValuationMatrix, or anything it can be constructed from; v[i][o] is the value of agent i to object o.
+		:param allocation: an Allocation, an AllocationMatrix (or a 2-dimensional numpy array), or a list of bundles (lists of object indices).
+		:param tolerance: an agent violates a criterion only if its envy (or deficit) is larger than this number.
+		"""
+		v = ValuationMatrix(valuation_matrix)
+		self.valuation_matrix = v
+		self.tolerance = tolerance
+		if isinstance(allocation, Allocation):
+			allocation = allocation.bundles
+		if isinstance(allocation, AllocationMatrix):
+			allocation = allocation._z
+		if isinstance(allocation, np.ndarray):
+			bundle_matrix = np.asarray(allocation, dtype=float)
+		else:
+			bundle_matrix = _bundle_matrix(allocation, v.num_of_objects)
+			if bundle_matrix is None:
+				raise TypeError(f"Cannot represent the allocation {allocation} as a matrix of {v.num_of_objects} objects")
+		if bundle_matrix.shape != (v.num_of_agents, v.num_of_objects):
+			raise ValueError(f"The allocation has shape {bundle_matrix.shape} but the valuation matrix has shape {(v.num_of_agents, v.num_of_objects)}")
+
+		values = np.asarray(v._v, dtype=float)
+		self.value_matrix = np.asarray(bundle_matrix @ values.T).T      # value_matrix[i,j] = value of agent i to bundle j
+		self.utility_profile = np.diagonal(self.value_matrix).copy()
+		self.envy_matrix = self.value_matrix - self.utility_profile[:, np.newaxis]   # envy_matrix[i,j] = how much agent i envies agent j
+		self.envy_vector = self.envy_matrix.max(axis=1)                 # the maximum envy of each agent
+
+		# For each agent i and bundle j, find the values of i's best and worst goods in j.
+		# Each (bundle, object) pair of the allocation is visited once, so this takes O(n * (number of pairs)) time.
+		if isinstance(bundle_matrix, np.ndarray):
+			bundle_indices, object_indices = np.nonzero(bundle_matrix)
+		else:   # a scipy.sparse matrix
+			nonzeros = bundle_matrix.tocoo()
+			bundle_indices, object_indices = nonzeros.row, nonzeros.col
+		best_good_values = np.full([v.num_of_agents, v.num_of_agents], -np.inf)   # indexed [bundle, agent]
+		worst_good_values = np.full([v.num_of_agents, v.num_of_agents], np.inf)                         # indexed [bundle, agent]
+		np.maximum.at(best_good_values, bundle_indices, values.T[object_indices])
+		np.minimum.at(worst_good_values, bundle_indices, values.T[object_indices])
+		bundle_sizes = np.bincount(bundle_indices, minlength=v.num_of_agents)
+		has_more_than_one_good = (bundle_sizes > 1)[np.newaxis, :]
+		self.value_except_best_good = np.where(has_more_than_one_good, self.value_matrix - best_good_values.T, 0)
+		self.value_except_worst_good = np.where(has_more_than_one_good, self.value_matrix - worst_good_values.T, 0)
+
+		self.total_values = np.maximum(values, 0).sum(axis=1)   # the value of each agent to all its desired goods
+		self.sorted_values = -np.sort(-np.maximum(values, 0), axis=1)     # each agent's desired values, from best to worst
+
+	def ef_violations(self)->np.ndarray:
+		"""
+		:return: a boolean n*n matrix; entry [i,j] is True iff agent i envies the bundle of agent j.
+		"""
+		return self.envy_matrix > self.tolerance
+
+	def ef1_violations(self)->np.ndarray:
+		"""
+		:return: a boolean n*n matrix; entry [i,j] is True iff agent i envies the bundle of agent j even after removing i's best good from it.
+		"""
+		return self.value_except_best_good - self.utility_profile[:, np.newaxis] > self.tolerance
+
+	def efx_violations(self)->np.ndarray:
+		"""
+		:return: a boolean n*n matrix; entry [i,j] is True iff agent i envies the bundle of agent j after removing i's worst good from it.
+		"""
+		return self.value_except_worst_good - self.utility_profile[:, np.newaxis] > self.tolerance
+
+	def propc_slacks(self, c:int)->np.ndarray:
+		"""
+		:return: for each agent, its own value minus 1/n of its value for all goods except its c best ones.
+		  A negative slack means that the allocation is not PROPc for this agent.
+		"""
+		value_except_best_c_goods = self.total_values - self.sorted_values[:, :c].sum(axis=1)
+		return self.utility_profile - value_except_best_c_goods / self.valuation_matrix.num_of_agents
+
+	def prop_slacks(self)->np.ndarray:
+		"""
+		:return: for each agent, its own value minus 1/n of its total value.
+		"""
+		return self.propc_slacks(c=0)
+
+	def is_EF(self)->bool:
+		return not self.ef_violations().any()
+
+	def is_EF1(self)->bool:
+		return not self.ef1_violations().any()
+
+	def is_EFx(self)->bool:
+		return not self.efx_violations().any()
+
+	def is_PROPc(self, c:int)->bool:
+		return bool((self.propc_slacks(c) >= -self.tolerance).all())
+
+	def is_PROP(self)->bool:
+		return self.is_PROPc(c=0)
+
+	def max_envy(self)->float:
+		return float(self.envy_vector.max())
+
+	def mean_envy(self)->float:
+		return float(np.maximum(self.envy_vector, 0).mean())
+
+
 if __name__ == "__main__":
     import doctest
     (failures,tests) = doctest.testmod(report=True)
@@ -14,6 +14,7 @@ Since: 2022-12
 from fairpy import ValuationMatrix
 
 import networkx as nx
+from fairpy.matching import max_weight_matching
 import numpy as np
 import pprint
 import logging
@@ -23,10 +24,11 @@ logger = logging.getLogger(__name__)
 
 
 # Main function
-def bidding_for_envy_freeness(bidding_matrix: ValuationMatrix) -> dict:
+def bidding_for_envy_freeness(bidding_matrix: ValuationMatrix, backend: str = "auto") -> dict:
     '''
     The Bidding for Envy Freeness function.
     :param bidding_matrix: the bidding matrix to perform the Bidding for Envy Freeness algorithm on.
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
     :return: the allocation of bundles and discounts after the Bidding for Envy Freeness algorithm.
     >>> bidding_for_envy_freeness([[50, 20, 10, 20], [60, 40, 15, 10], [0, 40, 25, 35], [50, 35, 10, 30]])
     Agent #0 gets {0} with value 5.
@@ -53,7 +55,7 @@ def bidding_for_envy_freeness(bidding_matrix: ValuationMatrix) -> dict:
     Agent #1 gets {0} with value 25.
     Agent #2 gets {1} with value 10.
     <BLANKLINE>    '''
-    bfef =  BiddingForEnvyFreeness(bidding_matrix)
+    bfef =  BiddingForEnvyFreeness(bidding_matrix, backend=backend)
 
     discounts = [[0 for _ in range(len(bfef.players_order))] for _ in range(len(bfef.players_order))]
 
@@ -65,10 +67,11 @@ def bidding_for_envy_freeness(bidding_matrix: ValuationMatrix) -> dict:
 
 # Algorithm Class
 class BiddingForEnvyFreeness:
-    def __init__(self, matrix: ValuationMatrix = None):
+    def __init__(self, matrix: ValuationMatrix = None, backend: str = "auto"):
         '''
         Bidding for Envy Freeness algorithm.
         :param matrix: a matrix of players bids for bundles.
+        :param backend: the backend of fairpy.matching.max_weight_matching, used in find_best_matching.
         
         >>> matrix = [[3, 2, 1], [2, 3, 1], [2, 1, 3]]
         >>> bidding_for_envy_freeness = BiddingForEnvyFreeness(matrix)
@@ -92,6 +95,8 @@ class BiddingForEnvyFreeness:
         
         logger.info(f'\n----------[ INFO ]----------\nInitializing BiddingForEnvyFreeness with bidding matrix:\n{matrix}\n----------------------------')
         
+        self.backend = backend
+
         # initializing the players bids for bundles matrix
         self.players_bids_for_bundles = matrix
         
@@ -127,7 +132,8 @@ class BiddingForEnvyFreeness:
     def find_best_matching(self, matrix: ValuationMatrix = None) -> list:
         '''
         Find the best matching for the given bidding matrix.
-        Using NetworkX maximum_weight_matching algorithm, which finds the maximum weight matching in a bipartite graph.
+        Using fairpy.matching.max_weight_matching, which finds the maximum weight matching in a bipartite graph
+        (by the Hungarian method for large graphs, and by the NetworkX blossom algorithm for small graphs).
         For applying the algorithm on our data, the following conversion is done:
             consider 2 sides of the bipartite graph: A, B, such that:
             A is the set of players, B is the set of bundles.
@@ -185,7 +191,7 @@ class BiddingForEnvyFreeness:
         g.add_weighted_edges_from(edges)
         
         # Finding the maximum weight matching
-        matching = nx.max_weight_matching(g)
+        matching = max_weight_matching(g, backend=self.backend)
         
         # Sorting the tuples to a form of (player, bundle)
         matching = [sorted(m, reverse=True) for m in matching]
@@ -43,7 +43,7 @@ def optimal_envy_free(agents, rent: float, budget: dict) -> (dict, dict):
     N = list([i for i in agentsList.agent_names()])
     A = list([i for i in agentsList.all_items()])
 
-    val = {i: {j: agentsList[N.index(i)].value(j) for j in A} for i in N}
+    val = {i: {j: agent.value(j) for j in A} for i, agent in zip(N, agentsList)}
     logger.debug("done initializing the first variables")
     # compute (σ,p) ∈ F(N,A,v,r)
     sigma = {}
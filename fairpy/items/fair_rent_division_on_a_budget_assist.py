@@ -1,10 +1,11 @@
 import doctest
 import networkx as nx
-import cvxpy as cp
+import numpy as np
 from fairpy.agentlist import AgentList
+from fairpy.matching import max_weight_matching
 
 
-def spliddit(agentList: AgentList, rent: float):
+def spliddit(agentList: AgentList, rent: float, backend: str = "auto"):
     """
         This function for calculation of allocation by spliddit algorithm
         By Linear Programming of :
@@ -15,8 +16,10 @@ def spliddit(agentList: AgentList, rent: float):
                     ∑_i∈N pσ(i) = r ,
                     ∀i ∈ N , v_iσ(i) − p_σ(i))
                     ∀i,j∈N, v_iσ(i) - p_σ(i) ≥ v_iσ(j) - p_σ(j)
+        The LP is solved on the envy graph of σ, by envy_free_prices.
     :param agentList:  agent whit rooms and valuation for each room by agent
     :param rent: total rent house
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal assignments is returned).
     :param N: list of agent
     :param A: list of room
     :return: sigma: N -> A , p : is vector of prices for each room
@@ -39,7 +42,7 @@ def spliddit(agentList: AgentList, rent: float):
 
     [g.add_edge(i, j, weight=agentList[k].value(j)) for i, k in zip(N, range(len(N))) for j in A]
     # max weight matching in graph
-    alloc = nx.max_weight_matching(g, maxcardinality=True)
+    alloc = max_weight_matching(g, maxcardinality=True, backend=backend)
     dict_match = {}
     for i in alloc:
         if i[1] not in A:
@@ -47,39 +50,15 @@ def spliddit(agentList: AgentList, rent: float):
         else:
             dict_match[i[0]] = i[1]
 
-    # variable is a list of all the 'price' variables that present the price of any room
-    variable = {f"price {i}": cp.Variable() for i in dict_match.values()}
-
-    variable["M"] = cp.Variable()  # this variable care for the maximum
-    objective = cp.Maximize(variable["M"])
-    constraints = []
-
-    # have 3 constrains
-    # 1)  M <= v_(iσ(i)) - p_(σ(i))
-    for i in dict_match.keys():
-        constraints.append(variable["M"] <= agentList[N.index(i)].value(dict_match[i]) - variable["price " + dict_match[i]])
-    constraints = [variable["M"] <= agentList[N.index(i)].value(dict_match[i]) - variable[f"price {dict_match[i]}"] for
-                   i in dict_match.keys()]
-
-    # 2) Check that without envy -> v_(iσ(i)) - p_(σ(i)) ≥ v_(iσ(j)) - p_(σ(j))
-    for i in dict_match.keys():
-        for j in dict_match.keys():
-            if i != j:
-                constraints.append(agentList[N.index(i)].value(dict_match[i]) - variable["price " + dict_match[i]] >=
-                                   agentList[N.index(i)].value(dict_match[j]) - variable["price " + dict_match[j]])
-    # 3) ∑ P_i = rent
-    total = 0
-    for i in dict_match.keys():
-        total += variable["price " + dict_match[i]]
-    constraints.append(total == rent)
-
-    # Solve
-    prob = cp.Problem(objective, constraints)
-    result = prob.solve()
+    # The envy-free prices that maximize the minimum utility are computed on the envy graph of the assignment.
+    map_agent_to_index = {name: index for index, name in enumerate(N)}
+    matched_agents = list(dict_match.keys())
+    values = np.array([[agentList[map_agent_to_index[i]].value(dict_match[k]) for k in matched_agents] for i in matched_agents], dtype=float)
+    prices = envy_free_prices(values, rent)
 
     # The result
-    sigma = {str(i): str(dict_match[i]) for i in dict_match.keys()}
-    vector_p = {str(dict_match[i]): round(float(variable["price " + dict_match[i]].value), 2) for i in dict_match.keys()}
+    sigma = {str(i): str(dict_match[i]) for i in matched_agents}
+    vector_p = {str(dict_match[i]): round(float(price), 2) for i, price in zip(matched_agents, prices)}
 
     sigma = dict(sorted(sigma.items(), key=lambda x: x[1]))
     vector_p = dict(sorted(vector_p.items(), key=lambda x: x[1]))
@@ -161,6 +140,7 @@ def LP1(µ: dict, rent, val: dict, budget: dict):
                     ∀s ∈ [t],  M ≤ fs (v_(1σ(1)) − p_(σ(1)), ..., v_(nσ(n)) − p_(σ(n)))
                     ∀i,j∈N, v_(iσ(i)) - p_(σ(i)) ≥ v_(iσ(j)) - p_(σ(j))
                     ∀i∈N,  p_(σ(i)) ≤ b_i
+        The LP is solved on the envy graph of µ, by envy_free_prices.
 
         :param µ:  µ: N -> A
         :param rent: Total rent
@@ -180,45 +160,88 @@ def LP1(µ: dict, rent, val: dict, budget: dict):
          >>> LP1(µ,1000,val,{'P1':200,'P2':400,'P3':700})
          ({'P3': 'Ra', 'P2': 'Rb', 'P1': 'Rc'}, {'Ra': 600.0, 'Rb': 250.0, 'Rc': 150.0})
         """
-    # variable = {}  # list of all the 'price' variables that present the price of any room
-    variable = {f"price {i}": cp.Variable() for i in µ.values()}
-
-    variable["M"] = cp.Variable()  # this variable care for the maximum
-    objective = cp.Maximize(variable["M"])
-    constraints = []
-    # have 4 constrains
-    # 1)  M <= v_(iσ(i)) - p_(σ(i))
-    for i in µ.keys():
-        constraints.append(variable["M"] <= val[i][µ[i]] - variable["price " + µ[i]])
-
-    # 2) Check that without envy -> v_(iσ(i)) - p_(σ(i)) ≥ v_(iσ(j)) - p_(σ(j))
-    for i in µ.keys():
-        for j in µ.keys():
-            if i != j:
-                constraints.append(val[i][µ[i]] - variable["price " + µ[i]] >=
-                                   val[i][µ[j]] - variable["price " + µ[j]])
-
-    # 3) p_(σ(i)) ≤ b_i
-    for i in µ.keys():
-        constraints.append(variable["price " + µ[i]] <= budget[i])
-
-    # 4) ∑ P_i = rent
-    total = 0
-    for i in µ.keys():
-        total += variable["price " + µ[i]]
-    constraints.append(total == rent)
-
-    prob = cp.Problem(objective, constraints)
-    result = prob.solve()
-
-    if prob.status == 'optimal':
-        sigma = {str(i): str(µ[i]) for i in µ.keys()}
-        vector_p = {str(µ[i]): round(float(variable["price " + µ[i]].value), 2) for i in µ.keys()}
+    agents = list(µ.keys())
+    values = np.array([[val[i][µ[k]] for k in agents] for i in agents], dtype=float)
+    prices = envy_free_prices(values, rent, budgets=np.array([budget[i] for i in agents], dtype=float))
+
+    if prices is not None:
+        sigma = {str(i): str(µ[i]) for i in agents}
+        vector_p = {str(µ[i]): round(float(price), 2) for i, price in zip(agents, prices)}
         return sigma, vector_p
     else:
         return "no solution"
 
 
+def envy_free_prices(values: np.ndarray, rent: float, budgets: np.ndarray = None) -> np.ndarray:
+    """
+        Computes envy-free prices that maximize the minimum utility, for a fixed welfare-maximizing assignment of rooms.
+        The utility of agent i is u_i = v_ii - p_i. Agent i does not envy agent k iff u_i >= u_k - (v_kk - v_ik);
+        this is a difference constraint, so the envy-free utility vectors are the feasible potentials of the envy graph,
+        which has an edge k -> i with weight v_kk - v_ik.
+        The least potentials above given lower bounds are computed by Bellman-Ford from a virtual source.
+        The maximin utility M is then found by a parametric search on the lower bound M of all utilities.
+
+    :param values: an n*n matrix; values[i][k] is the value of agent i for the room assigned to agent k.
+    :param rent: the total rent; the prices must sum up to the rent.
+    :param budgets: [optional] budgets[i] is the maximum price that agent i can pay.
+    :return: prices[k] is the price of the room assigned to agent k, or None if there are no envy-free prices within the budgets.
+
+    >>> envy_free_prices(np.array([[600, 100, 150], [100, 400, 250], [250, 250, 250]]), 1000).round(2).tolist()
+    [516.67, 316.67, 166.67]
+    >>> envy_free_prices(np.array([[700, 200, 100], [500, 250, 250], [300, 300, 400]]), 1000).round(2).tolist()
+    [600.0, 150.0, 250.0]
+    >>> envy_free_prices(np.array([[600, 100, 150], [100, 400, 250], [250, 250, 250]]), 1000, budgets=np.array([500, 400, 500])).round(2).tolist()
+    [500.0, 325.0, 175.0]
+    >>> envy_free_prices(np.array([[250, 750], [250, 750]]), 1000, budgets=np.array([600, 500])) is None
+    True
+    """
+    values = np.asarray(values, dtype=float)
+    num_of_agents = len(values)
+    if num_of_agents == 0:
+        return np.zeros(0)
+    own_values = np.diagonal(values)
+    edge_weights = own_values[:, np.newaxis] - values.T     # edge_weights[k][i] = weight of the edge k -> i = v_kk - v_ik
+    total_utility = own_values.sum() - rent
+
+    # alpha[i] = the least utility of i above the utility of the worst-off agent (the longest path into i with lower bounds 0).
+    alpha = -_bellman_ford(edge_weights, np.zeros(num_of_agents))
+    if budgets is None:
+        maximin_utility = (total_utility - alpha.sum()) / num_of_agents
+        return own_values - (maximin_utility + alpha)
+
+    # beta[i] = the least utility of i implied by the budget constraints u_k >= v_kk - b_k.
+    beta = -_bellman_ford(edge_weights, np.asarray(budgets, dtype=float) - own_values)
+    if beta.sum() > total_utility + 1e-9 * max(1, abs(total_utility)):
+        return None
+    # With a lower bound M on all utilities, the least utilities are max(M + alpha, beta). Their sum is a convex piecewise-linear
+    # function of M; each of its pieces is a lower bound, so the root of the function is the minimum of the roots of the pieces.
+    order = np.argsort(beta - alpha)
+    sum_of_inactive_beta = beta[order].sum() - np.cumsum(beta[order])
+    sum_of_active_alpha = np.cumsum(alpha[order])
+    maximin_utility = ((total_utility - sum_of_inactive_beta - sum_of_active_alpha) / np.arange(1, num_of_agents + 1)).min()
+    return own_values - np.maximum(maximin_utility + alpha, beta)
+
+
+def _bellman_ford(edge_weights: np.ndarray, initial_distances: np.ndarray) -> np.ndarray:
+    """
+        Computes shortest-path distances in a complete directed graph, from a virtual source with an edge of weight initial_distances[i] to each node i.
+        Each round relaxes all the edges at once; the loop stops as soon as a round changes nothing.
+
+    :param edge_weights: edge_weights[j][i] is the weight of the edge j -> i.
+    :return: the distance of each node from the virtual source.
+
+    >>> _bellman_ford(np.array([[0, -50, 50], [150, 0, 300], [200, 400, 0]]), np.zeros(3)).tolist()
+    [0.0, -50.0, 0.0]
+    """
+    distances = np.array(initial_distances, dtype=float)
+    for _ in range(len(distances) + 1):   # with the virtual source there are n+1 nodes, so n rounds suffice without a negative cycle.
+        new_distances = np.minimum(distances, (distances[:, np.newaxis] + edge_weights).min(axis=0))
+        if np.allclose(new_distances, distances, rtol=0, atol=1e-9):
+            return new_distances
+        distances = new_distances
+    raise ValueError("The envy graph has a negative cycle, so the assignment is not welfare-maximizing")
+
+
 if __name__ == '__main__':
     print(doctest.testmod())
     agentList1 = AgentList({'bob': {'Ra': 600, 'Rb': 100, 'Rc': 150, 'Rd': 150},
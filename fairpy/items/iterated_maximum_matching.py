@@ -13,21 +13,22 @@ Since : 2021-05
 """
 
 
-import networkx
 from typing import *
 from fairpy.items.graph_utils import instance_to_graph, matching_to_allocation
+from fairpy.matching import max_weight_matching
 from fairpy import AgentList
 
 import logging
 logger = logging.getLogger(__name__)
 
 
-def iterated_maximum_matching(agents: AgentList, item_capacities: Dict[str,int]=None, agent_weights: Dict[str, int]=None):
+def iterated_maximum_matching(agents: AgentList, item_capacities: Dict[str,int]=None, agent_weights: Dict[str, int]=None, backend:str="auto"):
     """
     Finds a maximum-weight matching with the given preferences, agent_weights and capacities.
     :param agents: maps each agent to a map from an item's name to its value for the agent.
     :param item_capacities [optional]: maps each item to its number of units. Default is 1.
     :param agent_weights [optional]: maps each agent to an integer priority. The weights of each agent are multiplied by WEIGHT_BASE^priority.
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
 
     >>> from dicttools import stringify
     >>> agents = AgentList({"avi": {"x":5, "y":4, "z":3, "w":2}, "beni": {"x":2, "y":3, "z":4, "w":5}})
@@ -48,7 +49,7 @@ def iterated_maximum_matching(agents: AgentList, item_capacities: Dict[str,int]=
     while len(item_capacities)>0:
         graph = instance_to_graph(agents, agent_weights=agent_weights, item_capacities=item_capacities)
         logger.info("Graph edges: %s", list(graph.edges.data()))
-        matching = networkx.max_weight_matching(graph, maxcardinality=False)
+        matching = max_weight_matching(graph, maxcardinality=False, backend=backend)
         logger.info("Matching: %s", matching)
         map_agent_to_bundle = matching_to_allocation(matching, agent_names=agents.agent_names())
         for agent,bundle in map_agent_to_bundle.items():
@@ -59,12 +60,13 @@ def iterated_maximum_matching(agents: AgentList, item_capacities: Dict[str,int]=
 
 
 
-def iterated_maximum_matching_categories(agents: AgentList, categories: List[List[str]], agent_weights: Dict[str, int]=None):
+def iterated_maximum_matching_categories(agents: AgentList, categories: List[List[str]], agent_weights: Dict[str, int]=None, backend:str="auto"):
     """
     Finds a maximum-weight matching with the given preferences and agent_weights, where the items are pre-divided into categories. Each agent gets at most a single item from each category.
     :param agents: maps each agent to a map from an item's name to its value for the agent.
     :param categories: a list of lists; each list is a category of items.
     :param agent_weights [optional]: maps each agent to an integer priority. The weights of each agent are multiplied by WEIGHT_BASE^priority.
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
 
     >>> from dicttools import stringify
     >>> agents = AgentList({"agent1": {"t1+": 0, "t1-": -3,   "t2+": 0, "t2-": -9,   "t3+": 0, "t3-": -2},	"agent2": {"t1+": 0, "t1-": -6,   "t2+": 0, "t2-": -9,   "t3+": 0, "t3-": -1}})
@@ -89,7 +91,7 @@ def iterated_maximum_matching_categories(agents: AgentList, categories: List[Lis
         graph = instance_to_graph(agents, agent_weights=agent_weights, item_capacities={item:1 for item in category})
         logger.info("Category %d:",index)
         logger.info("  Graph edges: %s", list(graph.edges.data()))
-        matching = networkx.max_weight_matching(graph, maxcardinality=True)
+        matching = max_weight_matching(graph, maxcardinality=True, backend=backend)
         logger.info("  Matching: %s", matching)
         map_agent_to_bundle = matching_to_allocation(matching, agent_names=agent_names)
         for name in agent_names:
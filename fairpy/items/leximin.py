@@ -19,6 +19,7 @@ Since:  2021-05
 import cvxpy, numpy as np
 from fairpy import AllocationToFamilies, map_agent_to_family, ValuationMatrix
 from fairpy.solve import solve
+from fairpy.items.max_welfare import fractional_allocation_variables, utility_vector, utility_matrix, envyfreeness_constraints
 
 from cvxpy_leximin import Problem, Leximin
 from typing import Any
@@ -84,25 +85,16 @@ def leximin_optimal_allocation(v: ValuationMatrix, allocation_constraint_functio
     >>> a = leximin_optimal_allocation(v)
     >>> logger.setLevel(logging.WARNING)
     """
-    allocation_vars = cvxpy.Variable((v.num_of_agents, v.num_of_objects))
-    feasibility_constraints = [
-        sum([allocation_vars[i][o] for i in v.agents()]) == 1
-        for o in v.objects()
-    ]
-    positivity_constraints = [
-        allocation_vars[i][o] >= 0 for i in v.agents() for o in v.objects()
-    ]
-    utilities = [
-        sum([allocation_vars[i][o] * v[i][o] for o in v.objects()])
-        for i in v.agents()
-    ]
+    allocation_vars, feasibility_constraints = fractional_allocation_variables(v.num_of_agents, v.num_of_objects)
+    utilities_vector = utility_vector(v, allocation_vars)
+    utilities = [utilities_vector[i] for i in v.agents()]
     if allocation_constraint_function is not None:
         allocation_constraints = [allocation_constraint_function(allocation_vars[i]) for i in v.agents()]
     else:
         allocation_constraints = []
     problem = Problem(
         Leximin(utilities),
-        constraints=feasibility_constraints + positivity_constraints + allocation_constraints,
+        constraints=feasibility_constraints + allocation_constraints,
         **solver_options
     )
     solve(problem)
@@ -162,30 +154,16 @@ def leximin_optimal_envyfree_allocation(v: ValuationMatrix, allocation_constrain
     >>> a = leximin_optimal_envyfree_allocation(v)
     >>> logger.setLevel(logging.WARNING)
     """
-    allocation_vars = cvxpy.Variable((v.num_of_agents, v.num_of_objects))
-    feasibility_constraints = [
-        sum([allocation_vars[i][o] for i in v.agents()]) == 1
-        for o in v.objects()
-    ]
-    positivity_constraints = [
-        allocation_vars[i][o] >= 0 for i in v.agents() for o in v.objects()
-    ]
-    utility_matrix = [       #  u[i][j] is the utility agent i attributes to the bundle of agent j.
-        [sum([allocation_vars[j][o]*v[i][o] for o in v.objects()]) for j in v.agents()]
-        for i in v.agents()
-    ]
-    utilities = [utility_matrix[i][i] for i in v.agents()]
-    envyfreeness_constraints = [
-        utility_matrix[i][i] >= utility_matrix[i][j]
-        for i in v.agents() for j in v.agents()
-    ]
+    allocation_vars, feasibility_constraints = fractional_allocation_variables(v.num_of_agents, v.num_of_objects)
+    utilities_matrix = utility_matrix(v, allocation_vars)   #  u[i][j] is the utility agent i attributes to the bundle of agent j.
+    utilities = [utilities_matrix[i,i] for i in v.agents()]
     if allocation_constraint_function is not None:
         allocation_constraints = [allocation_constraint_function(allocation_vars[i]) for i in v.agents()]
     else:
         allocation_constraints = []
     problem = Problem(
         Leximin(utilities),
-        constraints=feasibility_constraints + positivity_constraints + allocation_constraints + envyfreeness_constraints,
+        constraints=feasibility_constraints + allocation_constraints + envyfreeness_constraints(utilities_matrix),
         **solver_options
     )
     solve(problem)
@@ -233,28 +211,12 @@ def leximin_optimal_allocation_for_families(
     num_of_families = len(families)
     agent_to_family = map_agent_to_family(families, num_of_agents)
     logger.info("map_agent_to_family = %s", agent_to_family)
-    allocation_vars = cvxpy.Variable((num_of_families, num_of_objects))
-    feasibility_constraints = [
-        sum([allocation_vars[f][o] for f in range(num_of_families)]) == 1
-        for o in range(num_of_objects)
-    ]
-    positivity_constraints = [
-        allocation_vars[f][o] >= 0
-        for f in range(num_of_families)
-        for o in range(num_of_objects)
-    ]
-    utilities = [
-        sum(
-            [
-                allocation_vars[agent_to_family[i]][o] * v[i][o]
-                for o in range(num_of_objects)
-            ]
-        )
-        for i in range(num_of_agents)
-    ]
+    allocation_vars, feasibility_constraints = fractional_allocation_variables(num_of_families, num_of_objects)
+    utilities_vector = utility_vector(v, allocation_vars, agent_to_bundle=agent_to_family)
+    utilities = [utilities_vector[i] for i in range(num_of_agents)]
     problem = Problem(
         Leximin(utilities),
-        constraints=feasibility_constraints + positivity_constraints,
+        constraints=feasibility_constraints,
     )
     solve(problem)
     allocation_matrix = allocation_vars.value
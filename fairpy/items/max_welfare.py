@@ -11,13 +11,84 @@ Author: Erel Segal-Halevi
 Since:  2021-05
 """
 
-import cvxpy, numpy as np
+import cvxpy, numpy as np, functools
 from fairpy import ValuationMatrix, AllocationToFamilies
-from fairpy.solve import maximize
+from fairpy.solve import maximize, solve, DEFAULT_SOLVERS
 
 import logging
 logger = logging.getLogger(__name__)
 
+
+##### Matrix-form model construction
+
+
+def fractional_allocation_variables(num_of_bundles:int, num_of_objects:int):
+    """
+    Create a matrix of allocation variables, in which each row represents a bundle and each column represents an object,
+    together with the constraints that each object is allocated entirely, and all fractions are non-negative.
+    The constraints are stated on whole arrays, so their number does not depend on the size of the instance.
+
+    :return (allocation_vars, constraints)
+
+    >>> allocation_vars, constraints = fractional_allocation_variables(2, 3)
+    >>> allocation_vars.shape
+    (2, 3)
+    >>> len(constraints)
+    2
+    """
+    allocation_vars = cvxpy.Variable((num_of_bundles, num_of_objects))
+    constraints = [
+        cvxpy.sum(allocation_vars, axis=0) == 1,  # feasibility: each object is allocated entirely
+        allocation_vars >= 0,                     # positivity
+    ]
+    return allocation_vars, constraints
+
+
+def utility_vector(v: ValuationMatrix, allocation_vars, agent_to_bundle:list=None):
+    """
+    :param v: a valuation matrix, or a cvxpy Parameter of the same shape.
+    :param allocation_vars: a cvxpy matrix in which each row represents a bundle and each column represents an object.
+    :param agent_to_bundle [optional]: maps each agent to the row of its bundle (e.g. its family). Default: agent i gets row i.
+
+    :return a cvxpy vector expression u, in which u[i] is the utility of agent i from its bundle.
+
+    >>> v = ValuationMatrix([[1,2],[3,4]])
+    >>> utility_vector(v, np.array([[1,0],[0,1]])).value
+    array([1., 4.])
+    >>> utility_vector(v, np.array([[1,0.5]]), agent_to_bundle=[0,0]).value
+    array([2., 5.])
+    """
+    valuations = v._v if isinstance(v, ValuationMatrix) else v
+    if agent_to_bundle is not None:
+        allocation_vars = allocation_vars[agent_to_bundle, :]
+    return cvxpy.sum(cvxpy.multiply(allocation_vars, valuations), axis=1)
+
+
+def utility_matrix(v: ValuationMatrix, allocation_vars):
+    """
+    :return a cvxpy matrix expression u, in which u[i,j] is the utility agent i attributes to the bundle of agent j.
+
+    >>> v = ValuationMatrix([[1,2],[3,4]])
+    >>> utility_matrix(v, cvxpy.Constant([[1,0],[0,1]])).value
+    array([[1., 2.],
+           [3., 4.]])
+    """
+    return v._v @ allocation_vars.T
+
+
+def envyfreeness_constraints(utility_matrix):
+    """
+    :param utility_matrix: a square matrix expression, in which u[i,j] is the utility agent i attributes to the bundle of agent j.
+    :return a list with a single constraint, saying that u[i,i] >= u[i,j] for all i,j.
+    """
+    num_of_agents = utility_matrix.shape[0]
+    own_utilities = cvxpy.reshape(cvxpy.diag(utility_matrix), (num_of_agents, 1))
+    return [own_utilities @ np.ones((1, num_of_agents)) >= utility_matrix]
+
+
+##### Welfare maximization
+
+
 def max_welfare_allocation(v: ValuationMatrix, welfare_function, welfare_constraint_function=None, allocation_constraint_function=None) -> np.array:
     """
     Find an allocation maximizing a given social welfare function. 
@@ -30,16 +101,9 @@ def max_welfare_allocation(v: ValuationMatrix, welfare_function, welfare_constra
 
     For usage examples, see the functions max_sum_allocation, max_product_allocation, max_minimum_allocation.
     """
-    allocation_vars = cvxpy.Variable((v.num_of_agents, v.num_of_objects))
-    feasibility_constraints = [
-        sum([allocation_vars[i][o] for i in v.agents()])==1
-        for o in v.objects()
-    ]
-    positivity_constraints = [
-        allocation_vars[i][o] >= 0 for i in v.agents()
-        for o in v.objects()
-    ]
-    utilities = [sum([allocation_vars[i][o]*v[i][o] for o in v.objects()]) for i in v.agents()]
+    allocation_vars, feasibility_constraints = fractional_allocation_variables(v.num_of_agents, v.num_of_objects)
+    utilities_vector = utility_vector(v, allocation_vars)
+    utilities = [utilities_vector[i] for i in v.agents()]
     if welfare_constraint_function is not None:
         welfare_constraints = [welfare_constraint_function(utility) for utility in utilities]
     else:
@@ -48,7 +112,7 @@ def max_welfare_allocation(v: ValuationMatrix, welfare_function, welfare_constra
         allocation_constraints = [allocation_constraint_function(allocation_vars[i]) for i in v.agents()]
     else:
         allocation_constraints = []
-    max_welfare = maximize(welfare_function(utilities), feasibility_constraints+positivity_constraints+welfare_constraints+allocation_constraints)
+    max_welfare = maximize(welfare_function(utilities), feasibility_constraints+welfare_constraints+allocation_constraints)
     logger.info("Maximum welfare is %g",max_welfare)
     allocation_matrix = allocation_vars.value + 0
     allocation_matrix[allocation_matrix==0]=0   # Remove negative zeros: https://stackoverflow.com/a/26786119/827927
@@ -73,29 +137,14 @@ def max_welfare_envyfree_allocation(v: ValuationMatrix, welfare_function, alloca
     [[0.5 0.5]
      [0.5 0.5]]
     """
-    allocation_vars = cvxpy.Variable((v.num_of_agents, v.num_of_objects))
-    feasibility_constraints = [
-        sum([allocation_vars[i][o] for i in v.agents()])==1
-        for o in v.objects()
-    ]
-    positivity_constraints = [
-        allocation_vars[i][o] >= 0 for i in v.agents()
-        for o in v.objects()
-    ]
-    utility_matrix = [       #  u[i][j] is the utility agent i attributes to the bundle of agent j.
-        [sum([allocation_vars[j][o]*v[i][o] for o in v.objects()]) for j in v.agents()]
-        for i in v.agents()
-    ]
-    utilities = [utility_matrix[i][i] for i in v.agents()]
-    envyfreeness_constraints = [
-        utility_matrix[i][i] >= utility_matrix[i][j]
-        for i in v.agents() for j in v.agents()
-    ]
+    allocation_vars, feasibility_constraints = fractional_allocation_variables(v.num_of_agents, v.num_of_objects)
+    utilities_matrix = utility_matrix(v, allocation_vars)   #  u[i][j] is the utility agent i attributes to the bundle of agent j.
+    utilities = [utilities_matrix[i,i] for i in v.agents()]
     if allocation_constraint_function is not None:
         allocation_constraints = [allocation_constraint_function(allocation_vars[i]) for i in v.agents()]
     else:
         allocation_constraints = []
-    max_welfare = maximize(welfare_function(utilities), feasibility_constraints+positivity_constraints+allocation_constraints+envyfreeness_constraints)
+    max_welfare = maximize(welfare_function(utilities), feasibility_constraints+allocation_constraints+envyfreeness_constraints(utilities_matrix))
     logger.info("Maximum welfare is %g",max_welfare)
     allocation_matrix = allocation_vars.value
     allocation_matrix[allocation_matrix==0]=0   # Remove negative zeros: https://stackoverflow.com/a/26786119/827927
@@ -121,30 +170,122 @@ def max_welfare_allocation_for_families(instance, families:list, welfare_functio
     num_of_families = len(families)
     agent_to_family = map_agent_to_family(families, v.num_of_agents)
 
-    alloc = cvxpy.Variable((num_of_families, v.num_of_objects))
-    feasibility_constraints = [
-        sum([alloc[f][o] for f in range(num_of_families)])==1
-        for o in v.objects()
-    ]
-    positivity_constraints = [
-        alloc[f][o] >= 0 for f in range(num_of_families)
-        for o in v.objects()
-    ]
-    utilities = [sum([alloc[agent_to_family[i]][o]*v[i][o] for o in v.objects()]) for i in v.agents()]
+    alloc, feasibility_constraints = fractional_allocation_variables(num_of_families, v.num_of_objects)
+    utilities_vector = utility_vector(v, alloc, agent_to_bundle=agent_to_family)
+    utilities = [utilities_vector[i] for i in v.agents()]
 
     if welfare_constraint_function is not None:
         welfare_constraints = [welfare_constraint_function(utility) for utility in utilities]
     else:
         welfare_constraints = []
-    max_welfare = maximize(welfare_function(utilities), feasibility_constraints+positivity_constraints+welfare_constraints)
+    max_welfare = maximize(welfare_function(utilities), feasibility_constraints+welfare_constraints)
     logger.info("Maximum welfare is %g",max_welfare)
     return AllocationToFamilies(v, alloc.value, families)
 
 
-def max_sum_allocation(v:ValuationMatrix, allocation_constraint_function=None) -> np.array:
+##### Compiled problems for repeated solves
+
+
+WELFARE_FUNCTIONS = {
+    "sum":     lambda utilities: sum(utilities),
+    "product": lambda utilities: sum([cvxpy.log(utility) for utility in utilities]),
+    "minimum": lambda utilities: cvxpy.min(cvxpy.hstack(utilities)),
+}
+
+COMPILED_PROBLEM_CACHE_SIZE = 32
+
+
+class CompiledWelfareProblem:
+    """
+    A welfare-maximization problem for a fixed number of agents and objects, in which the valuation matrix is a cvxpy Parameter.
+    The problem is canonicalized by cvxpy at the first solve only;
+    later solves just substitute the new valuations, and warm-start the solver from the previous solution.
+
+    >>> problem = CompiledWelfareProblem(WELFARE_FUNCTIONS["sum"], 2, 2)
+    >>> print(problem.solve(ValuationMatrix([ [3,2] , [1,4] ])).round(3))
+    [[1. 0.]
+     [0. 1.]]
+    >>> print(problem.solve(ValuationMatrix([ [1,4] , [3,2] ])).round(3))
+    [[0. 1.]
+     [1. 0.]]
+    >>> problem.num_of_solves
+    2
+    """
+    def __init__(self, welfare_function, num_of_agents:int, num_of_objects:int, welfare_constraint_function=None, allocation_constraint_function=None):
+        """
+        :param welfare_function, welfare_constraint_function, allocation_constraint_function: as in max_welfare_allocation.
+        """
+        self.valuations = cvxpy.Parameter((num_of_agents, num_of_objects))
+        self.allocation_vars, feasibility_constraints = fractional_allocation_variables(num_of_agents, num_of_objects)
+        utilities_vector = utility_vector(self.valuations, self.allocation_vars)
+        utilities = [utilities_vector[i] for i in range(num_of_agents)]
+        if welfare_constraint_function is not None:
+            welfare_constraints = [welfare_constraint_function(utility) for utility in utilities]
+        else:
+            welfare_constraints = []
+        if allocation_constraint_function is not None:
+            allocation_constraints = [allocation_constraint_function(self.allocation_vars[i]) for i in range(num_of_agents)]
+        else:
+            allocation_constraints = []
+        self.objective = welfare_function(utilities)
+        self.problem = cvxpy.Problem(cvxpy.Maximize(self.objective), feasibility_constraints+welfare_constraints+allocation_constraints)
+        self.solver = None   # the solver that succeeded in the latest solve
+        self.num_of_solves = 0
+
+    def solve(self, v: ValuationMatrix, solvers:list=DEFAULT_SOLVERS) -> np.array:
+        """
+        Solve the problem for the given valuations.
+        The solver that succeeded in the previous solve is tried first,
+        since trying a different solver would make cvxpy canonicalize the problem again.
+        If it fails, the other solvers are tried in their original order.
+        """
+        self.valuations.value = np.asarray(v._v, dtype=float)
+        if self.solver in solvers:
+            solvers = [self.solver] + [solver for solver in solvers if solver != self.solver]
+        self.solver = solve(self.problem, solvers=solvers, warm_start=True)
+        self.num_of_solves += 1
+        logger.info("Maximum welfare is %g", self.objective.value)
+        allocation_matrix = self.allocation_vars.value + 0
+        allocation_matrix[allocation_matrix==0]=0   # Remove negative zeros
+        return allocation_matrix
+
+
+@functools.lru_cache(maxsize=COMPILED_PROBLEM_CACHE_SIZE)
+def compiled_welfare_problem(welfare:str, num_of_agents:int, num_of_objects:int, allocation_constraint_function=None) -> CompiledWelfareProblem:
+    """
+    Return a compiled problem for maximizing the given welfare function (a key of WELFARE_FUNCTIONS) subject to non-negative utilities.
+    Problems are cached by (welfare, num_of_agents, num_of_objects, allocation_constraint_function),
+    so repeated calls with instances of the same shape reuse the same cvxpy problem.
+
+    NOTE: the allocation constraint is part of the cache key by its identity, not by what it computes.
+    To benefit from the cache when using an allocation constraint, define the function once (e.g. at module level)
+    and pass the same function object in every call. A lambda created anew in each call never hits the cache,
+    and each such call keeps another compiled problem in the cache (of size COMPILED_PROBLEM_CACHE_SIZE) until it is evicted;
+    use compiled=False in this case, or call compiled_welfare_problem.cache_clear() to release the cached problems.
+
+    >>> compiled_welfare_problem("sum", 2, 3) is compiled_welfare_problem("sum", 2, 3)
+    True
+    >>> compiled_welfare_problem("sum", 2, 3) is compiled_welfare_problem("product", 2, 3)
+    False
+    >>> at_most_one_object = lambda allocation_vector: cvxpy.sum(allocation_vector) <= 1
+    >>> compiled_welfare_problem("sum", 2, 3, at_most_one_object) is compiled_welfare_problem("sum", 2, 3, at_most_one_object)
+    True
+    >>> compiled_welfare_problem("sum", 2, 3, lambda x: cvxpy.sum(x) <= 1) is compiled_welfare_problem("sum", 2, 3, lambda x: cvxpy.sum(x) <= 1)
+    False
+    """
+    return CompiledWelfareProblem(WELFARE_FUNCTIONS[welfare], num_of_agents, num_of_objects,
+        welfare_constraint_function=lambda utility: utility >= 0,
+        allocation_constraint_function=allocation_constraint_function)
+
+
+def max_sum_allocation(v:ValuationMatrix, allocation_constraint_function=None, compiled:bool=False) -> np.array:
     """
     Find the max-sum (aka Utilitarian) allocation.
     :param v: a matrix v in which each row represents an agent, each column represents an object, and v[i][j] is the value of agent i to object j.
+    :param compiled: if True, solve using a cached CompiledWelfareProblem for instances of this shape.
+        The first call is slower, as cvxpy has to canonicalize a parameterized problem;
+        later calls with the same shape and the same allocation_constraint_function object skip canonicalization
+        and warm-start from the previous solution (see compiled_welfare_problem).
 
     :return allocation_matrix:  a matrix alloc of a similar shape in which alloc[i][j] is the fraction allocated to agent i from object j.
     The allocation should maximize the product (= sum of logs) of utilities
@@ -155,11 +296,16 @@ def max_sum_allocation(v:ValuationMatrix, allocation_constraint_function=None) -
     [[1. 1.]
      [0. 0.]]
     >>> print(max_sum_allocation(ValuationMatrix([ [3,2] , [1,4] ])).round(3))   # two different items
+    [[1. 0.]
+     [0. 1.]]
+    >>> print(max_sum_allocation(ValuationMatrix([ [3,2] , [1,4] ]), compiled=True).round(3))
     [[1. 0.]
      [0. 1.]]
     """
+    if compiled:
+        return compiled_welfare_problem("sum", v.num_of_agents, v.num_of_objects, allocation_constraint_function).solve(v)
     return max_welfare_allocation(v,
-        welfare_function=lambda utilities: sum(utilities),
+        welfare_function=WELFARE_FUNCTIONS["sum"],
         welfare_constraint_function=lambda utility: utility >= 0,
         allocation_constraint_function = allocation_constraint_function)
 
@@ -223,10 +369,14 @@ def max_power_sum_allocation(v:ValuationMatrix, power:float, allocation_constrai
         allocation_constraint_function=allocation_constraint_function)
 
 
-def max_product_allocation(v:ValuationMatrix, allocation_constraint_function=None) -> np.array:
+def max_product_allocation(v:ValuationMatrix, allocation_constraint_function=None, compiled:bool=False) -> np.array:
     """
     Find the max-product (aka Max Nash Welfare) allocation.
     :param v: a matrix v in which each row represents an agent, each column represents an object, and v[i][j] is the value of agent i to object j.
+    :param compiled: if True, solve using a cached CompiledWelfareProblem for instances of this shape.
+        The first call is slower, as cvxpy has to canonicalize a parameterized problem;
+        later calls with the same shape and the same allocation_constraint_function object skip canonicalization
+        and warm-start from the previous solution (see compiled_welfare_problem).
 
     :return allocation_matrix:  a matrix alloc of a similar shape in which alloc[i][j] is the fraction allocated to agent i from object j.
     The allocation should maximize the product (= sum of logs) of utilities
@@ -237,19 +387,28 @@ def max_product_allocation(v:ValuationMatrix, allocation_constraint_function=Non
     [[0.5 0.5]
      [0.5 0.5]]
     >>> print(max_product_allocation(ValuationMatrix([ [3,2] , [1,4] ])).round(3)+0)   # two different items
+    [[1. 0.]
+     [0. 1.]]
+    >>> print(max_product_allocation(ValuationMatrix([ [3,2] , [1,4] ]), compiled=True).round(3)+0)
     [[1. 0.]
      [0. 1.]]
     """
+    if compiled:
+        return compiled_welfare_problem("product", v.num_of_agents, v.num_of_objects, allocation_constraint_function).solve(v)
     return max_welfare_allocation(v,
-        welfare_function=lambda utilities: sum([cvxpy.log(utility) for utility in utilities]),
+        welfare_function=WELFARE_FUNCTIONS["product"],
         welfare_constraint_function=lambda utility: utility >= 0,
         allocation_constraint_function = allocation_constraint_function)
 
 
-def max_minimum_allocation(v:ValuationMatrix, allocation_constraint_function=None) -> np.array:
+def max_minimum_allocation(v:ValuationMatrix, allocation_constraint_function=None, compiled:bool=False) -> np.array:
     """
     Find the max-minimum (aka Egalitarian) allocation.
     :param v: a matrix v in which each row represents an agent, each column represents an object, and v[i][j] is the value of agent i to object j.
+    :param compiled: if True, solve using a cached CompiledWelfareProblem for instances of this shape.
+        The first call is slower, as cvxpy has to canonicalize a parameterized problem;
+        later calls with the same shape and the same allocation_constraint_function object skip canonicalization
+        and warm-start from the previous solution (see compiled_welfare_problem).
 
     :return allocation_matrix:  a matrix alloc of a similar shape in which alloc[i][j] is the fraction allocated to agent i from object j.
     The allocation should maximize the leximin vector of utilities.
@@ -266,11 +425,16 @@ def max_minimum_allocation(v:ValuationMatrix, allocation_constraint_function=Non
     >>> v = ValuationMatrix([ [4,2] , [1,3] ])     # two different items
     >>> a = max_minimum_allocation(v).round(3)
     >>> print(a)
+    [[0.8 0. ]
+     [0.2 1. ]]
+    >>> print(max_minimum_allocation(v, compiled=True).round(3))
     [[0.8 0. ]
      [0.2 1. ]]
     """
+    if compiled:
+        return compiled_welfare_problem("minimum", v.num_of_agents, v.num_of_objects, allocation_constraint_function).solve(v)
     return max_welfare_allocation(v,
-        welfare_function=lambda utilities: cvxpy.min(cvxpy.hstack(utilities)),
+        welfare_function=WELFARE_FUNCTIONS["minimum"],
         welfare_constraint_function=lambda utility: utility >= 0,
         allocation_constraint_function = allocation_constraint_function)
 
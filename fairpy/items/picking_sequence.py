@@ -8,6 +8,7 @@ Since:  2020-07 - 2023-06
 """
 
 from fairpy import AgentList
+import numpy as np
 
 import logging
 logger = logging.getLogger(__name__)
@@ -23,6 +24,9 @@ def picking_sequence(agents:AgentList, agent_order:List[int], items:List[Any]=No
     :param items (optional): a list of items to allocate. Default is allocate all items.
     :return a list of bundles; each bundle is a list of items.
 
+    Each agent's ranking of the items is computed once, when it first picks;
+    then each pick skips the taken items at the top of the ranking, so the total time is O(n*m*log(m)).
+
     >>> from fairpy import AdditiveAgent
     >>> Alice = AdditiveAgent({"x": 11, "y": 22, "z": 44, "w":0}, name="Alice")
     >>> George = AdditiveAgent({"x": 22, "y": 11, "z": 66, "w":33}, name="George")
@@ -40,16 +44,34 @@ def picking_sequence(agents:AgentList, agent_order:List[int], items:List[Any]=No
     remaining_items = list(items)
     logger.info("\nPicking-sequence with agent-order %s and items %s", agent_order, remaining_items)
     bundles = [[] for _ in agents]
+    num_of_items = len(remaining_items)
+    is_taken = np.zeros(num_of_items, dtype=bool)
+    num_of_taken_items = 0
+    agent_values = {}     # maps an agent index to its values for the items (computed when the agent first picks).
+    agent_rankings = {}   # maps an agent index to the item indices, from best to worst (ties broken by the item order).
+    agent_next_rank = {}  # maps an agent index to a position in its ranking; all items before it are taken.
     while True:
         for agent_index in agent_order:
-            if len(remaining_items)==0:
+            if num_of_taken_items==num_of_items:
                 return bundles
             agent = agents[agent_index]
-            best_item_for_agent = max(remaining_items, key=agent.value)
-            best_item_value = agent.value(best_item_for_agent)
+            if agent_index not in agent_rankings:
+                values = agent.item_values(remaining_items)
+                agent_values[agent_index] = values
+                agent_rankings[agent_index] = np.argsort(-np.asarray(values, dtype=float), kind='stable')
+                agent_next_rank[agent_index] = 0
+            ranking = agent_rankings[agent_index]
+            rank = agent_next_rank[agent_index]
+            while is_taken[ranking[rank]]:
+                rank += 1
+            agent_next_rank[agent_index] = rank + 1
+            best_item_index = ranking[rank]
+            is_taken[best_item_index] = True
+            num_of_taken_items += 1
+            best_item_for_agent = remaining_items[best_item_index]
+            best_item_value = agent_values[agent_index][best_item_index]
             bundles[agent_index].append(best_item_for_agent)
             logger.info("%s takes %s (value %d)", agent.name(), best_item_for_agent, best_item_value)
-            remaining_items.remove(best_item_for_agent)
 
 
 def round_robin(agents:AgentList, agent_order:List[int]=None, items:List[Any]=None) -> List[List[Any]]:
@@ -13,6 +13,7 @@ from fairpy import AgentList
 from fairpy.allocations import Allocation
 from typing import List, Tuple
 import networkx as nx
+from fairpy.matching import max_weight_matching
 import logging
 logger = logging.getLogger(__name__)
 
@@ -62,12 +63,13 @@ def proportional_division(agents: AgentList) -> Allocation:
     _, allocation = selection_by_order(agents, items=unselected_items, allocation=allocation, num_iteration=int(p/2))
     return Allocation(agents, allocation)
 
-def proportional_division_equal_number_of_items_and_players(agents: AgentList) -> Allocation:
+def proportional_division_equal_number_of_items_and_players(agents: AgentList, backend: str = "auto") -> Allocation:
     """
     Proposition 2 from "Proportional Borda Allocations":
     Finds a proportional division for the items 
     
     :param agents: represents the n agents.
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
     :return: the proportional allocation, or none if no proportional allocation exists.
     Notes: 
         1. len(items) must be equal to len(agents)
@@ -94,7 +96,7 @@ def proportional_division_equal_number_of_items_and_players(agents: AgentList) -
         raise ValueError(f"Numbers of agents and items must be identical, but they are not: {len(agents)}, {k}")
     threshold = (k-1)/2
     G = reduction_to_graph(agents, items, threshold)
-    match = nx.max_weight_matching(G)
+    match = max_weight_matching(G, backend=backend)
     if len(match) < k:
         logger.info("No maximum match was found in the graph, therefore there is no proportional division")
         return
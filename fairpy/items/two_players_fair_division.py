@@ -64,39 +64,7 @@ def sequential(agents: AgentList, items: List[Any] = None) -> Dict:
     [{'Alice': ['a', 'b', 'd', 'f', 'h'], 'George': ['i', 'j', 'c', 'e', 'g']}, {'Alice': ['a', 'b', 'd', 'g', 'h'], 'George': ['i', 'j', 'c', 'e', 'f']}, {'Alice': ['a', 'b', 'e', 'f', 'h'], 'George': ['i', 'j', 'c', 'd', 'g']}]
 
     """
-    return recursive_sequential(agents, items, allocations=[[], []], end_allocation=[])
-
-
-def recursive_sequential(agents: AgentList, items: List[Any], allocations: List[Any] = [[], []],
-                     end_allocation=[], level: int = 1):
-    """
-    A recursive helper function to sequential()
-
-    :param agents A list that represent the players(agents) and for each player his valuation for each item, plus the
-    player's name.
-    :param items A list of all existing items (U).
-    :param allocations is the allocation for each player so far.
-    :param end_allocation is the end allocation for each player.
-    :param level is the depth level for item searching for each iteration.
-    """
-    logger.info("\nAlgorithm: OS\nTwo Agents %s %s and items %s", agents[0].name(), agents[1].name(), items)
-    if not items:
-        end_allocation.append({agents[0].name(): allocations[0], agents[1].name(): allocations[1]})
-        return end_allocation
-    H_A_level, H_B_level = H_M_l(agents, items, level)
-    logger.info("current allocations: \n%s: %s\n%s: %s", agents[0].name(), allocations[0], agents[1].name(),
-                allocations[0])
-    if H_A_level and H_B_level and have_different_elements(H_A_level, H_B_level):
-        for i in H_A_level:
-            for j in H_B_level:
-                if i != j:
-                    _allocations = deep_copy_2d_list(allocations)
-                    _items, _allocations = allocate(items.copy(), _allocations, i, j)
-                    logger.info("%s takes %s and %s takes %s", agents[0].name(), i, agents[1].name(), j)
-                    recursive_sequential(agents, _items, _allocations, end_allocation, level + 1)
-    else:
-        recursive_sequential(agents, items, allocations, end_allocation, level + 1)
-    return end_allocation
+    return list(sequential_generator(agents, items))
 
 
 def restricted_simple(agents: AgentList, items: List[Any] = None) -> Dict:
@@ -146,46 +114,7 @@ def restricted_simple(agents: AgentList, items: List[Any] = None) -> Dict:
 
     """
     logger.debug("\nAlgorithm: RS\nTwo Agents %s %s and items %s", agents[0].name(), agents[1].name(), items)
-    return recursive_restricted_simple(agents, items, allocations=[[], []], end_allocation=[])
-
-
-def recursive_restricted_simple(agents: AgentList, items: List[Any], allocations: List[Any] = [[], []],
-                                end_allocation=[], level: int = 1):
-    """
-    A recursive helper function to restricted_simple()
-
-    :param agents A list that represent the players(agents) and for each player his valuation for each item, plus the
-    player's name.
-    :param items A list of all existing items (U).
-    :param allocations is the allocation for each player so far.
-    :param end_allocation is the end allocation for each player.
-    :param level is the depth level for item searching for each iteration.
-    """
-    if not items:
-        end_allocation.append({agents[0].name(): allocations[0], agents[1].name(): allocations[1]})
-        return end_allocation
-    H_A_level, H_B_level = H_M_l(agents, items, level)
-    logger.info("current allocations: \n%s: %s\n%s: %s", agents[0].name(), allocations[0], agents[1].name(),
-                allocations[0])
-    if H_A_level and H_B_level and have_different_elements(H_A_level, H_B_level):
-        if H_A_level[0] != H_B_level[0]:
-            _allocations = deep_copy_2d_list(allocations)
-            _items, _allocations = allocate(items.copy(), _allocations, H_A_level[0], H_B_level[0])
-            recursive_restricted_simple(agents, _items, _allocations, end_allocation=end_allocation, level=level + 1)
-        else:
-            if len(H_A_level) > 1:
-                _allocations = deep_copy_2d_list(allocations)
-                _items, _allocations = allocate(items.copy(), _allocations, H_A_level[1], H_B_level[0])
-                recursive_restricted_simple(agents, _items, _allocations, end_allocation=end_allocation,
-                                            level=level + 1)
-            if len(H_B_level) > 1:
-                _allocations = deep_copy_2d_list(allocations)
-                _items, _allocations = allocate(items.copy(), _allocations, H_A_level[0], H_B_level[1])
-                recursive_restricted_simple(agents, _items, _allocations, end_allocation=end_allocation,
-                                            level=level + 1)
-    else:
-        recursive_restricted_simple(agents, items, allocations, end_allocation=end_allocation, level=level + 1)
-    return end_allocation
+    return list(restricted_simple_generator(agents, items))
 
 
 def singles_doubles(agents: AgentList, items: List[Any] = None) -> Dict:
@@ -228,48 +157,7 @@ def singles_doubles(agents: AgentList, items: List[Any] = None) -> Dict:
     [{'Alice': ['h', 'g', 'b', 'd', 'f'], 'George': ['j', 'i', 'a', 'c', 'e']}, {'Alice': ['h', 'g', 'b', 'd', 'e'], 'George': ['j', 'i', 'a', 'c', 'f']}, {'Alice': ['h', 'g', 'b', 'c', 'f'], 'George': ['j', 'i', 'a', 'd', 'e']}, {'Alice': ['h', 'g', 'b', 'c', 'e'], 'George': ['j', 'i', 'a', 'd', 'f']}, {'Alice': ['h', 'g', 'a', 'd', 'f'], 'George': ['j', 'i', 'b', 'c', 'e']}, {'Alice': ['h', 'g', 'a', 'd', 'e'], 'George': ['j', 'i', 'b', 'c', 'f']}, {'Alice': ['h', 'g', 'a', 'c', 'f'], 'George': ['j', 'i', 'b', 'd', 'e']}, {'Alice': ['h', 'g', 'a', 'c', 'e'], 'George': ['j', 'i', 'b', 'd', 'f']}]
      """
     logger.debug("\nAlgorithm: SD\nTwo Agents %s %s and items %s", agents[0].name(), agents[1].name(), items)
-    return singles_doubles_helper(agents, items, allocations=[[], []], end_allocation=[], do_single=True)
-
-
-def singles_doubles_helper(agents: AgentList, items: List[Any] = None, allocations=[[], []], end_allocation=[],
-                           do_single: bool = False) -> Dict:
-    """
-    A recursive helper function to singles_doubles()
-
-    :param agents A list that represent the players(agents) and for each player his valuation for each item, plus the
-    player's name.
-    :param items A list of all existing items (U).
-    :param allocations is the allocation for each player so far.
-    :param end_allocation is the end allocation for each player.
-    :param do_single is a boolean flag that indicates if the singles() algorithm should be used or not, in this function
-     it will only be used the first time the function is called.
-    """
-    if do_single:
-        A_items, B_items = get_valuation_list(agents, items)
-        singles(A_items.copy(), B_items.copy(), items, allocations)
-    if not items:
-        if is_envy_free_partial_allocation(agents, allocations):
-            end_allocation.append({agents[0].name(): allocations[0], agents[1].name(): allocations[1]})
-            return end_allocation
-        return
-    H_A_level, H_B_level = H_M_l(agents, items, len(agents[0].all_items()))
-    if H_A_level[0] != H_B_level[0]:
-        _allocations = deep_copy_2d_list(allocations)
-        _items, _allocations = allocate(items.copy(), _allocations, H_A_level[0], H_B_level[0])
-        singles_doubles_helper(agents, _items, _allocations, end_allocation)
-    temp_allocation_1 = deep_copy_2d_list(allocations)
-    temp_allocation_2 = deep_copy_2d_list(allocations)
-    if len(H_B_level) > 1:
-        items_2, temp_allocation_2 = allocate(items.copy(), temp_allocation_2, H_A_level[1], H_B_level[0])
-        singles_doubles_helper(agents, items_2, temp_allocation_2, end_allocation)
-
-    if len(H_A_level) > 1:
-        items_1, temp_allocation_1 = allocate(items.copy(), temp_allocation_1, H_A_level[0], H_B_level[1])
-        singles_doubles_helper(agents, items_1, temp_allocation_1, end_allocation)
-
-    logger.info("current allocations: \n%s: %s\n%s: %s", agents[0].name(), allocations[0], agents[1].name(),
-                allocations[0])
-    return end_allocation
+    return list(singles_doubles_generator(agents, items))
 
 
 def iterated_singles_doubles(agents: AgentList, items: List[Any] = None) -> Dict:
@@ -312,50 +200,7 @@ def iterated_singles_doubles(agents: AgentList, items: List[Any] = None) -> Dict
     [{'Alice': ['h', 'g', 'b', 'd', 'f'], 'George': ['j', 'i', 'a', 'c', 'e']}, {'Alice': ['h', 'g', 'b', 'd', 'e'], 'George': ['j', 'i', 'a', 'c', 'f']}, {'Alice': ['h', 'g', 'b', 'c', 'f'], 'George': ['j', 'i', 'a', 'd', 'e']}, {'Alice': ['h', 'g', 'b', 'c', 'e'], 'George': ['j', 'i', 'a', 'd', 'f']}, {'Alice': ['h', 'g', 'a', 'd', 'f'], 'George': ['j', 'i', 'b', 'c', 'e']}, {'Alice': ['h', 'g', 'a', 'd', 'e'], 'George': ['j', 'i', 'b', 'c', 'f']}, {'Alice': ['h', 'g', 'a', 'c', 'f'], 'George': ['j', 'i', 'b', 'd', 'e']}, {'Alice': ['h', 'g', 'a', 'c', 'e'], 'George': ['j', 'i', 'b', 'd', 'f']}]
     """
     logger.debug("\nAlgorithm: IS\nTwo Agents %s %s and items %s", agents[0].name(), agents[1].name(), items)
-    return iterated_singles_doubles_helper(agents, items, allocations=[[], []], end_allocation=[], do_single=True)
-
-
-def iterated_singles_doubles_helper(agents: AgentList, items: List[Any] = None, allocations=[[], []], end_allocation=[],
-                                    do_single: bool = False) -> Dict:
-    """
-    A recursive helper function to iterated_singles_doubles()
-
-    :param agents A list that represent the players(agents) and for each player his valuation for each item, plus the
-    player's name.
-    :param items A list of all existing items (U).
-    :param allocations is the allocation for each player so far.
-    :param end_allocation is the end allocation for each player.
-    :param do_single is a boolean flag that indicates if the singles() algorithm should be used or not, in this function
-     it will only be used the first time the function is called as many times as possible.
-    """
-    if do_single:
-        A_items, B_items = get_valuation_list(agents, items)
-        flag = True
-        while flag:
-            flag, allocations = singles(A_items.copy(), B_items.copy(), items, allocations)
-    if not items:
-        if is_envy_free_partial_allocation(agents, allocations):
-            end_allocation.append({agents[0].name(): allocations[0], agents[1].name(): allocations[1]})
-            return end_allocation
-        return
-    H_A_level, H_B_level = H_M_l(agents, items, len(agents[0].all_items()))
-    if H_A_level[0] != H_B_level[0]:
-        _allocations = deep_copy_2d_list(allocations)
-        _items, _allocations = allocate(items.copy(), _allocations, H_A_level[0], H_B_level[0])
-        iterated_singles_doubles_helper(agents, _items, _allocations, end_allocation)
-    temp_allocation_1 = deep_copy_2d_list(allocations)
-    temp_allocation_2 = deep_copy_2d_list(allocations)
-    if len(H_B_level) > 1:
-        items_2, temp_allocation_2 = allocate(items.copy(), temp_allocation_2, H_A_level[1], H_B_level[0])
-        iterated_singles_doubles_helper(agents, items_2, temp_allocation_2, end_allocation)
-
-    if len(H_A_level) > 1:
-        items_1, temp_allocation_1 = allocate(items.copy(), temp_allocation_1, H_A_level[0], H_B_level[1])
-        iterated_singles_doubles_helper(agents, items_1, temp_allocation_1, end_allocation)
-
-    logger.info("current allocations: \n%s: %s\n%s: %s", agents[0].name(), allocations[0], agents[1].name(),
-                allocations[0])
-    return end_allocation
+    return list(iterated_singles_doubles_generator(agents, items))
 
 
 def s1(agents: AgentList, items: List[Any] = None) -> Dict:
@@ -397,46 +242,7 @@ def s1(agents: AgentList, items: List[Any] = None) -> Dict:
     [{'Alice': ['h', 'g', 'b', 'd', 'f'], 'George': ['j', 'i', 'a', 'c', 'e']}, {'Alice': ['h', 'g', 'b', 'd', 'e'], 'George': ['j', 'i', 'a', 'c', 'f']}, {'Alice': ['h', 'g', 'b', 'c', 'f'], 'George': ['j', 'i', 'a', 'd', 'e']}, {'Alice': ['h', 'g', 'b', 'c', 'e'], 'George': ['j', 'i', 'a', 'd', 'f']}, {'Alice': ['h', 'g', 'a', 'd', 'f'], 'George': ['j', 'i', 'b', 'c', 'e']}, {'Alice': ['h', 'g', 'a', 'd', 'e'], 'George': ['j', 'i', 'b', 'c', 'f']}, {'Alice': ['h', 'g', 'a', 'c', 'f'], 'George': ['j', 'i', 'b', 'd', 'e']}, {'Alice': ['h', 'g', 'a', 'c', 'e'], 'George': ['j', 'i', 'b', 'd', 'f']}]
     """
     logger.debug("\nAlgorithm: S1\nTwo Agents %s %s and items %s", agents[0].name(), agents[1].name(), items)
-    return s1_helper(agents, items, allocations=[[], []], end_allocation=[], do_single=True)
-
-
-def s1_helper(agents: AgentList, items: List[Any] = None, allocations=[[], []], end_allocation=[],
-              do_single: bool = False) -> Dict:
-    """
-    A recursive helper function to s1()
-
-    :param agents A list that represent the players(agents) and for each player his valuation for each item, plus the
-    player's name.
-    :param items A list of all existing items (U).
-    :param allocations is the allocation for each player so far.
-    :param end_allocation is the end allocation for each player.
-    :param do_single is a boolean flag that indicates if the singles() algorithm should be used or not, in this function
-     it will only be used the first time the function is called.
-    """
-    if do_single:
-        A_items, B_items = get_valuation_list(agents, items)
-        singles(A_items.copy(), B_items.copy(), items, allocations)
-    if not items:
-        end_allocation.append({agents[0].name(): allocations[0], agents[1].name(): allocations[1]})
-        return end_allocation
-    H_A_level, H_B_level = H_M_l(agents, items, len(agents[0].all_items()))
-    if H_A_level[0] != H_B_level[0]:
-        _allocations = deep_copy_2d_list(allocations)
-        _items, _allocations = allocate(items.copy(), _allocations, H_A_level[0], H_B_level[0])
-        s1_helper(agents, _items, _allocations, end_allocation)
-    temp_allocation_1 = deep_copy_2d_list(allocations)
-    temp_allocation_2 = deep_copy_2d_list(allocations)
-    if len(H_B_level) > 1:
-        items_2, temp_allocation_2 = allocate(items.copy(), temp_allocation_2, H_A_level[1], H_B_level[0])
-        s1_helper(agents, items_2, temp_allocation_2, end_allocation)
-
-    if len(H_A_level) > 1:
-        items_1, temp_allocation_1 = allocate(items.copy(), temp_allocation_1, H_A_level[0], H_B_level[1])
-        s1_helper(agents, items_1, temp_allocation_1, end_allocation)
-
-    logger.info("current allocations: \n%s: %s\n%s: %s", agents[0].name(), allocations[0], agents[1].name(),
-                allocations[0])
-    return end_allocation
+    return list(s1_generator(agents, items))
 
 
 def l1(agents: AgentList, items: List[Any] = None) -> Dict:
@@ -478,48 +284,7 @@ def l1(agents: AgentList, items: List[Any] = None) -> Dict:
     [{'Alice': ['h', 'g', 'b', 'd', 'f'], 'George': ['j', 'i', 'a', 'c', 'e']}, {'Alice': ['h', 'g', 'b', 'd', 'e'], 'George': ['j', 'i', 'a', 'c', 'f']}, {'Alice': ['h', 'g', 'b', 'c', 'f'], 'George': ['j', 'i', 'a', 'd', 'e']}, {'Alice': ['h', 'g', 'b', 'c', 'e'], 'George': ['j', 'i', 'a', 'd', 'f']}, {'Alice': ['h', 'g', 'a', 'd', 'f'], 'George': ['j', 'i', 'b', 'c', 'e']}, {'Alice': ['h', 'g', 'a', 'd', 'e'], 'George': ['j', 'i', 'b', 'c', 'f']}, {'Alice': ['h', 'g', 'a', 'c', 'f'], 'George': ['j', 'i', 'b', 'd', 'e']}, {'Alice': ['h', 'g', 'a', 'c', 'e'], 'George': ['j', 'i', 'b', 'd', 'f']}]
     """
     logger.debug("\nAlgorithm: L1\nTwo Agents %s %s and items %s", agents[0].name(), agents[1].name(), items)
-    return l1_helper(agents, items, allocations=[[], []], end_allocation=[], do_single=True)
-
-
-def l1_helper(agents: AgentList, items: List[Any] = None, allocations=[[], []], end_allocation=[],
-              do_single: bool = False) -> Dict:
-    """
-     A recursive helper function to l1()
-
-     :param agents A list that represent the players(agents) and for each player his valuation for each item, plus the
-     player's name.
-     :param items A list of all existing items (U).
-     :param allocations is the allocation for each player so far.
-     :param end_allocation is the end allocation for each player.
-     :param do_single is a boolean flag that indicates if the singles() algorithm should be used or not,
-     in this function it will only be used the first time the function is called as many times as possible.
-     """
-    if do_single:
-        A_items, B_items = get_valuation_list(agents, items)
-        flag = True
-        while flag:
-            flag, allocations = singles(A_items.copy(), B_items.copy(), items, allocations)
-    if not items:
-        end_allocation.append({agents[0].name(): allocations[0], agents[1].name(): allocations[1]})
-        return end_allocation
-    H_A_level, H_B_level = H_M_l(agents, items, len(agents[0].all_items()))
-    if H_A_level[0] != H_B_level[0]:
-        _allocations = deep_copy_2d_list(allocations)
-        _items, _allocations = allocate(items.copy(), _allocations, H_A_level[0], H_B_level[0])
-        s1_helper(agents, _items, _allocations, end_allocation)
-    temp_allocation_1 = deep_copy_2d_list(allocations)
-    temp_allocation_2 = deep_copy_2d_list(allocations)
-    if len(H_B_level) > 1:
-        items_2, temp_allocation_2 = allocate(items.copy(), temp_allocation_2, H_A_level[1], H_B_level[0])
-        s1_helper(agents, items_2, temp_allocation_2, end_allocation)
-
-    if len(H_A_level) > 1:
-        items_1, temp_allocation_1 = allocate(items.copy(), temp_allocation_1, H_A_level[0], H_B_level[1])
-        s1_helper(agents, items_1, temp_allocation_1, end_allocation)
-    logger.info("current allocations: \n%s: %s\n%s: %s", agents[0].name(), allocations[0], agents[1].name(),
-                allocations[0])
-
-    return end_allocation
+    return list(l1_generator(agents, items))
 
 
 def top_down(agents: AgentList, items: List[Any] = None) -> Dict:
@@ -871,7 +636,222 @@ def trump(agents: AgentList, items: List[Any] = None) -> Dict:
     return end_allocation
 
 
-# recursive_sequential.logger = logger
+#### LAZY VARIANTS
+# The following generators enumerate the same allocations as the recursive algorithms above, in the same order.
+# The search keeps one allocation and one PreferenceIndex of the remaining items, and backtracks by undoing each allocation step,
+# instead of copying them at every node. Allocations are yielded as soon as they are found.
+
+
+MEMO_MAX_COMPLETIONS = 1000  # subtrees with more completions than this are not memoized, so that the memo stays small.
+
+
+def sequential_generator(agents: AgentList, items: List[Any] = None, limit: int = None, predicate=None):
+    """
+    A lazy variant of sequential(): yields the allocations one at a time.
+
+    :param agents A list that represent the players(agents) and for each player his valuation for each item, plus the
+    player's name.
+    :param items A list of all existing items (U).
+    :param limit [optional] the maximum number of allocations to yield.
+    :param predicate [optional] a function (agents, bundles) -> bool; only allocations for which it returns True are yielded.
+    For example, predicate=is_envy_free_partial_allocation, limit=1 yields only the first envy-free allocation.
+
+    >>> Alice = fairpy.agents.AdditiveAgent({'computer': 1, 'phone': 2, 'tv': 3, 'book': 4}, name = 'Alice')
+    >>> George = fairpy.agents.AdditiveAgent({'computer': 4, 'phone': 2, 'tv': 3, 'book': 1}, name = 'George')
+    >>> list(sequential_generator([Alice, George], ['computer', 'phone', 'tv', 'book']))
+    [{'Alice': ['computer', 'phone'], 'George': ['book', 'tv']}, {'Alice': ['computer', 'tv'], 'George': ['book', 'phone']}]
+    >>> list(sequential_generator([Alice, George], ['computer', 'phone', 'tv', 'book'], limit=1))
+    [{'Alice': ['computer', 'phone'], 'George': ['book', 'tv']}]
+    >>> next(sequential_generator([Alice, George], ['computer', 'phone', 'tv', 'book'], predicate=is_envy_free_partial_allocation))
+    {'Alice': ['computer', 'phone'], 'George': ['book', 'tv']}
+    """
+    completions = _generate_completions(PreferenceIndex(agents, items), [[], []], 1, _sequential_branches, level_in_key=True, memo={})
+    return _filter_allocations(agents, completions, limit, predicate)
+
+
+def restricted_simple_generator(agents: AgentList, items: List[Any] = None, limit: int = None, predicate=None):
+    """
+    A lazy variant of restricted_simple(). The parameters are as in sequential_generator().
+
+    >>> Alice = fairpy.agents.AdditiveAgent({'computer': 1, 'phone': 2, 'tv': 3, 'book': 4}, name = 'Alice')
+    >>> George = fairpy.agents.AdditiveAgent({'computer': 4, 'phone': 2, 'tv': 3, 'book': 1}, name = 'George')
+    >>> list(restricted_simple_generator([Alice, George], ['computer', 'phone', 'tv', 'book']))
+    [{'Alice': ['computer', 'tv'], 'George': ['book', 'phone']}, {'Alice': ['computer', 'phone'], 'George': ['book', 'tv']}]
+    """
+    completions = _generate_completions(PreferenceIndex(agents, items), [[], []], 1, _restricted_simple_branches, level_in_key=True, memo={})
+    return _filter_allocations(agents, completions, limit, predicate)
+
+
+def singles_doubles_generator(agents: AgentList, items: List[Any] = None, limit: int = None, predicate=None):
+    """
+    A lazy variant of singles_doubles(). The parameters are as in sequential_generator().
+
+    >>> Alice = fairpy.agents.AdditiveAgent({'computer': 1, 'phone': 2, 'tv': 3, 'book': 4}, name = 'Alice')
+    >>> George = fairpy.agents.AdditiveAgent({'computer': 4, 'phone': 2, 'tv': 3, 'book': 1}, name = 'George')
+    >>> list(singles_doubles_generator([Alice, George], ['computer', 'phone', 'tv', 'book'], limit=1))
+    [{'Alice': ['computer', 'tv'], 'George': ['book', 'phone']}]
+    """
+    return _singles_doubles_generator(agents, items, iterate_singles=False, envy_free_only=True, limit=limit, predicate=predicate)
+
+
+def iterated_singles_doubles_generator(agents: AgentList, items: List[Any] = None, limit: int = None, predicate=None):
+    """
+    A lazy variant of iterated_singles_doubles(). The parameters are as in sequential_generator().
+    """
+    return _singles_doubles_generator(agents, items, iterate_singles=True, envy_free_only=True, limit=limit, predicate=predicate)
+
+
+def s1_generator(agents: AgentList, items: List[Any] = None, limit: int = None, predicate=None):
+    """
+    A lazy variant of s1(). The parameters are as in sequential_generator().
+    """
+    return _singles_doubles_generator(agents, items, iterate_singles=False, envy_free_only=False, limit=limit, predicate=predicate)
+
+
+def l1_generator(agents: AgentList, items: List[Any] = None, limit: int = None, predicate=None):
+    """
+    A lazy variant of l1(). The parameters are as in sequential_generator().
+    """
+    return _singles_doubles_generator(agents, items, iterate_singles=True, envy_free_only=False, limit=limit, predicate=predicate)
+
+
+def _singles_doubles_generator(agents: AgentList, items: List[Any], iterate_singles: bool, envy_free_only: bool, limit: int, predicate):
+    """
+    SD, IS, S1 and L1 differ only in how many times singles() is applied at the start,
+    and in whether the final allocations must be envy-free.
+    """
+    items = list(items)
+    allocations = [[], []]
+    A_items, B_items = get_valuation_list(agents, items)
+    flag = True
+    while flag:
+        flag, allocations = singles(A_items.copy(), B_items.copy(), items, allocations)
+        flag = flag and iterate_singles
+    completions = _generate_completions(PreferenceIndex(agents, items), allocations, len(agents[0].all_items()), _singles_doubles_branches, level_in_key=False, memo={})
+    if envy_free_only:
+        completions = (bundles for bundles in completions if is_envy_free_partial_allocation(agents, bundles))
+    return _filter_allocations(agents, completions, limit, predicate)
+
+
+def _sequential_branches(index: PreferenceIndex, level: int) -> list:
+    """
+    Returns the (A item, B item) pairs that OS allocates at the given level.
+    The pair (None, None) means that nothing is allocated at this level.
+    """
+    H_A_level, H_B_level = index.H_M_l(level)
+    if H_A_level and H_B_level and have_different_elements(H_A_level, H_B_level):
+        return [(i, j) for i in H_A_level for j in H_B_level if i != j]
+    return [(None, None)]
+
+
+def _restricted_simple_branches(index: PreferenceIndex, level: int) -> list:
+    """
+    Returns the (A item, B item) pairs that RS allocates at the given level.
+    """
+    H_A_level, H_B_level = index.H_M_l(level)
+    if H_A_level and H_B_level and have_different_elements(H_A_level, H_B_level):
+        if H_A_level[0] != H_B_level[0]:
+            return [(H_A_level[0], H_B_level[0])]
+        branches = []
+        if len(H_A_level) > 1:
+            branches.append((H_A_level[1], H_B_level[0]))
+        if len(H_B_level) > 1:
+            branches.append((H_A_level[0], H_B_level[1]))
+        return branches
+    return [(None, None)]
+
+
+def _singles_doubles_branches(index: PreferenceIndex, level: int) -> list:
+    """
+    Returns the (A item, B item) pairs that the recursion of SD, IS, S1 and L1 allocates; the level is always the number of items.
+    Only the two best remaining items of each agent are needed, so only they are extracted from the index.
+    """
+    H_A_level, H_B_level = index.first_items(0, level, count=2), index.first_items(1, level, count=2)
+    branches = []
+    if H_A_level[0] != H_B_level[0]:
+        branches.append((H_A_level[0], H_B_level[0]))
+    if len(H_B_level) > 1:
+        branches.append((H_A_level[1], H_B_level[0]))
+    if len(H_A_level) > 1:
+        branches.append((H_A_level[0], H_B_level[1]))
+    return branches
+
+
+def _generate_completions(index: PreferenceIndex, allocations: List[List], level: int, branches, level_in_key: bool, memo: dict):
+    """
+    Yields all the complete allocations in the search tree below the current node, as pairs of bundles.
+    The node is given by the remaining items, the current allocations and the level;
+    it is restored before returning, so that the caller can continue with its next branch.
+
+    :param index the remaining items; it is updated in place by _push() and _pop().
+    :param branches a function (index, level) -> list of (A item, B item) pairs.
+    :param level_in_key whether the branches depend on the level; if not, the level is left out of the memo key.
+    :param memo maps (remaining items, level) to the list of bundle suffixes that complete the allocation.
+    """
+    if not index:
+        yield [allocations[0].copy(), allocations[1].copy()]
+        return
+    key = (index.key(), level if level_in_key else None)
+    if key in memo:
+        for A_suffix, B_suffix in memo[key]:
+            yield [allocations[0] + A_suffix, allocations[1] + B_suffix]
+        return
+    A_start, B_start = len(allocations[0]), len(allocations[1])
+    completions = []
+    for a_item, b_item in branches(index, level):
+        removed_items = _push(index, allocations, a_item, b_item)
+        for bundles in _generate_completions(index, allocations, level + 1, branches, level_in_key, memo):
+            if completions is not None:
+                completions.append((bundles[0][A_start:], bundles[1][B_start:]))
+                if len(completions) > MEMO_MAX_COMPLETIONS:
+                    completions = None
+            yield bundles
+        _pop(index, allocations, a_item, b_item, removed_items)
+    if completions is not None:
+        memo[key] = completions
+
+
+def _push(index: PreferenceIndex, allocations: List[List], a_item=None, b_item=None) -> list:
+    """
+    Like allocate(), but on a PreferenceIndex. Returns the items that were removed, for _pop().
+    """
+    removed_items = []
+    for bundle, item in ((allocations[0], a_item), (allocations[1], b_item)):
+        if item:
+            bundle.append(item)
+            if item in index:
+                index.remove(item)
+                removed_items.append(item)
+    return removed_items
+
+
+def _pop(index: PreferenceIndex, allocations: List[List], a_item, b_item, removed_items: list):
+    """
+    Undoes _push().
+    """
+    if b_item:
+        allocations[1].pop()
+    if a_item:
+        allocations[0].pop()
+    for item in removed_items:
+        index.add(item)
+
+
+def _filter_allocations(agents: AgentList, completions, limit: int, predicate):
+    """
+    Converts pairs of bundles to allocation dicts, and stops after the first 'limit' ones that satisfy the predicate.
+    """
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    for bundles in completions:
+        if predicate is not None and not predicate(agents, bundles):
+            continue
+        yield {agents[0].name(): bundles[0], agents[1].name(): bundles[1]}
+        count += 1
+        if limit is not None and count >= limit:
+            return
+
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ By: D. Marc Kilgour, Rudolf Vetschera
 programmers: Itay Hasidi & Amichai Bitan
 """
 import logging
+from bisect import bisect_left, bisect_right
 from typing import List, Any, Dict
 from fairpy import fairpy
 from fairpy.agentlist import AgentList, AdditiveAgent
@@ -15,6 +16,100 @@ from fairpy.agentlist import AgentList, AdditiveAgent
 logger = logging.getLogger(__name__)
 
 
+class PreferenceIndex:
+    """
+    A compact index of the preferences of two agents, for the recursive algorithms.
+    In these algorithms, agent.value(item) is the rank of the item (1 = the best item).
+
+    For each agent, the items are numbered by their position in agent.all_items(), and the remaining items are kept as a bitmask.
+    For each distinct rank r, a precomputed bitmask holds the items with rank at most r; a level is looked up among these ranks by binary search.
+    So the remaining items up to level l are found with a single 'and', and removing or restoring an item takes O(1).
+
+    >>> Alice = AdditiveAgent({'computer': 1, 'phone': 2, 'tv': 3, 'book': 4}, name = 'Alice')
+    >>> George = AdditiveAgent({'computer': 4, 'phone': 2, 'tv': 3, 'book': 1}, name = 'George')
+    >>> index = PreferenceIndex([Alice, George], ['computer', 'phone', 'tv', 'book'])
+    >>> index.H_M_l(2)
+    [['computer', 'phone'], ['phone', 'book']]
+    >>> index.remove('phone')
+    >>> index.H_M_l(2), len(index), 'phone' in index
+    ([['computer'], ['book']], 3, False)
+    >>> index.first_items(0, 4, count=2), index.first_items(1, 4, count=2)
+    (['computer', 'tv'], ['computer', 'tv'])
+    >>> index.add('phone')
+    >>> index.H_M_l(2)
+    [['computer', 'phone'], ['phone', 'book']]
+    """
+
+    def __init__(self, agents: AgentList, items: List[Any]):
+        self.agents = agents
+        self.items_of_agent = [list(agent.all_items()) for agent in agents]
+        self.bit_of_item = [{item: 1 << position for position, item in enumerate(agent_items)} for agent_items in self.items_of_agent]
+        self.levels = []        # levels[a] = the distinct ranks of agent a, in increasing order.
+        self.level_masks = []   # level_masks[a][k] = the items with rank at most levels[a][k].
+        for agent, agent_items in zip(agents, self.items_of_agent):
+            ranks = [agent.value(item) for item in agent_items]
+            levels = sorted(set(ranks))
+            masks = [0] * len(levels)
+            for position, rank in enumerate(ranks):
+                masks[bisect_left(levels, rank)] |= 1 << position
+            for k in range(1, len(masks)):
+                masks[k] |= masks[k - 1]
+            self.levels.append(levels)
+            self.level_masks.append(masks)
+        self.remaining = [0] * len(agents)
+        self.num_of_remaining = 0
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return self.num_of_remaining
+
+    def __contains__(self, item):
+        bit = self.bit_of_item[0].get(item)
+        return bit is not None and (self.remaining[0] & bit) != 0
+
+    def key(self) -> int:
+        """
+        Returns a hashable key of the set of remaining items.
+        """
+        return self.remaining[0]
+
+    def add(self, item):
+        if item in self:
+            return
+        for a, bits in enumerate(self.bit_of_item):
+            self.remaining[a] |= bits[item]
+        self.num_of_remaining += 1
+
+    def remove(self, item):
+        if item not in self:
+            return
+        for a, bits in enumerate(self.bit_of_item):
+            self.remaining[a] &= ~bits[item]
+        self.num_of_remaining -= 1
+
+    def first_items(self, agent_index: int, level: int, count: int = None) -> list:
+        """
+        Returns the remaining items with rank at most the level, in the order of agents[agent_index].all_items().
+        If count is given, only the first count such items are returned.
+        """
+        k = bisect_right(self.levels[agent_index], level) - 1
+        mask = self.remaining[agent_index] & self.level_masks[agent_index][k] if k >= 0 else 0
+        agent_items = self.items_of_agent[agent_index]
+        result = []
+        while mask and (count is None or len(result) < count):
+            lowest_bit = mask & -mask
+            result.append(agent_items[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return result
+
+    def H_M_l(self, level: int = 1) -> list:
+        """
+        Like the function H_M_l below, for the remaining items.
+        """
+        return [self.first_items(a, level) for a in range(len(self.agents))]
+
+
 def find_last_item(agent, item_list):
     """
     Returns the last item a player wants in the given list.
@@ -146,14 +241,8 @@ def H_M_l(agents: AgentList, items: List[Any] = None, level: int = 1):
     >>> H_M_l([Alice, George], ['computer', 'phone', 'tv', 'book'], 2)
     [['computer', 'phone'], ['phone', 'book']]
     """
-    desired_items = []
-    for player in agents:
-        player_items = []
-        for item in player.all_items():
-            if player.value(item) <= level and item in items:
-                player_items.append(item)
-        desired_items.append(player_items)
-    return desired_items
+    items = set(items)
+    return [[item for item in player.all_items() if item in items and player.value(item) <= level] for player in agents]
 
 
 def have_different_elements(items_A: List[Any], items_B: List[Any]):
@@ -280,11 +369,10 @@ def sorted_valuations(agents: AgentList, items: List[Any]):
     """
     sorted_lst = [[], []]
     for agent in range(len(agents)):
-        for i in range(1, len(items) + 1):
-            for item in items:
-                if agents[agent].value(item) == i:
-                    sorted_lst[agent].append(item)
-                    break
+        map_rank_to_item = {}
+        for item in items:
+            map_rank_to_item.setdefault(agents[agent].value(item), item)   # the first item with each rank, as in a linear search.
+        sorted_lst[agent] = [map_rank_to_item[i] for i in range(1, len(items) + 1) if i in map_rank_to_item]
     return sorted_lst
 
 
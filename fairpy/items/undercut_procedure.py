@@ -14,6 +14,7 @@ The undercut procedure is a procedure for fair item assignment between *two* peo
 from fairpy import AgentList
 
 from typing import List, Any
+import numpy as np
 import logging
 logger = logging.getLogger(__name__)
 
@@ -73,34 +74,168 @@ def undercut(agents:AgentList, items: List[Any]=None) -> List[List[Any]]:
     if num_of_items==1:
         return one_item(agents, items)
     
-    logger.info("Stage 1 - find a almost equal cut")    
-    for group_ in all_combinations(items, num_agents):
-        values_for_alice_and_bob={0:0,1:0} #initialize values to 0 for both agents
-        for agent_num, subgroup_ in enumerate(group_):
-            values_for_alice_and_bob[agent_num]=agents[agent_num].value(subgroup_) #calculate the values of the two agents for this particular combination
-        items_for_alice=group_[0]
-        items_for_bob=group_[1]
-        num_of_items_for_alice=len(items_for_alice)
-        num_of_items_for_bob=len(items_for_bob)
-        counter_alice=counter_bob=0
-        alice_val_for_bob_items=agents[0].value(items_for_bob)  #calculating Alice's value for Bob's items
-        bob_val_for_alice_items=agents[1].value(items_for_alice)  #calculating Bob's value for Alice's items
-        if values_for_alice_and_bob[0]>=alice_val_for_bob_items: #if Alice weakly prefers X to Y
-            for item_ in items_for_alice: #and if any single item is moved from X to Y
-                if values_for_alice_and_bob[0]-agents[0].value(item_)>=alice_val_for_bob_items+agents[0].value(item_): #then Alice strictly prefers Y to X
-                     break
-                counter_alice+=1
-            if counter_alice==num_of_items_for_alice: #this is an almost equal cut for Alice
-                result= almost_equal_cut(group_,0,agents,values_for_alice_and_bob,bob_val_for_alice_items,alice_val_for_bob_items)                               
-        else:
-            if values_for_alice_and_bob[1]>=bob_val_for_alice_items: #George weakly prefers Y to X
-                for item_ in items_for_bob: #and if any single item is moved from Y to X
-                    if values_for_alice_and_bob[1]-agents[1].value(item_)>=bob_val_for_alice_items+agents[1].value(item_):  #then George strictly prefers X to Y
-                        break
-                    counter_bob+=1 
-                if counter_alice==num_of_items_for_bob:  #this is an almost equal cut for George
-                    result= almost_equal_cut(group_,1,agents,values_for_alice_and_bob,bob_val_for_alice_items,alice_val_for_bob_items)      
-    return result #if we went through all the possible combinations then there is no envy-free division
+    logger.info("Stage 1 - find a almost equal cut")
+    items_for_alice = last_almost_equal_cut(agents[0], items)
+    if items_for_alice is None:
+        return "There is no envy-free division"
+    alice_items_set = set(items_for_alice)
+    items_for_bob = tuple(item for item in items if item not in alice_items_set)
+    group_ = [items_for_alice, items_for_bob]
+    values_for_alice_and_bob = {0: agents[0].value(items_for_alice), 1: agents[1].value(items_for_bob)}
+    alice_val_for_bob_items = agents[0].value(items_for_bob)  #calculating Alice's value for Bob's items
+    bob_val_for_alice_items = agents[1].value(items_for_alice)  #calculating Bob's value for Alice's items
+    return almost_equal_cut(group_,0,agents,values_for_alice_and_bob,bob_val_for_alice_items,alice_val_for_bob_items)
+
+
+def last_almost_equal_cut(agent, items: List[Any]) -> tuple:
+    """
+    Finds the last 2-partition (X,Y), in the order of all_combinations(items, 2), that is an almost-equal cut for the agent:
+    the agent weakly prefers X to Y, and strictly prefers Y to X if any single item is moved from X to Y.
+    In all_combinations, X is the smaller part, so the partitions are ordered by the size of X, and then by X itself.
+
+    X is an almost-equal cut iff  0 <= value(X)-value(Y) < 2*value(x) for every x in X,
+    i.e., iff for some threshold z, all items of X are worth at least z, and  total <= 2*value(X) < total + 2*z.
+    For each size and threshold, X is built item by item, from the last one in the order backwards;
+    an item is added only if some completion has its value in the window, which is checked exactly by _SubsetSums.
+    So the search never backtracks, and its time is polynomial in the number of items times 2^(m/2), instead of 2^m.
+
+    :return: the tuple X, with the items in their original order; or None if there is no almost-equal cut.
+
+    >>> import fairpy
+    >>> Alice = fairpy.agents.AdditiveAgent({"a": 7, "b": 4, "c": 3, "d":2}, name="Alice")
+    >>> last_almost_equal_cut(Alice, ['a','b','c','d'])
+    ('a', 'd')
+    >>> Alice = fairpy.agents.AdditiveAgent({"a": 1, "b": 1, "c": 1}, name="Alice")
+    >>> print(last_almost_equal_cut(Alice, ['a','b','c']))
+    None
+    >>> Alice = fairpy.agents.AdditiveAgent({"b": 2, "a": 1, "c": 1, "d": 2}, name="Alice")
+    >>> last_almost_equal_cut(Alice, ['b','a','c','d'])   # ('a','d') is a cut too, but it comes before ('b','a') in all_combinations.
+    ('b', 'a')
+    """
+    num_of_items = len(items)
+    values = [agent.value(item) for item in items]
+    doubled_values = [2*value for value in values]
+    total_value = sum(values)
+    # the positions after each position, in descending order of their items - the order in which X is built.
+    positions_from = [sorted(range(start, num_of_items), key=lambda position: items[position], reverse=True) for start in range(num_of_items+1)]
+    subset_sums = {}   # maps each threshold to the subset sums of the items that are worth at least the threshold.
+
+    def last_cut(size:int, threshold) -> tuple:
+        if threshold not in subset_sums:
+            subset_sums[threshold] = _SubsetSums([2*value if value >= threshold else None for value in values])
+        sums = subset_sums[threshold]
+        low, high = total_value, total_value + 2*threshold    # the window for 2*value(X).
+        if not sums.exists(0, size, low, high):
+            return None
+        # In all_combinations, the smaller of two equal-sized parts comes first; since the items are distinct,
+        # X comes first iff its first item is smaller than the first item of Y. One of them is items[0].
+        tie = (2*size == num_of_items)
+
+        def can_complete(start:int, count:int, value, prefix_of_all:bool) -> bool:
+            # prefix_of_all: X contains all positions before start, so the first position not in X, that must be larger than items[0], is yet to come.
+            if not prefix_of_all:
+                return sums.exists(start, count, low-value, high-value)
+            for gap in range(start, num_of_items):
+                if gap-start > count:
+                    break
+                if items[gap] > items[0] and sums.exists(gap+1, count-(gap-start), low-value, high-value):
+                    return True
+                if not sums.is_allowed(gap):
+                    break
+                value += doubled_values[gap]
+            return False
+
+        chosen, value, prefix_of_all = [], 0, False
+        for remaining in range(size, 0, -1):
+            start = chosen[-1]+1 if chosen else 0
+            for position in positions_from[start]:
+                if not sums.is_allowed(position):
+                    continue
+                new_prefix_of_all = False
+                if tie:
+                    if not chosen:
+                        if position > 0 and not items[position] < items[0]:
+                            continue   # then Y, that starts with the first item, would come before X.
+                        new_prefix_of_all = (position == 0)
+                    elif prefix_of_all:
+                        if position > start and not items[start] > items[0]:
+                            continue   # then Y, that starts with items[start], would come before X.
+                        new_prefix_of_all = (position == start)
+                if can_complete(position+1, remaining-1, value+doubled_values[position], new_prefix_of_all):
+                    chosen.append(position)
+                    value += doubled_values[position]
+                    prefix_of_all = new_prefix_of_all
+                    break
+            else:
+                return None
+        return tuple(items[position] for position in chosen)
+
+    thresholds = sorted({value for value in values if value > 0})
+    for size in range(num_of_items//2, 0, -1):
+        cuts = [cut for cut in (last_cut(size, threshold) for threshold in thresholds) if cut is not None]
+        if cuts:
+            result = max(cuts)
+            logger.info("\t%s is the last almost-equal cut for %s", result, agent.name())
+            return result
+    return None
+
+
+class _SubsetSums:
+    """
+    Answers the queries "is there a subset of 'count' allowed items, all in positions >= start, whose sum is in [low,high)?" exactly,
+    by meeting in the middle: for every start, the sums of the subsets of each half are precomputed and sorted by the subset size.
+
+    >>> sums = _SubsetSums([5, 3, None, 2])
+    >>> sums.exists(0, 2, 7, 8), sums.exists(0, 2, 6, 7), sums.exists(1, 2, 5, 6), sums.exists(2, 1, 2, 3)
+    (True, False, True, True)
+    """
+    def __init__(self, values:list):
+        self.values = values
+        self.num_of_items = len(values)
+        self.middle = self.num_of_items//2
+        allowed_values = [value for value in values if value is not None]
+        dtype = np.array(allowed_values+[0]).dtype
+        if dtype.kind in "iu" and sum(abs(value) for value in allowed_values) >= 2**62:
+            dtype = np.dtype(object)   # the sums might overflow - use python integers.
+        # left_sums_from[start][count] / right_sums_from[start][count] = the sorted sums of the subsets of that size,
+        # of the allowed items from start until the end of the left half / right half.
+        self.left_sums_from = self._sums_from(0, self.middle, dtype)
+        self.right_sums_from = self._sums_from(self.middle, self.num_of_items, dtype)
+
+    def _sums_from(self, first:int, end:int, dtype) -> dict:
+        sums = [np.zeros(1, dtype=dtype)]
+        sums_from = {end: sums}
+        for start in range(end-1, first-1, -1):
+            value = self.values[start]
+            if value is not None:
+                empty = sums[0][:0]
+                sums = [np.sort(np.concatenate([sums[count] if count < len(sums) else empty, sums[count-1]+value if count > 0 else empty]))
+                        for count in range(len(sums)+1)]
+            sums_from[start] = sums
+        return sums_from
+
+    def is_allowed(self, position:int) -> bool:
+        return self.values[position] is not None
+
+    def exists(self, start:int, count:int, low, high) -> bool:
+        if count < 0:
+            return False
+        if start >= self.middle:
+            sums = self.right_sums_from[start]
+            return count < len(sums) and _exists_in_range(sums[count], low, high)
+        left_sums, right_sums = self.left_sums_from[start], self.right_sums_from[self.middle]
+        for left_count in range(max(0, count-len(right_sums)+1), min(count, len(left_sums)-1)+1):
+            left, right = left_sums[left_count], right_sums[count-left_count]
+            indices = np.searchsorted(right, low-left, side="left")
+            inside = indices < len(right)
+            if np.any(right[indices[inside]] + left[inside] < high):   # right[indices] is the smallest right sum with left+right >= low.
+                return True
+        return False
+
+
+def _exists_in_range(sorted_array:np.ndarray, low, high) -> bool:
+    index = np.searchsorted(sorted_array, low, side="left")
+    return bool(index < len(sorted_array) and sorted_array[index] < high)
 
 
 def almost_equal_cut(group_,agent_num, agents,values,bob_val_for_alice_items,alice_val_for_bob_items) -> List[List[Any]]:
@@ -194,12 +329,13 @@ def search_subgroup(agents,agent_num,items_for_alice,items_for_bob,val1,val2,val
     result="There is no envy-free division"
     temp,temp2 = [], [] 
     logger.info("{} rejects the offer because he has more benefit from {} than {}".format(agent_num,items_for_alice,items_for_bob))
-    for item_ in items_for_alice: # check if there exists an item x in X such that: 
+    for item_ in reversed(items_for_alice): # check if there exists an item x in X such that (the last one is reported): 
         if val1-agents[1].value(item_)>=value+agents[1].value(item_):  # agent1 prefers X \ x to Y U x
             temp = sorted(set(items_for_alice) - set([item_]))  #agent1 reports X \ x
             temp2 = sorted(set(items_for_bob).union(set([item_])))  #agent2 prefers Y U x to X \ x (Since (X,Y) is an almost-equal-cut for agent2).
             result = [temp2,temp]
             logger.info(result) 
+            break
     return result      
 
 def one_item(agents: AgentList, items: List[Any]) -> List[List[Any]]:
@@ -15,7 +15,7 @@ Since : 2021-04
 from typing import *
 from fairpy import AgentList
 from fairpy.items.graph_utils import instance_to_graph, matching_to_allocation
-import networkx
+from fairpy.matching import max_weight_matching
 
 import logging
 logger = logging.getLogger(__name__)
@@ -26,13 +26,15 @@ def utilitarian_matching(
     agent_weights: Dict[str, int]=None, 
     item_capacities: Dict[str,int]=None, 
     agent_capacities: Dict[str,int]=None, 
-    maxcardinality=True)->Dict[str,str]:
+    maxcardinality=True,
+    backend:str="auto")->Dict[str,str]:
     """
     Finds a maximum-weight matching with the given preferences, agent_weights and capacities.
     :param agents: maps each agent to a map from an item's name to its value for the agent.
     :param agent_weights [optional]: maps each agent to an integer priority. The weights of each agent are multiplied by WEIGHT_BASE^priority.
     :param item_capacities [optional]: maps each item to its number of units. Default is 1.
     :param maxcardinality: True to require maximum weight subject to maximum cardinality. False to require only maximum weight.
+    :param backend: the backend of fairpy.matching.max_weight_matching (it may affect which of several optimal matchings is returned).
 
     >>> from dicttools import stringify
     >>> prefs = AgentList({"avi": {"x":5, "y": 4}, "beni": {"x":2, "y":3}})
@@ -63,7 +65,7 @@ def utilitarian_matching(
     assert isinstance(agents, AgentList)
     graph = instance_to_graph(agents, agent_weights=agent_weights, item_capacities=item_capacities, agent_capacities=agent_capacities)
     logger.info("Graph edges: %s", list(graph.edges.data()))
-    matching = networkx.max_weight_matching(graph, maxcardinality=maxcardinality)
+    matching = max_weight_matching(graph, maxcardinality=maxcardinality, backend=backend)
     logger.info("Matching: %s", matching)
     map_agent_name_to_bundle = matching_to_allocation(matching, agent_names=agents.agent_names())
     return map_agent_name_to_bundle
@@ -0,0 +1,144 @@
+#!python3
+
+"""
+Maximum-weight matchings in bipartite graphs.
+
+Many algorithms in fairpy find a maximum-weight matching between agents and items (or pieces, or bundles).
+networkx.max_weight_matching runs the general-graph blossom algorithm in pure Python;
+for a bipartite graph, the same matching is an assignment problem,
+which scipy.optimize.linear_sum_assignment solves much faster.
+
+Programmer: Erel Segal-Halevi
+Since: 2026-10
+"""
+
+import networkx, numpy as np
+from scipy import sparse
+from scipy.optimize import linear_sum_assignment
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def max_weight_bipartite_matching(weights, maxcardinality:bool=False, row_capacities=None, column_capacities=None)->list:
+    """
+    Finds a maximum-weight matching in a bipartite graph given by its weight matrix.
+
+    :param weights: a 2-dimensional array, or a scipy.sparse matrix; weights[i,j] is the weight of the edge between row i and column j.
+       In an array, an entry of -inf means that there is no edge. In a sparse matrix, only the stored entries are edges.
+    :param maxcardinality: True to require maximum weight subject to maximum cardinality. False to require only maximum weight.
+    :param row_capacities [optional]: the number of edges each row can be matched with. Default is 1.
+    :param column_capacities [optional]: the number of edges each column can be matched with. Default is 1.
+    :return: a sorted list of the matched (row, column) pairs. With capacities, a pair may appear several times.
+
+    >>> max_weight_bipartite_matching([[5,4],[2,3]])
+    [(0, 0), (1, 1)]
+    >>> max_weight_bipartite_matching([[5,-2],[2,-3]])
+    [(0, 0)]
+    >>> max_weight_bipartite_matching([[5,-2],[2,-3]], maxcardinality=True)
+    [(0, 0), (1, 1)]
+    >>> max_weight_bipartite_matching([[5,4],[2,-np.inf]], maxcardinality=True)
+    [(0, 1), (1, 0)]
+    >>> max_weight_bipartite_matching(sparse.csr_matrix([[5,0],[2,0]]), maxcardinality=True)
+    [(0, 0)]
+    >>> max_weight_bipartite_matching([[5,4,3],[2,3,1]], row_capacities=[2,1])
+    [(0, 0), (0, 2), (1, 1)]
+    >>> max_weight_bipartite_matching([[5,4],[2,3],[3,2]], column_capacities=[2,2])
+    [(0, 0), (1, 1), (2, 0)]
+    """
+    if sparse.issparse(weights):
+        edges = weights.tocoo()
+        num_of_rows, num_of_columns = edges.shape
+        weight_matrix = np.full(edges.shape, -np.inf)
+        weight_matrix[edges.row, edges.col] = edges.data
+    else:
+        weight_matrix = np.array(weights, dtype=float, ndmin=2)
+        num_of_rows, num_of_columns = weight_matrix.shape
+    row_of_clone = np.arange(num_of_rows) if row_capacities is None else np.repeat(np.arange(num_of_rows), row_capacities)
+    column_of_clone = np.arange(num_of_columns) if column_capacities is None else np.repeat(np.arange(num_of_columns), column_capacities)
+    weight_matrix = weight_matrix[np.ix_(row_of_clone, column_of_clone)]
+
+    is_edge = weight_matrix > -np.inf
+    if not maxcardinality:
+        is_edge &= weight_matrix > 0     # non-positive edges never increase the weight.
+    if not is_edge.any():
+        return []
+    if maxcardinality:
+        # An offset larger than the weight difference between any two matchings makes each additional edge worth more than any weight gain.
+        offset = 2 * min(weight_matrix.shape) * np.abs(weight_matrix[is_edge]).max() + 1
+        cost_matrix = np.where(is_edge, weight_matrix + offset, 0)
+    else:
+        cost_matrix = np.where(is_edge, weight_matrix, 0)
+    rows, columns = linear_sum_assignment(cost_matrix, maximize=True)
+    matched = is_edge[rows, columns]
+    return sorted(zip(row_of_clone[rows[matched]].tolist(), column_of_clone[columns[matched]].tolist()))
+
+
+HUNGARIAN_MIN_EDGES = 1000   # below this number of edges, the networkx blossom algorithm is faster than building the weight matrix.
+
+def max_weight_matching(graph:networkx.Graph, maxcardinality:bool=False, weight:str="weight", backend:str="auto")->set:
+    """
+    A drop-in replacement for networkx.max_weight_matching, that uses the Hungarian method when the graph is bipartite.
+
+    :param graph: an undirected networkx graph.
+    :param maxcardinality: True to require maximum weight subject to maximum cardinality. False to require only maximum weight.
+    :param weight: the edge attribute that holds the weight. Edges without this attribute have weight 1.
+    :param backend: "networkx" for the blossom algorithm, "hungarian" for linear_sum_assignment (bipartite graphs only),
+       or "auto" for "hungarian" on bipartite graphs with at least HUNGARIAN_MIN_EDGES edges and "networkx" otherwise.
+    :return: a set of edges (u,v), like networkx.max_weight_matching.
+
+    NOTE: both backends return a matching of maximum weight, but when several matchings have the maximum weight,
+    they may return different ones. Hence, with backend="auto", the matching chosen among ties may change when the
+    number of edges crosses HUNGARIAN_MIN_EDGES. Pass backend="networkx" (or "hungarian") to break ties
+    in the same way for all instance sizes; the algorithms that use this function accept a `backend` argument for this purpose.
+
+    >>> graph = networkx.Graph()
+    >>> graph.add_weighted_edges_from([("avi","x",5), ("avi","y",4), ("beni","x",2), ("beni","y",3)])
+    >>> sorted(max_weight_matching(graph, backend="hungarian"))
+    [('avi', 'x'), ('beni', 'y')]
+    >>> graph.add_weighted_edges_from([("gadi","z",-1)])
+    >>> sorted(max_weight_matching(graph, backend="hungarian"))
+    [('avi', 'x'), ('beni', 'y')]
+    >>> sorted(max_weight_matching(graph, maxcardinality=True, backend="hungarian"))
+    [('avi', 'x'), ('beni', 'y'), ('gadi', 'z')]
+    >>> graph.add_edge("x","y")
+    >>> len(max_weight_matching(graph, backend="hungarian"))    # not bipartite - networkx is used
+    2
+    """
+    if backend not in ["auto", "networkx", "hungarian"]:
+        raise ValueError(f"Unknown backend {backend}")
+    if backend=="auto" and graph.number_of_edges() < HUNGARIAN_MIN_EDGES:
+        backend = "networkx"
+    if backend!="networkx":
+        try:
+            side = networkx.bipartite.color(graph)
+        except networkx.NetworkXError:
+            logger.info("The graph is not bipartite - using the networkx blossom algorithm")
+            backend = "networkx"
+    if backend=="networkx":
+        return networkx.max_weight_matching(graph, maxcardinality=maxcardinality, weight=weight)
+
+    # networkx colors the first node of each component by 1, so the left side contains the agents when they are added first.
+    left  = [node for node in graph.nodes if side[node]==1]
+    right = [node for node in graph.nodes if side[node]==0]
+    left_index  = {node:index for index,node in enumerate(left)}
+    right_index = {node:index for index,node in enumerate(right)}
+    rows, columns, weights = [], [], []
+    for u,v,data in graph.edges(data=True):
+        if side[u]==0:
+            u,v = v,u
+        rows.append(left_index[u])
+        columns.append(right_index[v])
+        weights.append(data.get(weight,1))
+    weight_matrix = sparse.coo_matrix((weights, (rows, columns)), shape=(len(left), len(right)))
+    matching = max_weight_bipartite_matching(weight_matrix, maxcardinality=maxcardinality)
+    return {(left[i], right[j]) for i,j in matching}
+
+
+max_weight_matching.logger = logger
+
+
+if __name__ == "__main__":
+    import doctest
+    (failures,tests) = doctest.testmod(report=True)
+    print ("{} failures, {} tests".format(failures,tests))
@@ -0,0 +1,167 @@
+#!python3
+
+"""
+Computing the 1-out-of-c maximin share (MMS) of agents with additive valuations.
+
+The MMS of an additive agent depends only on the multiset of its positive item values and on c.
+Therefore, computed values are kept in a cache keyed by the sorted value vector and c,
+which is shared by all agents and all algorithms in the process:
+agents with the same values, or an algorithm that asks for the same MMS again and again, compute it only once.
+
+Programmer: Erel Segal-Halevi
+Since: 2026-10
+"""
+
+from typing import List, Iterable
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import prtpy, time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+MMS_METHODS = ["exact", "approximate"]
+MMS_CACHE_SIZE = 100000    # maximum number of cached values; when it is exceeded, the oldest values are evicted.
+MAX_SUBSET_SUM = 10**7     # The subset-sum dynamic program is used only when the sum of values is at most this number.
+
+_mms_cache = {}
+
+
+def maximin_share(values: Iterable[float], c: int = 1, method: str = "exact", time_limit: float = np.inf) -> float:
+    """
+    Calculates the value of the 1-out-of-c maximin-share ( https://en.wikipedia.org/wiki/Maximin-share )
+    of an agent with the given additive item values.
+
+    :param values: the values of the items to the agent: a list, a numpy array, or a dict mapping each item to its value.
+    :param c: the number of bundles in the partition.
+    :param method: "exact" - an exact algorithm: a subset-sum dynamic program when c=2 and the values are integers,
+        and the branch-and-bound algorithm prtpy.partitioning.complete_greedy otherwise.
+        "approximate" - the Karmarkar-Karp heuristic, which returns a lower bound on the MMS.
+    :param time_limit: maximum number of seconds for the branch-and-bound algorithm.
+        When the time runs out, the best value found so far is returned; it is a lower bound on the MMS.
+
+    >>> maximin_share([1, 2, 4, 0], c=2)
+    3.0
+    >>> maximin_share([1, 2, 4, 0], c=3)
+    1.0
+    >>> maximin_share([1, 2, 4, 0], c=4)
+    0
+    >>> maximin_share([46, 39, 27, 26, 16, 13, 10], c=3)
+    56.0
+    >>> maximin_share([46, 39, 27, 26, 16, 13, 10], c=3, method="approximate")
+    55.0
+    >>> maximin_share([1.5, 2.5, 1], c=2)
+    2.5
+    >>> maximin_share([1, 2], method="optimal")
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown MMS method 'optimal'; should be one of ['exact', 'approximate']
+    """
+    if method not in MMS_METHODS:
+        raise ValueError(f"Unknown MMS method '{method}'; should be one of {MMS_METHODS}")
+    key = _cache_key(values, c, method, time_limit)
+    if key not in _mms_cache:
+        _cache_store(key, _compute_maximin_share(key))
+    return _mms_cache[key]
+
+
+def maximin_shares(list_of_values: List[Iterable[float]], c: int = 1, method: str = "exact", time_limit: float = np.inf, workers: int = 1) -> List[float]:
+    """
+    Calculates the 1-out-of-c maximin-shares of many agents.
+    Values that are not in the cache are computed in a pool of processes, and then stored in the cache.
+
+    :param list_of_values: for each agent, the values of the items to the agent.
+    :param workers: number of worker processes. If workers==1 (the default), the values are computed in the current process.
+        If workers is None, it is the number of CPUs.
+    :param c, method, time_limit: as in `maximin_share`.
+
+    >>> maximin_shares([[1, 2, 4], {"x": 4, "y": 2, "z": 1}, [5, 5, 5, 5]], c=2, workers=2)
+    [3.0, 3.0, 10.0]
+    """
+    if method not in MMS_METHODS:
+        raise ValueError(f"Unknown MMS method '{method}'; should be one of {MMS_METHODS}")
+    keys = [_cache_key(values, c, method, time_limit) for values in list_of_values]
+    missing_keys = list(dict.fromkeys(key for key in keys if key not in _mms_cache))
+    start_time = time.perf_counter()
+    if workers==1 or len(missing_keys) <= 1:
+        missing_values = map(_compute_maximin_share, missing_keys)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            missing_values = list(executor.map(_compute_maximin_share, missing_keys))
+    for key, value in zip(missing_keys, missing_values):
+        _cache_store(key, value)
+    logger.info("Computed %d maximin shares (%d of %d distinct agents were cached) in %g seconds",
+        len(keys), len(set(keys)) - len(missing_keys), len(set(keys)), time.perf_counter() - start_time)
+    return [_mms_cache[key] for key in keys]
+
+
+def clear_maximin_share_cache():
+    _mms_cache.clear()
+
+
+def maximin_share_cache_size() -> int:
+    return len(_mms_cache)
+
+
+def _cache_key(values: Iterable[float], c: int, method: str, time_limit: float) -> tuple:
+    if isinstance(values, dict):
+        values = values.values()
+    positive_values = tuple(sorted((value.item() if isinstance(value, np.generic) else value for value in values if value > 0), reverse=True))
+    return (positive_values, c, method, time_limit)
+
+
+def _cache_store(key: tuple, value: float):
+    if len(_mms_cache) >= MMS_CACHE_SIZE:
+        del _mms_cache[next(iter(_mms_cache))]   # dicts keep the insertion order, so this is the oldest value.
+    _mms_cache[key] = value
+
+
+def _compute_maximin_share(key: tuple) -> float:
+    values, c, method, time_limit = key
+    if c > len(values):
+        return 0
+    if method == "exact" and c == 2 and all(float(value).is_integer() for value in values) and sum(values) <= MAX_SUBSET_SUM:
+        return float(_largest_subset_sum_at_most_half([int(value) for value in values]))
+    if method == "approximate":
+        partition = prtpy.partition(
+            algorithm=prtpy.partitioning.karmarkar_karp,
+            numbins=c,
+            items=values,
+            outputtype=prtpy.out.Partition
+        )
+    else:
+        partition = prtpy.partition(
+            algorithm=prtpy.partitioning.complete_greedy,
+            numbins=c,
+            items=values,
+            objective=prtpy.obj.MaximizeSmallestSum,
+            outputtype=prtpy.out.Partition,
+            time_limit=time_limit
+        )
+    # The smallest sum is computed from the partition, since prtpy.out.SmallestSum may truncate non-integer sums.
+    return float(min(sum(bundle) for bundle in partition))
+
+
+def _largest_subset_sum_at_most_half(values: List[int]) -> int:
+    """
+    The 1-out-of-2 MMS of integer values: the largest sum of a subset that is at most half the total.
+    The set of reachable subset sums is kept as the bits of a single Python integer.
+
+    >>> _largest_subset_sum_at_most_half([46, 39, 27, 26, 16, 13, 10])
+    88
+    >>> _largest_subset_sum_at_most_half([3, 5])
+    3
+    """
+    half = sum(values) // 2
+    reachable = 1     # bit s is on iff there is a subset with sum s.
+    mask = (1 << (half + 1)) - 1
+    for value in values:
+        reachable = (reachable | (reachable << value)) & mask
+    return reachable.bit_length() - 1
+
+
+if __name__ == "__main__":
+    import doctest
+    (failures, tests) = doctest.testmod(report=True)
+    print("{} failures, {} tests".format(failures, tests))
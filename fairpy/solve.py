@@ -20,31 +20,34 @@ DEFAULT_SOLVERS = [
 import logging
 logger = logging.getLogger(__name__)
 
-def solve(problem:cvxpy.Problem, solvers:List[Tuple[str, Dict]] = DEFAULT_SOLVERS):
+def solve(problem:cvxpy.Problem, solvers:List[Tuple[str, Dict]] = DEFAULT_SOLVERS, warm_start:bool=True)->Tuple[str, Dict]:
 	"""
 	Try to solve the given cvxpy problem using the given solvers, in order, until one succeeds.
     See here https://www.cvxpy.org/tutorial/advanced/index.html for a list of supported solvers.
 
 	:param solvers list of tuples. Each tuple is (name-of-solver, keyword-arguments-to-solver)
+	:param warm_start if the same problem object is solved again, start from the previous solution (for solvers that support it).
+	:return the tuple (name-of-solver, keyword-arguments-to-solver) of the solver that succeeded.
 	"""
-	is_solved=False
+	solved_by = None
 	for (solver, solver_kwargs) in solvers:  # Try the first n-1 solvers.
 		try:
 			if solver==cvxpy.SCIPY:
-				problem.solve(solver=solver, scipy_options=dict(solver_kwargs))  # WARNING: solve changes both its arguments!
+				problem.solve(solver=solver, warm_start=warm_start, scipy_options=dict(solver_kwargs))  # WARNING: solve changes both its arguments!
 			else:
-				problem.solve(solver=solver, **solver_kwargs)
+				problem.solve(solver=solver, warm_start=warm_start, **solver_kwargs)
 			logger.info("Solver %s [%s] succeeds", solver, solver_kwargs)
-			is_solved = True
+			solved_by = (solver, solver_kwargs)
 			break
 		except cvxpy.SolverError as err:
 			logger.info("Solver %s [%s] fails: %s", solver, solver_kwargs, err)
-	if not is_solved:
+	if solved_by is None:
 		raise cvxpy.SolverError(f"All solvers failed: {solvers}")
 	if problem.status == "infeasible":
 		raise ValueError("Problem is infeasible")
 	elif problem.status == "unbounded":
 		raise ValueError("Problem is unbounded")
+	return solved_by
 
 def maximize(objective, constraints, solvers:list=DEFAULT_SOLVERS):
 	"""
@@ -13,7 +13,7 @@ Since: 2021-04
 
 from abc import ABC, abstractmethod
 from numbers import Number
-from collections.abc import Iterable
+from collections.abc import Iterable, Sized
 import numpy as np
 
 from dicttools import stringify
@@ -22,6 +22,7 @@ import math, itertools
 from fractions import Fraction
 
 from fairpy.bundles import FractionalBundle
+from fairpy.maximin_share import maximin_share
 
 from typing import *
 Item = Any
@@ -44,6 +45,7 @@ class Valuation(ABC):
         self.desired_items_list = sorted(desired_items)
         self.desired_items = set(desired_items)
         self.total_value_cache = self.value(self.desired_items)
+        self._mms_values = {}   # maps c to the 1-out-of-c MMS value; computing it may take exponential time.
 
     @abstractmethod
     def value(self, bundle:Bundle)->float:
@@ -64,6 +66,15 @@ class Valuation(ABC):
         """
         return self.desired_items
 
+    def item_values(self, items:List[Item])->np.ndarray:
+        """
+        :return: a vector with the value of each of the given items.
+
+        >>> MonotoneValuation({"x": 1, "y": 2, "xy": 4}).item_values(["y","x"])
+        array([2, 1])
+        """
+        return np.array([self.value(item) for item in items])
+
     def best_index(self, allocation:List[Bundle])->int:
         """
         Returns an index of a bundle that is most-valuable for the agent.
@@ -136,11 +147,12 @@ class Valuation(ABC):
         """
         if c > len(self.desired_items):
             return 0
-        else:
-            return max(
+        if c not in self._mms_values:
+            self._mms_values[c] = max(
                 min([self.value(bundle) for bundle in partition])
                 for partition in set_partitions(self.desired_items_list, c)
             )
+        return self._mms_values[c]
 
     def value_proportional_except_c(self, num_of_agents:int, c:int):
         """
@@ -270,6 +282,16 @@ class MonotoneValuation(Valuation):
         return f"Monotone valuation on {sorted(self.desired_items)}."
 
 
+def _scalar(value):
+    """
+    Converts a numpy scalar to the corresponding Python number, so that additive values print as before.
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+SMALL_BUNDLE = 16   # bundles of at most this number of goods are evaluated in pure Python, which is faster for them and keeps the summation order
+
+
 class AdditiveValuation(Valuation):
     """
     Represents an additive valuation function.
@@ -367,27 +389,49 @@ class AdditiveValuation(Valuation):
         """
         Initializes an agent with a given additive valuation function.
         :param map_good_to_value: a dict that maps each single good to its value, or a list that lists the values of individual items.
+
+        The values are also kept in a numpy vector (with a map from each item to its index, for dict inputs),
+        together with their descending order and its prefix sums, so that large bundles are evaluated by fancy indexing.
         """
         if isinstance(map_good_to_value, AdditiveValuation):
             map_good_to_value = map_good_to_value.map_good_to_value
-            desired_items = map_good_to_value.desired_items
-            all_items = map_good_to_value._all_items
-        elif isinstance(map_good_to_value, dict):
+        if isinstance(map_good_to_value, dict):
             all_items = map_good_to_value.keys()
             desired_items = set([g for g in all_items if map_good_to_value[g]>0])
+            self._item_index = {item:index for index,item in enumerate(all_items)}
+            self._values = np.array(list(map_good_to_value.values()))
         elif isinstance(map_good_to_value, list) or isinstance(map_good_to_value, np.ndarray):
             all_items =  set(range(len(map_good_to_value)))
             desired_items = set([g for g in all_items if map_good_to_value[g]>0])
+            self._item_index = None     # each item is its own index
+            self._values = np.array(map_good_to_value)
         else:
             raise ValueError(f"Input to AdditiveValuation should be a dict or a list, but it is {type(map_good_to_value)}")
 
         self.map_good_to_value = map_good_to_value
         self._all_items = all_items
+        self._descending_values = -np.sort(-self._values) if len(self._values)>0 else self._values
+        self._descending_prefix_sums = np.concatenate(([0], np.cumsum(self._descending_values)))  # _descending_prefix_sums[c] = value of the best c goods
         super().__init__(desired_items)
 
+    def _indices(self, bundle:Bundle)->np.ndarray:
+        """
+        :return: the indices of the goods in the given bundle, in the vector of values.
+        """
+        if self._item_index is None:
+            return np.fromiter(bundle, dtype=int, count=len(bundle))
+        else:
+            return np.fromiter((self._item_index[g] for g in bundle), dtype=int, count=len(bundle))
+
     def value(self, bundle:Bundle)->int:
         """
         Calculates the agent's value for the given good or set of goods.
+
+        >>> a = AdditiveValuation(list(range(100)))
+        >>> a.value(range(50,100))
+        3725
+        >>> AdditiveValuation({i:i for i in range(100)}).value(set(range(50,100)))
+        3725
         """
         if bundle is None:
             return 0
@@ -398,6 +442,8 @@ class AdditiveValuation(Valuation):
                 return self.map_good_to_value[bundle]
             else:
                 return sum([self.map_good_to_value[g] for g in bundle])
+        elif isinstance(bundle, Sized) and len(bundle) > SMALL_BUNDLE:
+            return _scalar(self._values[self._indices(bundle)].sum())
         elif isinstance(bundle, Iterable):   # set, list, str, etc.
             return sum([self.map_good_to_value[g] for g in bundle])
         elif isinstance(bundle,Number):                              # individual item
@@ -408,6 +454,21 @@ class AdditiveValuation(Valuation):
     def all_items(self):
         return self._all_items
 
+    def item_values(self, items:List[Item])->np.ndarray:
+        """
+        :return: a vector with the value of each of the given items, computed by fancy indexing.
+
+        >>> AdditiveValuation({"x": 1, "y": 2, "z": 4}).item_values(["z","x"])
+        array([4, 1])
+        >>> AdditiveValuation([11,22,44,0]).item_values([3,2])
+        array([ 0, 44])
+        """
+        items = list(items)
+        try:
+            return self._values[self._indices(items)]
+        except (KeyError, TypeError, ValueError):   # e.g. an item that is not in the valuation
+            return super().item_values(items)
+
     def value_except_best_c_goods(self, bundle:Bundle, c:int=1)->int:
         """
         Calculates the value of the given bundle when the "best" (at most) c goods are removed from it.
@@ -429,8 +490,15 @@ class AdditiveValuation(Valuation):
         0
         >>> a.value_except_best_c_goods(set(), c=1)
         0
+        >>> AdditiveValuation(list(range(100))).value_except_best_c_goods(set(range(50,100)), c=3)
+        3431
         """
         if len(bundle) <= c: return 0
+        if len(bundle) > SMALL_BUNDLE and bundle is self.desired_items:   # the desired goods are the first ones in descending order
+            return _scalar(self._descending_prefix_sums[len(bundle)] - self._descending_prefix_sums[c])
+        if len(bundle) > SMALL_BUNDLE and c > 0:
+            num_of_remaining_goods = len(bundle) - c
+            return _scalar(np.partition(self._values[self._indices(bundle)], num_of_remaining_goods)[:num_of_remaining_goods].sum())
         sorted_bundle = sorted(bundle, key=lambda g: -self.map_good_to_value[g]) # sort the goods from best to worst
         return self.value(sorted_bundle[c:])  # remove the best c goods
 
@@ -453,8 +521,12 @@ class AdditiveValuation(Valuation):
         0
         >>> a.value_except_worst_c_goods(set(), c=1)
         0
+        >>> AdditiveValuation(list(range(100))).value_except_worst_c_goods(set(range(50,100)), c=3)
+        3572
         """
         if len(bundle) <= c: return 0
+        if len(bundle) > SMALL_BUNDLE and c > 0:
+            return _scalar(np.partition(self._values[self._indices(bundle)], c)[c:].sum())
         sorted_bundle = sorted(bundle, key=lambda g: self.map_good_to_value[g])  # sort the goods from worst to best:
         return self.value(sorted_bundle[c:])  # remove the worst c goods
 
@@ -472,12 +544,13 @@ class AdditiveValuation(Valuation):
         1
         >>> a.value_of_cth_best_good(4)
         0
+        >>> AdditiveValuation([11,22,44,0]).value_of_cth_best_good(2)
+        22
         """
         if c > len(self.desired_items):
             return 0
         else:
-            sorted_values = sorted(self.map_good_to_value.values(), reverse=True)
-            return sorted_values[c-1]
+            return _scalar(self._descending_values[c-1])
 
     def partition_1_of_c_MMS(self, c: int, items: list) -> List[Bundle]:
         """
@@ -514,21 +587,15 @@ class AdditiveValuation(Valuation):
         """
         Calculates the value of the 1-out-of-c maximin-share ( https://en.wikipedia.org/wiki/Maximin-share )
 
+        The computation is done by fairpy.maximin_share, which caches the values of all additive agents.
+
         >>> a = AdditiveValuation({"x": 1, "y": 2, "z": 4, "w":0})
         >>> a.value_1_of_c_MMS(c=2)
         3.0
+        >>> AdditiveValuation([1.5, 2.5, 1]).value_1_of_c_MMS(c=2)
+        2.5
         """
-        if c > len(self.desired_items):
-            return 0
-        else:
-            return prtpy.partition(
-                algorithm=prtpy.partitioning.complete_greedy,
-                numbins=c,
-                items=self.desired_items,
-                valueof=lambda item: self.value(item),
-                objective=prtpy.obj.MaximizeSmallestSum,
-                outputtype=prtpy.out.SmallestSum
-            )
+        return maximin_share(self._values, c)
 
 
 
@@ -8,6 +8,9 @@ Since:  2023-07
 import pytest
 
 import fairpy.courses as crs
+from fairpy.courses.allocation_utils import DenseAllocationBuilder
+from fairpy.courses.othman_sandholm_budish import multi_start_course_allocation
+from fairpy.valuations import ValuationMatrix
 import numpy as np
 
       
@@ -22,6 +25,7 @@ def test_feasibility():
         crs.bidirectional_round_robin,
         crs.yekta_day,
         crs.almost_egalitarian_allocation,
+        crs.almost_egalitarian_leximin,
         ]
     for i in range(10):
         np.random.seed(i)
@@ -37,6 +41,104 @@ def test_feasibility():
             crs.validate_allocation(instance, allocation, title=f"Seed {i}, algorithm {algorithm.__name__}")
 
 
+def test_dense_instance():
+    algorithms = [
+        crs.utilitarian_matching, 
+        crs.iterated_maximum_matching, 
+        crs.round_robin, 
+        crs.bidirectional_round_robin,
+        ]
+    for i in range(5):
+        np.random.seed(i)
+        instance = crs.Instance.random_uniform(
+            num_of_agents=30, num_of_items=10, normalized_sum_of_values=1000,
+            agent_capacity_bounds=[2,6], 
+            item_capacity_bounds=[10,20], 
+            item_base_value_bounds=[1,1000],
+            item_subjective_ratio_bounds=[0.5, 1.5]
+            )
+        dense_instance = crs.DenseInstance.from_instance(instance)
+        for algorithm in algorithms:
+            allocation = crs.divide(algorithm, instance=dense_instance)
+            crs.validate_allocation(instance, allocation, title=f"Seed {i}, algorithm {algorithm.__name__}, dense")
+            assert allocation == crs.divide(algorithm, instance=instance)
+
+
+def test_dense_instance_with_conflicts():
+    # A view of a dense instance (e.g. the remaining instance) has fewer items than its conflict matrices:
+    dense_instance = crs.DenseInstance(valuations=[[5,3,1,2],[1,3,5,2]], item_capacities=[0,1,1,1],
+        agent_conflicts=[[False,True,False,False],[False,False,False,False]], item_conflicts={2:[3], 3:[2]})
+    view = dense_instance.view(agents=[0,1], items=[1,2,3])
+    assert view.agent_conflicts(0) == {1}
+    assert view.item_conflicts(2) == {3}
+    view = dense_instance.view(agents=[0,1], items=[1,2])
+    assert view.agent_conflicts(0) == {1}
+    assert view.item_conflicts(2) == set()
+    assert DenseAllocationBuilder(dense_instance).remaining_instance().agent_conflicts(0) == {1}
+
+    algorithms = [
+        crs.utilitarian_matching,
+        crs.iterated_maximum_matching,
+        crs.round_robin,
+        ]
+    for i in range(5):
+        np.random.seed(i)
+        random_instance = crs.Instance.random_uniform(
+            num_of_agents=20, num_of_items=8, normalized_sum_of_values=1000,
+            agent_capacity_bounds=[2,4],
+            item_capacity_bounds=[5,10],
+            item_base_value_bounds=[1,1000],
+            item_subjective_ratio_bounds=[0.5, 1.5]
+            )
+        agents, items = list(random_instance.agents), list(random_instance.items)
+        instance = crs.Instance(   # the first two items are exhausted, and some agents conflict with some items
+            valuations = {agent: {item: random_instance.agent_item_value(agent,item) for item in items} for agent in agents},
+            agent_capacities = {agent: random_instance.agent_capacity(agent) for agent in agents},
+            item_capacities = {item: 0 if j<2 else random_instance.item_capacity(item) for j,item in enumerate(items)},
+            agent_conflicts = {agent: {items[(k+i)%len(items)], items[(3*k+1)%len(items)]} for k,agent in enumerate(agents)},
+            item_conflicts = {items[2]: {items[5]}, items[5]: {items[2]}},
+            )
+        dense_instance = crs.DenseInstance.from_instance(instance)
+        for algorithm in algorithms:
+            allocation = crs.divide(algorithm, instance=dense_instance)
+            assert allocation == crs.divide(algorithm, instance=instance)
+
+
+def test_almost_egalitarian_rounding_order():
+    # The rounding visits the leaves and min-weight edges in the order of the consumption graph; these allocations depend on that order.
+    expected_allocations = {
+        9:  {'s1': ['c2', 'c4'], 's2': ['c1', 'c6'], 's3': ['c3', 'c4', 'c6'], 's4': ['c1', 'c4'], 's5': ['c1', 'c2', 'c3'], 's6': ['c2', 'c3', 'c5'], 's7': ['c2', 'c4'], 's8': ['c3', 'c4', 'c6'], 's9': ['c2', 'c3', 'c5', 'c6'], 's10': ['c1', 'c3'], 's11': ['c1', 'c5'], 's12': ['c4', 'c5', 'c6']},
+        14: {'s1': ['c2', 'c3', 'c4', 'c6'], 's2': ['c1', 'c3', 'c5'], 's3': ['c1', 'c3'], 's4': ['c4', 'c5'], 's5': ['c2', 'c6'], 's6': ['c1', 'c4'], 's7': ['c2', 'c5', 'c6'], 's8': ['c1', 'c4', 'c5', 'c6'], 's9': ['c4', 'c5'], 's10': ['c2', 'c3'], 's11': ['c1', 'c2', 'c3'], 's12': ['c2', 'c3', 'c4', 'c6']},
+    }
+    for i,expected_allocation in expected_allocations.items():
+        np.random.seed(i)
+        instance = crs.Instance.random_uniform(
+            num_of_agents=12, num_of_items=6, normalized_sum_of_values=1000,
+            agent_capacity_bounds=[2,4],
+            item_capacity_bounds=[3,6],
+            item_base_value_bounds=[1,1000],
+            item_subjective_ratio_bounds=[0.5, 1.5]
+            )
+        allocation = crs.divide(crs.almost_egalitarian_without_donation, instance=instance)
+        assert allocation == expected_allocation, f"Seed {i}"
+
+
+def test_multi_start_histories():
+    # The first start of this instance does not reach the bound, so the second start runs too.
+    utilities = ValuationMatrix(np.random.default_rng(3).integers(1,50,size=(5,6)).tolist())
+    seeds = np.random.SeedSequence(3).spawn(3)
+    placement, histories = multi_start_course_allocation(utilities, [1]*6, [2]*5, seeds, return_history=True)
+    assert len(histories) == len(seeds)
+    assert histories[0] is not None and histories[1] is not None
+    for history in histories:
+        if history is None:
+            continue
+        assert len(history) > 0
+        errors = [error for _,error in history]
+        assert all(later <= earlier for earlier,later in zip(errors, errors[1:]))
+    assert placement == multi_start_course_allocation(utilities, [1]*6, [2]*5, seeds)
+
+
 if __name__ == "__main__":
      pytest.main(["-v",__file__])
 
@@ -1,6 +1,9 @@
 import unittest, pytest
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 from fairpy.agentlist import AgentList
 from fairpy.items.fair_rent_division_on_a_budget import maximum_rent_envy_free, optimal_envy_free
+from fairpy.items.fair_rent_division_on_a_budget_assist import envy_free_prices
 
 
 class TestMain(unittest.TestCase):
@@ -127,6 +130,23 @@ class TestMain(unittest.TestCase):
               ('7', 550.0), ('8', 550.0), ('9', 550.0)]))
 
 
+    def test_envy_free_prices_large_input(self):
+        np.random.seed(1)
+        num_agents, rent = 500, 500000
+        valuations = np.random.randint(0, 2000, size=(num_agents, num_agents))
+        agents, rooms = linear_sum_assignment(valuations, maximize=True)
+        values = valuations[np.ix_(agents, rooms)]     # values[i][k] = value of agent i for the room of agent k
+        prices = envy_free_prices(values, rent)
+        utilities = np.diagonal(values) - prices
+        self.assertAlmostEqual(prices.sum(), rent, places=4)
+        self.assertTrue(((values - prices[np.newaxis, :]) <= utilities[:, np.newaxis] + 1e-6).all())
+
+        budgets = prices + np.random.randint(0, 100, size=num_agents)
+        budget_prices = envy_free_prices(values, rent, budgets=budgets)
+        self.assertTrue((budget_prices <= budgets + 1e-6).all())
+        self.assertGreaterEqual((np.diagonal(values) - budget_prices).min(), utilities.min() - 1e-6)
+        self.assertIsNone(envy_free_prices(values, rent, budgets=budgets - 1000))
+
     @pytest.mark.skip(reason="takes too long for the usual tests")
     def test_algo2_large_input_1(self):
          # Overload test
@@ -0,0 +1,39 @@
+"""
+Test that the Hungarian backend of fairpy.matching finds matchings with the same weight as networkx.
+
+Programmer: Erel Segal-Halevi
+Since:  2026-10
+"""
+
+import pytest
+
+import networkx, numpy as np
+from fairpy.matching import max_weight_matching
+
+
+def random_bipartite_graph(num_of_agents:int, num_of_items:int, edge_probability:float)->networkx.Graph:
+    graph = networkx.Graph()
+    for agent in range(num_of_agents):
+        for item in range(num_of_items):
+            if np.random.random() < edge_probability:
+                graph.add_edge(f"a{agent}", f"i{item}", weight=int(np.random.randint(-20,100)))
+    return graph
+
+def matching_weight(graph:networkx.Graph, matching:set)->float:
+    return sum(graph[u][v]["weight"] for u,v in matching)
+
+
+@pytest.mark.parametrize("maxcardinality", [False, True])
+def test_same_weight_as_networkx(maxcardinality):
+    for i in range(10):
+        np.random.seed(i)
+        graph = random_bipartite_graph(num_of_agents=15, num_of_items=12, edge_probability=0.6)
+        expected = networkx.max_weight_matching(graph, maxcardinality=maxcardinality)
+        actual = max_weight_matching(graph, maxcardinality=maxcardinality, backend="hungarian")
+        assert networkx.is_matching(graph, actual)
+        assert len(actual) == len(expected) or not maxcardinality
+        assert matching_weight(graph, actual) == matching_weight(graph, expected)
+
+
+if __name__ == "__main__":
+     pytest.main(["-v",__file__])
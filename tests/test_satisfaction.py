@@ -0,0 +1,37 @@
+"""
+Test that the satisfaction measures of AgentBundleValueMatrix do not depend on the chunk size.
+"""
+
+import pytest
+
+import numpy as np
+import fairpy.courses as crs
+from fairpy.courses.satisfaction import AgentBundleValueMatrix
+
+
+@pytest.mark.parametrize("normalized", [False, True])
+def test_chunked_envy(normalized):
+    for i in range(5):
+        np.random.seed(i)
+        instance = crs.Instance.random_uniform(
+            num_of_agents=30, num_of_items=10, normalized_sum_of_values=1000,
+            agent_capacity_bounds=[2,6],
+            item_capacity_bounds=[10,20],
+            item_base_value_bounds=[1,1000],
+            item_subjective_ratio_bounds=[0.5, 1.5]
+            )
+        allocation = crs.divide(crs.round_robin, instance=instance)
+        unchunked = AgentBundleValueMatrix(instance, allocation, normalized=normalized)
+        unchunked.make_envy_matrix()
+        for chunk_size in [1, 7, 30]:
+            chunked = AgentBundleValueMatrix(instance, allocation, normalized=normalized, chunk_size=chunk_size)
+            assert chunked.max_envy() == pytest.approx(unchunked.max_envy())
+            assert chunked.mean_envy() == pytest.approx(unchunked.mean_envy())
+            assert chunked.utilitarian_value() == pytest.approx(unchunked.utilitarian_value())
+            assert chunked.egalitarian_value() == pytest.approx(unchunked.egalitarian_value())
+        max_envy = max(max(row.values()) for row in unchunked.envy_matrix.values())
+        assert unchunked.max_envy() == pytest.approx(max_envy)
+
+
+if __name__ == "__main__":
+     pytest.main(["-v",__file__])
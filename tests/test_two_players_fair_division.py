@@ -124,6 +124,46 @@ def test_trump():
     assert trump(agents[4], items[4].copy()) == [['a', 'c', 'e', 'g', 'h', 'j'], ['k', 'b', 'i', 'l', 'f', 'd']]
 
 
+
+def test_generators():
+    # The full lists returned by the algorithms are checked against the expected outputs in the tests above.
+    algorithms = [(sequential, sequential_generator), (restricted_simple, restricted_simple_generator),
+                  (singles_doubles, singles_doubles_generator), (iterated_singles_doubles, iterated_singles_doubles_generator),
+                  (s1, s1_generator), (l1, l1_generator)]
+    for algorithm, generator in algorithms:
+        for i in range(len(agents)):
+            all_allocations = algorithm(agents[i], items[i].copy())
+            assert list(generator(agents[i], items[i].copy(), limit=1)) == all_allocations[:1]
+            envy_free_allocations = [allocation for allocation in all_allocations
+                                     if is_envy_free_partial_allocation(agents[i], list(allocation.values()))]
+            assert list(generator(agents[i], items[i].copy(), predicate=is_envy_free_partial_allocation)) == envy_free_allocations
+
+
+def test_preference_index():
+    for i in range(len(agents)):
+        index = PreferenceIndex(agents[i], items[i])
+        remaining = items[i].copy()
+        for item in items[i][::2]:
+            index.remove(item)
+            remaining.remove(item)
+            assert len(index) == len(remaining)
+            for level in range(len(items[i]) + 1):
+                assert index.H_M_l(level) == H_M_l(agents[i], remaining, level)
+        for item in items[i][::2]:
+            index.add(item)
+        assert index.H_M_l(len(items[i])) == H_M_l(agents[i], items[i], len(items[i]))
+
+
+def test_float_ranks():
+    float_agents = [fairpy.agents.AdditiveAgent({item: float(agent.value(item)) for item in agent.all_items()}, name=agent.name())
+                    for agent in agents[2]]
+    for algorithm in [sequential, restricted_simple, singles_doubles, iterated_singles_doubles, s1, l1]:
+        assert algorithm(float_agents, items[2].copy()) == algorithm(agents[2], items[2].copy())
+    index = PreferenceIndex(float_agents, items[2])
+    for level in [0, 0.5, 1, 2.5, 3.0, 100]:
+        assert index.H_M_l(level) == H_M_l(float_agents, items[2], level)
+
+
 if __name__ == '__main__':
     test_sequential()
     test_restricted_simple()
@@ -135,4 +175,7 @@ if __name__ == '__main__':
     test_top_down_alternating()
     test_bottom_up()
     test_bottom_up_alternating()
-    test_trump()
\ No newline at end of file
+    test_trump()
+    test_generators()
+    test_preference_index()
+    test_float_ranks()
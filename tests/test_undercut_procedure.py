@@ -12,9 +12,9 @@ Date: 2022-05
 """
 
 import fairpy
-from fairpy.items.undercut_procedure  import undercut
+from fairpy.items.undercut_procedure  import undercut, last_almost_equal_cut, all_combinations
 from fairpy import AgentList
-import unittest
+import unittest, random
 
 
 class TestAlgo(unittest.TestCase):
@@ -86,9 +86,33 @@ class TestAlgo(unittest.TestCase):
 
         A = fairpy.agents.AdditiveAgent({}, name="Alice")
         B = fairpy.agents.AdditiveAgent({}, name="Bob")
-        allocation = undercut(AgentList([A,B]),[])  
+        allocation = undercut(AgentList([A,B]),[])
         self.assertTrue(A.is_EF(allocation[0],allocation) and B.is_EF(allocation[1], allocation))
 
+    def test_many_items(self):
+        #30 items - the 2^29 partitions are not enumerated
+        items = [f"item{i:02d}" for i in range(30)]
+        A = fairpy.agents.AdditiveAgent({item: (7*i)%31+1 for i,item in enumerate(items)}, name="Alice")
+        B = fairpy.agents.AdditiveAgent({item: (11*i)%31+1 for i,item in enumerate(items)}, name="Bob")
+        allocation = undercut(AgentList([A,B]),items)
+        self.assertEqual(sorted(list(allocation[0])+list(allocation[1])), items)
+        self.assertTrue(A.is_EF(allocation[0],allocation) and B.is_EF(allocation[1], allocation))
+
+    def test_mixed_magnitudes(self):
+        #values of very different magnitudes, which defeat bounds on the sums
+        random.seed(1)
+        for num_of_items in [14, 28]:
+            items = [f"item{i:02d}" for i in range(num_of_items)]
+            random.shuffle(items)
+            A = fairpy.agents.AdditiveAgent({item: random.choice([random.randint(1,1000), 10**6]) for item in items}, name="Alice")
+            cut = last_almost_equal_cut(A, items)
+            value_of_cut, value_of_rest = A.value(cut), A.value(set(items)-set(cut))
+            self.assertTrue(value_of_cut >= value_of_rest and all(value_of_cut-A.value(item) < value_of_rest+A.value(item) for item in cut))
+            if num_of_items <= 14:
+                almost_equal_cuts = [X for X,Y in all_combinations(items, 2) 
+                                     if A.value(X) >= A.value(Y) and all(A.value(X)-A.value(item) < A.value(Y)+A.value(item) for item in X)]
+                self.assertEqual(cut, almost_equal_cuts[-1])
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)